@@ -0,0 +1,142 @@
+import os.path
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+from StringIO import StringIO
+
+from xpathlet.engine import build_xpath_tree, ExpressionEngine
+from xpathlet.parser import parse
+
+
+def build_document(records):
+    parts = ['<export>']
+    for i in range(records):
+        parts.append(
+            '<record id="r%s" kind="%s"><name>record %s</name>'
+            '<field n="a">%s</field><field n="b">%s</field></record>' % (
+                i, 'xy'[i % 2], i, i, i * 2))
+    parts.append('</export>')
+    return build_xpath_tree(StringIO(''.join(parts)))
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+ELEMENT_PATH_EXPRESSIONS = [
+    '/export/record',
+    'record/name',
+    './/field[@n="b"]',
+    '//record[@kind="x"]/field[2]',
+    '//record[name="record 7"]',
+    ]
+
+
+def bench_element_path(opts):
+    """Compare ElementPath-compatible paths with and without the fast path.
+    """
+    root = build_document(opts.records)
+    engine = ExpressionEngine(root)
+    [export] = root.get_children()
+    print 'Document with %s records' % (opts.records,)
+    print '%-32s %10s %10s %8s' % ('expression', 'slow (ms)', 'fast (ms)',
+                                   'speedup')
+    for expr in ELEMENT_PATH_EXPRESSIONS:
+        fast = engine.compile(expr)
+        slow = engine.compile(expr)
+        slow.element_paths = {}
+        assert (engine.evaluate(fast, export).value ==
+                engine.evaluate(slow, export).value)
+        slow_time = best_time(lambda: engine.evaluate(slow, export),
+                              opts.repeat)
+        fast_time = best_time(lambda: engine.evaluate(fast, export),
+                              opts.repeat)
+        print '%-32s %10.2f %10.2f %7.1fx' % (
+            expr, slow_time * 1000, fast_time * 1000, slow_time / fast_time)
+
+
+PARSER_EXPRESSIONS = [
+    '/export/record',
+    '//record[@kind = "x" and field[@n = "a"] > 10]/name',
+    'sum(//field[@n = "b"]) div count(//record)',
+    "concat(substring-before(name, ' '), '-', @id)",
+    'ancestor-or-self::*[last()]/preceding-sibling::node()[2]',
+    '$records[position() mod 2 = 0] | //trailer/@count',
+    ]
+
+
+def _parsers():
+    parsers = [
+        ('ply', lambda source: parse(source, 'ply')),
+        ('pratt', lambda source: parse(source, 'pratt')),
+        ]
+    try:
+        from xpathlet.new_parser import parser
+    except ImportError:
+        print 'parsley is not installed, skipping new_parser.'
+    else:
+        parsers.append(('parsley', parser.parse))
+    return parsers
+
+
+def bench_parser(opts):
+    """Compare how many expressions a second each parser can parse."""
+    sources = [unicode(e) for e in PARSER_EXPRESSIONS] * 50
+    print 'Parsing %s expressions' % (len(sources),)
+    print '%-10s %12s' % ('parser', 'exprs/s')
+    for name, parse_func in _parsers():
+        parse_time = best_time(lambda: [parse_func(s) for s in sources],
+                               opts.repeat)
+        print '%-10s %12.0f' % (name, len(sources) / parse_time)
+
+
+IMPORT_SCRIPTS = [
+    ('python startup', 'pass'),
+    ('import engine', 'import xpathlet.engine'),
+    ('... and parse (ply)', 'import xpathlet.engine; '
+     'xpathlet.parser.parse("a/b", "ply")'),
+    ('... and parse (pratt)', 'import xpathlet.engine; '
+     'xpathlet.parser.parse("a/b", "pratt")'),
+    ]
+
+
+def bench_import(opts):
+    """Time starting a new interpreter that imports xpathlet."""
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    print '%-24s %10s' % ('', 'time (ms)')
+    for name, script in IMPORT_SCRIPTS:
+        command = [sys.executable, '-c', script]
+        run_time = best_time(
+            lambda: subprocess.check_call(command, cwd=package_dir),
+            opts.repeat)
+        print '%-24s %10.1f' % (name, run_time * 1000)
+
+
+BENCHMARKS = {
+    'element-path': bench_element_path,
+    'import': bench_import,
+    'parser': bench_parser,
+    }
+
+
+if __name__ == '__main__':
+    usage = '\n'.join([
+        "usage: %prog [options] [<benchmark> [...]]",
+        "",
+        "Time xpathlet against synthetic documents.",
+        "Available benchmarks: " + ', '.join(sorted(BENCHMARKS))])
+    parser = OptionParser(usage=usage)
+    parser.add_option('-n', '--records', type='int', dest='records',
+                      default=2000, help='records in the document [%default]')
+    parser.add_option('-r', '--repeat', type='int', dest='repeat',
+                      default=5, help='take the best of this many [%default]')
+
+    (opts, names) = parser.parse_args()
+    for name in names or sorted(BENCHMARKS):
+        BENCHMARKS[name](opts)
@@ -77,8 +77,8 @@ class HackyMinimalXSLTEngine(object):
                 if val == XSL_NAMESPACE:
                     ns_prefix = prefix
             expr = expr.replace('xsl:', '%s:' % (ns_prefix))
-            self._xev_cache[ckey] = self.xsl_engine.evaluate(
-                expr, node, context_position=pos, context_size=size).value
+            self._xev_cache.setdefault(ckey, self.xsl_engine.evaluate(
+                expr, node, context_position=pos, context_size=size).value)
         return self._xev_cache[ckey]
 
     def attr_str(self, attr_name, node):
@@ -267,7 +267,7 @@ class HackyMinimalXSLTTemplate(object):
                 metadata=metadata, trace_collector=tc)
             if tc is not None:
                 tc.dump_html()
-            self._find_cache[ckey] = result
+            self._find_cache.setdefault(ckey, result)
         return self._find_cache[ckey]
 
     def find(self, expr, ctx):
@@ -561,7 +561,7 @@ class HackyMinimalXSLTKey(object):
                 metadata=metadata, trace_collector=tc)
             if tc is not None:
                 tc.dump_html()
-            self._find_cache[ckey] = result
+            self._find_cache.setdefault(ckey, result)
         return self._find_cache[ckey]
 
     def find(self, expr, ctx):
@@ -599,6 +599,8 @@ class HackyMinimalXSLTKey(object):
 
 
 class XSLTFunctionLibrary(FunctionLibrary):
+    # Shared by all threads. We only ever add to this with setdefault(), so
+    # each node gets exactly one id even if two threads race to generate it.
     generated_ids = {}  # TODO: Something better than this?
 
     @xpath_function('object', 'node-set?', rtype='node-set')
@@ -636,9 +638,11 @@ class XSLTFunctionLibrary(FunctionLibrary):
         if not node_set.value:
             return XPathString('')
         node = node_set.value[0]
-        if node not in XSLTFunctionLibrary.generated_ids:
-            XSLTFunctionLibrary.generated_ids[node] = uuid.uuid4().hex
-        return XPathString('id%s' % (XSLTFunctionLibrary.generated_ids[node],))
+        node_id = XSLTFunctionLibrary.generated_ids.get(node)
+        if node_id is None:
+            node_id = XSLTFunctionLibrary.generated_ids.setdefault(
+                node, uuid.uuid4().hex)
+        return XPathString('id%s' % (node_id,))
 
     @xpath_function('string', rtype='object')
     def system_property(ctx):
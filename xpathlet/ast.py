@@ -2,6 +2,9 @@
 
 
 class Node(object):
+    def children(self):
+        return ()
+
     def to_str(self):
         raise NotImplementedError()
 
@@ -71,6 +74,9 @@ class Step(Node):
         self.node_test = node_test
         self.predicates = predicates or []
 
+    def children(self):
+        return [self.node_test] + self.predicates
+
     def __repr__(self):
         return u'<Step %s::%s %s>' % (
             self.axis, self.node_test, self.predicates)
@@ -120,6 +126,9 @@ class Predicate(Node):
     def __init__(self, expr):
         self.expr = expr
 
+    def children(self):
+        return [self.expr]
+
     def __repr__(self):
         return u'<Predicate %s>' % self.expr
 
@@ -144,6 +153,9 @@ class LocationPath(Node):
             else:
                 self.steps.append(step)
 
+    def children(self):
+        return self.steps
+
     def __repr__(self):
         return u"<%s: %s>" % (type(self).__name__, self.steps)
 
@@ -169,6 +181,9 @@ class PathExpr(Node):
         self.left = left
         self.right = right
 
+    def children(self):
+        return [self.left, self.right]
+
     def __repr__(self):
         return u"<PathExpr: (%s, %s)>" % (self.left, self.right)
 
@@ -190,6 +205,9 @@ class FilterExpr(Node):
         if predicate is not None:
             self.predicates.append(predicate)
 
+    def children(self):
+        return [self.expr] + self.predicates
+
     def __repr__(self):
         return u"<FilterExpr: %s %s>" % (self.expr, self.predicates)
 
@@ -209,6 +227,9 @@ class OperatorExpr(Node):
         self.left = left
         self.right = right
 
+    def children(self):
+        return [self.left, self.right]
+
     def __repr__(self):
         return u"<OperatorExpr %s: (%s, %s)>" % (
             self.op, self.left, self.right)
@@ -226,6 +247,9 @@ class UnaryExpr(Node):
         self.op = op
         self.expr = expr
 
+    def children(self):
+        return [self.expr]
+
     def __repr__(self):
         return u"<UnaryExpr %s: %s>" % (self.op, self.expr)
 
@@ -255,6 +279,9 @@ class FunctionCall(Node):
         self.name = name
         self.args = args
 
+    def children(self):
+        return list(self.args)
+
     def __repr__(self):
         return u"<FunctionCall %s: %s>" % (self.name, self.args)
 
@@ -0,0 +1,235 @@
+# -*- test-case-name: xpathlet.tests.test_async_api -*-
+
+"""Build trees and evaluate expressions without blocking the caller.
+
+Everything here returns a Future, which an event loop can wait on in whatever
+way suits it: a done callback that wakes the loop, polling done(), or
+wrapping it in the loop's own future type. The work itself is run by an
+executor, which is anything with a submit(func) method, such as the
+executors in concurrent.futures. By default, each piece of work gets its own
+thread.
+"""
+
+import threading
+from xml.etree import ElementTree as ET
+
+from xpathlet.budget import Budget, CancellationToken
+from xpathlet.data_model import XPathRootNode
+from xpathlet.engine import build_xpath_tree
+
+
+class CancelledError(Exception):
+    """Raised when asking for the result of a cancelled Future."""
+
+
+class TimeoutError(Exception):
+    """Raised when work or waiting for it takes longer than allowed."""
+
+
+class Future(object):
+    """The result of some work being done in the background.
+
+    This has the same interface as concurrent.futures.Future, except that
+    work can be cancelled while it's running. The work carries on unless it
+    checks for that itself, but its result is thrown away.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._state = 'pending'
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def cancel(self):
+        with self._condition:
+            if self._state == 'finished':
+                return False
+            if self._state != 'cancelled':
+                self._state = 'cancelled'
+                self._condition.notify_all()
+        self._run_callbacks()
+        return True
+
+    def cancelled(self):
+        return self._state == 'cancelled'
+
+    def running(self):
+        return self._state == 'running'
+
+    def done(self):
+        return self._state in ('finished', 'cancelled')
+
+    def set_running_or_notify_cancel(self):
+        """Mark the work as started, unless it has already been cancelled.
+
+        This returns False if the work shouldn't be started after all.
+        """
+        with self._condition:
+            if self._state != 'pending':
+                return False
+            self._state = 'running'
+            return True
+
+    def _finish(self, result, exception):
+        with self._condition:
+            if self.done():
+                # Cancelled or timed out while we were working.
+                return
+            self._result = result
+            self._exception = exception
+            self._state = 'finished'
+            self._condition.notify_all()
+        self._run_callbacks()
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+    def set_exception(self, exception):
+        self._finish(None, exception)
+
+    def _wait(self, timeout):
+        with self._condition:
+            if not self.done():
+                self._condition.wait(timeout)
+            if self._state == 'cancelled':
+                raise CancelledError()
+            if self._state != 'finished':
+                raise TimeoutError('Timed out waiting for result.')
+
+    def result(self, timeout=None):
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, func):
+        """Call func with this Future once it's done.
+
+        The callback is called in whichever thread finishes the work, so
+        event loops will usually want to use it to schedule a call in the
+        loop's own thread.
+        """
+        with self._condition:
+            if not self.done():
+                self._callbacks.append(func)
+                return
+        func(self)
+
+    def _run_callbacks(self):
+        with self._condition:
+            callbacks, self._callbacks = self._callbacks, []
+        for func in callbacks:
+            func(self)
+
+
+class ThreadExecutor(object):
+    """An executor that runs each piece of work in a new daemon thread."""
+
+    def submit(self, func, *args, **kw):
+        thread = threading.Thread(target=func, args=args, kwargs=kw)
+        thread.daemon = True
+        thread.start()
+
+
+DEFAULT_EXECUTOR = ThreadExecutor()
+
+
+def run_in_background(func, args=(), kw=None, executor=None, timeout=None):
+    """Call func(*args, **kw) using an executor and return a Future.
+
+    Whatever the executor's submit() returns is ignored. If a timeout is
+    given, the Future fails with TimeoutError if the work hasn't finished
+    that many seconds after it was submitted.
+    """
+    if kw is None:
+        kw = {}
+    if executor is None:
+        executor = DEFAULT_EXECUTOR
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args, **kw)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    if timeout is not None:
+        timer = threading.Timer(timeout, future.set_exception, [
+                TimeoutError('Timed out after %s seconds.' % (timeout,))])
+        timer.daemon = True
+        timer.start()
+        future.add_done_callback(lambda _future: timer.cancel())
+
+    executor.submit(run)
+    return future
+
+
+def evaluate_async(engine, xpath_expr, executor=None, timeout=None, **kw):
+    """Evaluate an expression in the background and return a Future.
+
+    Any other keyword arguments are passed to engine.evaluate(). Unless a
+    budget is given, the evaluation gets one with a cancellation token, so
+    that it stops as soon as the Future is cancelled or times out.
+    """
+    token = None
+    if kw.get('budget') is None:
+        token = CancellationToken()
+        kw['budget'] = Budget(token=token)
+    future = run_in_background(engine.evaluate, (xpath_expr,), kw, executor,
+                               timeout)
+    if token is not None:
+        future.add_done_callback(lambda _future: token.cancel())
+    return future
+
+
+def build_tree_async(source, statistics=None, executor=None, timeout=None):
+    """Build an XPath tree from a file or filename in the background."""
+    return run_in_background(build_xpath_tree, (source, statistics), None,
+                             executor, timeout)
+
+
+class IncrementalTreeBuilder(object):
+    """Builds an XPath tree from a document that arrives in pieces.
+
+    Each piece is parsed as it's fed in, so by the time the whole document
+    has arrived, all that's left is building the XPath nodes, which can be
+    done in the background with close_async().
+    """
+
+    def __init__(self, statistics=None):
+        self.statistics = statistics
+        self.namespaces = {}
+        self._parser = ET.XMLParser(target=ET.TreeBuilder())
+        # This is how iterparse() gets namespace declarations too.
+        self._parser._parser.StartNamespaceDeclHandler = self._start_ns
+
+    def _start_ns(self, prefix, uri):
+        prefix = prefix or ''
+        try:
+            uri = (uri or '').encode('ascii')
+        except UnicodeError:
+            pass
+        if self.namespaces.get(prefix, uri) != uri:
+            raise ValueError('Redefined namespace prefix: %r' % (prefix,))
+        self.namespaces[prefix] = uri
+
+    def feed(self, data):
+        self._parser.feed(data)
+
+    def close(self):
+        """Finish parsing and build the XPath tree."""
+        root = self._parser.close()
+        return XPathRootNode(ET.ElementTree(root), self.namespaces,
+                             self.statistics)
+
+    def close_async(self, executor=None, timeout=None):
+        return run_in_background(self.close, (), None, executor, timeout)
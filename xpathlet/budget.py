@@ -0,0 +1,140 @@
+# -*- test-case-name: xpathlet.tests.test_budget -*-
+
+"""Limits on how much work a single evaluation may do.
+
+The engine reports each node it visits on an axis and each predicate it
+evaluates to the evaluation's Budget, which raises BudgetExceeded once any of
+its limits has been reached. A budget can be shared by several evaluations,
+which then draw on the same allowance.
+
+Budgets also keep track of roughly how much memory the evaluation is using
+for intermediate node-sets, cached values and variable bindings. The nodes
+themselves belong to the tree, so only the containers referring to them are
+counted.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+
+
+# The cost of each (position, node) pair built while stepping along an axis:
+# the tuple, the position and the list entry referring to the tuple.
+PAIR_SIZE = sys.getsizeof((0, None)) + sys.getsizeof(1000) + 8
+
+LIST_ENTRY_SIZE = 8
+
+
+def value_size(value):
+    """Estimate the memory used by an XPathObject, not counting nodes."""
+    return sys.getsizeof(value.value)
+
+
+@contextmanager
+def budget_scope(budget, variables=None):
+    """Count variable bindings for the duration of an evaluation, and release
+    everything allocated during it at the end.
+    """
+    if budget is None:
+        yield
+        return
+    memory = budget.memory
+    try:
+        if variables:
+            budget.allocate(sum(value_size(v) for v in variables.values()))
+        yield
+    finally:
+        budget.memory = memory
+
+
+class BudgetExceeded(Exception):
+    """Raised when an evaluation goes over its budget.
+
+    The reason is 'nodes', 'memory', 'deadline' or 'cancelled', and
+    statistics is a dict describing the work done before the evaluation was
+    stopped.
+    """
+
+    def __init__(self, reason, statistics):
+        super(BudgetExceeded, self).__init__(
+            'Evaluation stopped (%s) after visiting %s nodes in %.3fs.' % (
+                reason, statistics['nodes_visited'], statistics['elapsed']))
+        self.reason = reason
+        self.statistics = statistics
+
+
+class EvaluationCancelled(BudgetExceeded):
+    """Raised when an evaluation's cancellation token is cancelled."""
+
+
+class CancellationToken(object):
+    """Lets one thread ask evaluations running in another to stop."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Budget(object):
+    # Reading the clock is slow compared to everything else we do per node,
+    # so we only check the deadline every this many units of work.
+    CLOCK_INTERVAL = 1000
+
+    def __init__(self, max_nodes=None, timeout=None, token=None,
+                 max_memory=None):
+        self.max_nodes = max_nodes
+        self.max_memory = max_memory
+        self.memory = 0
+        self.peak_memory = 0
+        self.start_time = time.time()
+        self.deadline = None
+        if timeout is not None:
+            self.deadline = self.start_time + timeout
+        self.token = token
+        self.nodes_visited = 0
+        self.predicates_evaluated = 0
+        self._work = 0
+        self._next_clock_check = self.CLOCK_INTERVAL
+
+    def statistics(self):
+        return {
+            'nodes_visited': self.nodes_visited,
+            'predicates_evaluated': self.predicates_evaluated,
+            'elapsed': time.time() - self.start_time,
+            'memory': self.memory,
+            'peak_memory': self.peak_memory,
+            }
+
+    def allocate(self, size):
+        """Record some memory, in bytes, being used."""
+        self.memory += size
+        if self.memory > self.peak_memory:
+            self.peak_memory = self.memory
+            if self.max_memory is not None and self.memory > self.max_memory:
+                raise BudgetExceeded('memory', self.statistics())
+
+    def free(self, size):
+        self.memory -= size
+
+    def visit(self, count=1):
+        """Record visiting nodes on an axis."""
+        self.nodes_visited += count
+        if self.max_nodes is not None and self.nodes_visited > self.max_nodes:
+            raise BudgetExceeded('nodes', self.statistics())
+        self._check(count)
+
+    def evaluate_predicates(self, count=1):
+        """Record evaluating predicates for some nodes."""
+        self.predicates_evaluated += count
+        self._check(count)
+
+    def _check(self, work):
+        if self.token is not None and self.token.cancelled:
+            raise EvaluationCancelled('cancelled', self.statistics())
+        self._work += work
+        if self.deadline is not None and self._work >= self._next_clock_check:
+            self._next_clock_check = self._work + self.CLOCK_INTERVAL
+            if time.time() > self.deadline:
+                raise BudgetExceeded('deadline', self.statistics())
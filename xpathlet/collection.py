@@ -0,0 +1,143 @@
+# -*- test-case-name: xpathlet.tests.test_collection -*-
+
+"""Evaluate the same expressions over many XML files in parallel.
+
+The files are spread over a pool of worker processes. Each worker parses the
+expressions once when it starts and then builds, evaluates and throws away
+one document at a time. Node objects can't be sent back from the workers, so
+results are converted to plain Python values first.
+"""
+
+import multiprocessing
+
+from xpathlet.compiler import CompiledExpressionSet
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+from xpathlet.parser import parse
+
+
+def _step_name(node, namespaces):
+    """Return the name test for a node, or None if we can't write one."""
+    uri, name = node.expanded_name()
+    if uri is None:
+        return name
+    for prefix, prefix_uri in sorted(namespaces.items()):
+        # The engine ignores the default namespace in name tests.
+        if prefix and prefix_uri == uri:
+            return u'%s:%s' % (prefix, name)
+    return None
+
+
+def node_path(node):
+    """Build an absolute location path that selects only the given node.
+
+    Elements are numbered among their siblings with the same name, unless
+    they're in a namespace without a prefix, in which case they're numbered
+    among all their sibling elements.
+    """
+    if node.node_type == 'root':
+        return u'/'
+    namespaces = node.get_root()._namespaces
+    parent_path = node_path(node.parent).rstrip(u'/')
+
+    if node.node_type == 'attribute':
+        name = _step_name(node, namespaces)
+        if name is None:
+            attributes = node.parent.get_attributes()
+            name = u'*[%s]' % (attributes.index(node) + 1,)
+        return u'%s/@%s' % (parent_path, name)
+
+    siblings = [n for n in node.parent.get_children()
+                if n.node_type == node.node_type]
+    if node.node_type == 'text':
+        name = u'text()'
+    else:
+        name = _step_name(node, namespaces)
+        if name is None:
+            name = u'*'
+        else:
+            siblings = [n for n in siblings
+                        if n.expanded_name() == node.expanded_name()]
+    return u'%s/%s[%s]' % (parent_path, name, siblings.index(node) + 1)
+
+
+def to_picklable(result, node_values='path'):
+    """Convert an XPath result to a plain Python value.
+
+    Numbers, strings and booleans become floats, unicode strings and bools.
+    Node-sets become lists in document order of either the node paths
+    (node_values='path') or the string-values (node_values='string').
+    """
+    if result.object_type != 'node-set':
+        return result.value
+    if node_values == 'path':
+        return [node_path(node) for node in result.value]
+    if node_values == 'string':
+        return result.string_values()
+    raise ValueError('Unknown node_values: %r' % (node_values,))
+
+
+class _Worker(object):
+    """The state a worker process keeps between files."""
+
+    def __init__(self, sources, variables, function_libraries, node_values):
+        self.sources = sources
+        # Compilation depends on each document's statistics, but the ASTs
+        # can be shared by all of them.
+        self.exprs = [parse(source) for source in sources]
+        self.variables = variables
+        self.function_libraries = function_libraries
+        self.node_values = node_values
+
+    def evaluate(self, path):
+        root = build_xpath_tree(path)
+        engine = ExpressionEngine(root, self.variables,
+                                  self.function_libraries)
+        compiled = CompiledExpressionSet(
+            self.sources, engine._find_function, root.statistics,
+            root._namespaces, self.exprs)
+        return (path, [to_picklable(result, self.node_values)
+                       for result in engine.evaluate_all(compiled)])
+
+
+_worker = None
+
+
+def _init_worker(*args):
+    global _worker
+    _worker = _Worker(*args)
+
+
+def _evaluate_path(path):
+    return _worker.evaluate(path)
+
+
+def evaluate_collection(paths, xpath_exprs, processes=None, chunksize=1,
+                        ordered=True, variables=None, function_libraries=None,
+                        node_values='path'):
+    """Evaluate expressions against each of a collection of XML files.
+
+    This yields (path, results) for each file, where results is a list with
+    one value per expression, as converted by to_picklable(). The files are
+    handed to the worker processes chunksize at a time. If ordered is False,
+    results are yielded as soon as they're ready rather than in the order of
+    the paths.
+
+    Expressions may be strings or compiled expressions, but they're compiled
+    again against each document, so only their sources are used. Variables
+    and function libraries must be picklable.
+    """
+    sources = [getattr(expr, 'source', expr) for expr in xpath_exprs]
+    pool = multiprocessing.Pool(
+        processes, _init_worker,
+        (sources, variables, function_libraries, node_values))
+    try:
+        if ordered:
+            results = pool.imap(_evaluate_path, paths, chunksize)
+        else:
+            results = pool.imap_unordered(_evaluate_path, paths, chunksize)
+        for result in results:
+            yield result
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
@@ -0,0 +1,465 @@
+# -*- test-case-name: xpathlet.tests.test_compiler -*-
+
+from xpathlet import ast
+from xpathlet.constants import XML_NAMESPACE
+from xpathlet.parser import parse
+from xpathlet.planner import PredicatePlanner
+
+
+# The parts of an evaluation context an expression's value can depend on.
+# Variable bindings are fixed for a whole evaluation, so we don't track them.
+CONTEXT_PARTS = frozenset(['node', 'position', 'size', 'root'])
+
+NO_CONTEXT = frozenset()
+
+# Expressions that are cheaper to evaluate than to look up in a cache.
+TRIVIAL_EXPRS = (ast.Number, ast.StringLiteral, ast.VariableReference)
+
+
+def function_dependencies(function_call, find_function):
+    """Find the parts of the context a function call looks at directly."""
+    func = find_function(function_call.name)
+    context = getattr(func, 'xpath_context', None)
+    if context is None:
+        return CONTEXT_PARTS
+    context = frozenset(context)
+    # Functions like string() only use the context node when their optional
+    # argument is omitted.
+    arg_types = func.xpath_arg_types
+    if function_call.args and arg_types and arg_types[0].endswith('?'):
+        context = context - set(['node'])
+    return context
+
+
+def context_dependencies(expr, find_function, dependencies=None):
+    """Work out which parts of the context each subexpression depends on.
+
+    This returns a dict mapping id(subexpression) to a frozenset of
+    CONTEXT_PARTS. Predicates are evaluated in their own contexts, so they
+    don't contribute to the dependencies of the expressions containing them.
+    """
+    if dependencies is None:
+        dependencies = {}
+
+    for child in expr.children():
+        context_dependencies(child, find_function, dependencies)
+
+    def child_deps(*children):
+        return NO_CONTEXT.union(*[dependencies[id(c)] for c in children])
+
+    if isinstance(expr, ast.AbsoluteLocationPath):
+        deps = frozenset(['root'])
+    elif isinstance(expr, ast.LocationPath):
+        deps = frozenset(['node'])
+    elif isinstance(expr, ast.PathExpr):
+        # The right hand side is evaluated relative to the left.
+        deps = child_deps(expr.left)
+    elif isinstance(expr, ast.OperatorExpr):
+        deps = child_deps(expr.left, expr.right)
+    elif isinstance(expr, (ast.FilterExpr, ast.UnaryExpr)):
+        deps = child_deps(expr.expr)
+    elif isinstance(expr, ast.Predicate):
+        # A numeric predicate is compared to the context position.
+        deps = child_deps(expr.expr).union(['position'])
+    elif isinstance(expr, ast.FunctionCall):
+        deps = child_deps(*expr.args).union(
+            function_dependencies(expr, find_function))
+    elif isinstance(expr, TRIVIAL_EXPRS):
+        deps = NO_CONTEXT
+    else:
+        # Steps and node tests are only meaningful as part of a path.
+        deps = CONTEXT_PARTS
+
+    dependencies[id(expr)] = deps
+    return dependencies
+
+
+def find_invariants(expr, dependencies, in_predicate=False, invariants=None):
+    """Find subexpressions that can be hoisted out of predicates.
+
+    These are the largest subexpressions inside predicates that don't depend on
+    the context node, position or size. They only need to be evaluated once
+    for each document they're evaluated against. This returns a dict mapping
+    id(subexpression) to the context parts its value depends on.
+    """
+    if invariants is None:
+        invariants = {}
+
+    deps = dependencies[id(expr)]
+    if in_predicate and deps <= set(['root']):
+        if not isinstance(expr, TRIVIAL_EXPRS):
+            invariants[id(expr)] = deps
+        return invariants
+
+    for child in expr.children():
+        find_invariants(child, dependencies,
+                        in_predicate or isinstance(expr, ast.Predicate),
+                        invariants)
+    return invariants
+
+
+def _structural_attrs(expr):
+    if isinstance(expr, (ast.NameTest, ast.NodeType)):
+        return (expr.to_str(),)
+    if isinstance(expr, ast.Step):
+        return (expr.axis,)
+    if isinstance(expr, (ast.OperatorExpr, ast.UnaryExpr)):
+        return (expr.op,)
+    if isinstance(expr, (ast.VariableReference, ast.FunctionCall)):
+        return (expr.name,)
+    if isinstance(expr, (ast.StringLiteral, ast.Number)):
+        return (expr.value,)
+    return ()
+
+
+def structural_ids(expr, canonical, ids=None):
+    """Number each subexpression so that identical subtrees share a number.
+
+    The canonical dict maps structural keys to numbers and may be shared
+    between calls. This returns a dict mapping id(subexpression) to its
+    number.
+    """
+    if ids is None:
+        ids = {}
+    children = expr.children()
+    for child in children:
+        structural_ids(child, canonical, ids)
+    key = (type(expr).__name__, _structural_attrs(expr),
+           tuple(ids[id(c)] for c in children))
+    ids[id(expr)] = canonical.setdefault(key, len(canonical))
+    return ids
+
+
+def find_impure(expr, find_function, impure=None):
+    """Find subexpressions that call functions we know nothing about.
+
+    Such functions might not return the same thing twice, so we must never
+    reuse their results. This returns a set of id(subexpression).
+    """
+    if impure is None:
+        impure = set()
+    for child in expr.children():
+        find_impure(child, find_function, impure)
+        if id(child) in impure:
+            impure.add(id(expr))
+    if isinstance(expr, ast.FunctionCall):
+        func = find_function(expr.name)
+        if getattr(func, 'xpath_context', None) is None:
+            impure.add(id(expr))
+    return impure
+
+
+def _walk(expr, parent=None):
+    yield expr, parent
+    for child in expr.children():
+        for pair in _walk(child, expr):
+            yield pair
+
+
+def _may_cache(node):
+    return not isinstance(node, TRIVIAL_EXPRS + (
+            ast.Step, ast.Predicate, ast.NameTest, ast.NodeType))
+
+
+def share_subexpressions(compiled_exprs, canonical):
+    """Find repeated subexpressions and location path prefixes.
+
+    The compiled expressions must all have been numbered with the same
+    canonical dict. Anything that appears more than once across them is
+    marked for caching, so that it is only evaluated once per context when
+    the expressions are evaluated together.
+    """
+    occurrences = {}
+    prefixes = {}
+    for compiled in compiled_exprs:
+        struct_ids = compiled.structural_ids
+        for node, parent in _walk(compiled.expr):
+            if id(node) in compiled.impure:
+                continue
+            if _may_cache(node):
+                occurrences.setdefault(struct_ids[id(node)], []).append(
+                    (compiled, node))
+            if not isinstance(node, ast.LocationPath):
+                continue
+            if isinstance(parent, ast.PathExpr) and node is parent.right:
+                continue
+            step_ids = [struct_ids[id(s)] for s in node.steps]
+            for length in xrange(1, len(step_ids) + 1):
+                key = ('prefix', node.absolute, tuple(step_ids[:length]))
+                prefix_id = canonical.setdefault(key, len(canonical))
+                prefixes.setdefault(prefix_id, []).append(
+                    (compiled, node, length))
+
+    # Common subexpressions are cached under the context they depend on, so
+    # each is evaluated only once per context.
+    for struct_id, uses in occurrences.iteritems():
+        if len(uses) > 1:
+            for compiled, node in uses:
+                compiled.cached.setdefault(id(node), (
+                        struct_id, compiled.dependencies[id(node)]))
+
+    for prefix_id, uses in prefixes.iteritems():
+        if len(uses) > 1:
+            for compiled, node, length in uses:
+                compiled.path_prefixes.setdefault(
+                    id(node), {})[length] = prefix_id
+
+
+def _element_path_name(name_test, namespaces, allow_star=True):
+    if not isinstance(name_test, ast.NameTest):
+        return None
+    name = name_test.name
+    if name == '*':
+        return name if allow_star else None
+    if ':' not in name:
+        return name
+    prefix, local_name = name.split(':')
+    if local_name == '*' or prefix not in namespaces:
+        return None
+    return '{%s}%s' % (namespaces[prefix], local_name)
+
+
+def _element_path_literal(expr):
+    if not isinstance(expr, ast.StringLiteral):
+        return None
+    for quote in '\'"':
+        if quote not in expr.value:
+            return quote + expr.value + quote
+    return None
+
+
+def _single_step(expr, axis):
+    if not isinstance(expr, ast.LocationPath) or expr.absolute:
+        return None
+    if len(expr.steps) != 1:
+        return None
+    [step] = expr.steps
+    if step.axis != axis or step.predicates:
+        return None
+    return step
+
+
+def _element_path_predicate(expr, namespaces):
+    """Translate a predicate into ElementPath, if ElementPath has it."""
+    literal = None
+    if isinstance(expr, ast.OperatorExpr) and expr.op == '=':
+        left, right = expr.left, expr.right
+        if isinstance(left, ast.StringLiteral):
+            left, right = right, left
+        literal = _element_path_literal(right)
+        if literal is None:
+            return None
+        expr = left
+
+    for axis, prefix in [('attribute', '@'), ('child', '')]:
+        step = _single_step(expr, axis)
+        if step is not None:
+            name = _element_path_name(step.node_test, namespaces, False)
+            if name is None:
+                return None
+            if literal is not None:
+                return '[%s%s=%s]' % (prefix, name, literal)
+            return '[%s%s]' % (prefix, name)
+    return None
+
+
+def _element_path_position(expr):
+    if isinstance(expr, ast.Number):
+        if expr.value >= 1 and expr.value == int(expr.value):
+            return '[%d]' % (expr.value,)
+    elif isinstance(expr, ast.FunctionCall):
+        if expr.name == 'last' and not expr.args:
+            return '[last()]'
+    return None
+
+
+def element_path(path, namespaces):
+    """Translate a location path into an equivalent ElementPath expression.
+
+    ElementTree's ElementPath only handles a small subset of XPath that
+    selects elements by name, attributes and child elements, but it does so
+    much faster than we can. This returns None if the path isn't in that
+    subset or if ElementPath's meaning would differ from ours, such as for
+    positions among elements selected by a wildcard. Absolute paths are
+    translated relative to a parent of the document's root elements.
+
+    The nodes ElementPath selects are in document order, but paths with more
+    than one descendant step may select some of them more than once.
+    """
+    namespaces = dict({'xml': XML_NAMESPACE}, **namespaces)
+    segments = ['.']
+    steps = list(path.steps)
+    selects_elements = False
+    while steps:
+        step = steps.pop(0)
+        if (step.axis == 'self' and not step.predicates and
+                isinstance(step.node_test, ast.NodeType) and
+                step.node_test.node_type == 'node'):
+            continue
+        separator = '/'
+        if (step.axis == 'descendant-or-self' and not step.predicates and
+                isinstance(step.node_test, ast.NodeType) and
+                step.node_test.node_type == 'node'):
+            if not steps or steps[0].axis != 'child':
+                return None
+            # ElementPath's // only counts positions among siblings, like
+            # descendant-or-self::node()/child::name does.
+            step, separator, positional = steps.pop(0), '//', True
+        elif step.axis == 'descendant':
+            step, separator, positional = step, '//', False
+        elif step.axis == 'child':
+            positional = True
+        else:
+            return None
+
+        name = _element_path_name(step.node_test, namespaces)
+        if name is None:
+            return None
+        segment = [separator, name]
+        for i, predicate in enumerate(step.predicates):
+            bit = _element_path_position(predicate.expr)
+            if bit is not None:
+                # ElementPath counts positions among siblings with the same
+                # name, ignoring any earlier predicates.
+                if not positional or i > 0 or name == '*':
+                    return None
+            else:
+                bit = _element_path_predicate(predicate.expr, namespaces)
+            if bit is None:
+                return None
+            segment.append(bit)
+        segments.append(''.join(segment))
+        selects_elements = True
+
+    if not selects_elements:
+        return None
+    return ''.join(segments)
+
+
+def find_element_paths(expr, namespaces):
+    """Find the location paths ElementPath can evaluate for us.
+
+    This returns a dict mapping id(path) to its ElementPath expression.
+    """
+    element_paths = {}
+    for node, parent in _walk(expr):
+        if not isinstance(node, ast.LocationPath):
+            continue
+        if isinstance(parent, ast.PathExpr) and node is parent.right:
+            continue
+        path = element_path(node, namespaces)
+        if path is not None:
+            element_paths[id(node)] = path
+    return element_paths
+
+
+class CompiledExpression(object):
+    """A parsed expression along with what we've learnt about it.
+
+    Compiled expressions can be evaluated any number of times, but the
+    analysis depends on the function libraries available at compile time, so
+    they should only be evaluated by the engine that compiled them.
+    """
+
+    def __init__(self, source, expr, find_function, statistics=None,
+                 namespaces=None, canonical=None):
+        self.source = source
+        self.expr = expr
+        self.dependencies = context_dependencies(expr, find_function)
+        if canonical is None:
+            canonical = {}
+        self.structural_ids = structural_ids(expr, canonical)
+        self.impure = find_impure(expr, find_function)
+
+        # Maps id(subexpression) to (cache id, dependencies) for every
+        # subexpression whose value may be cached during an evaluation.
+        self.cached = {}
+        self.invariants = find_invariants(expr, self.dependencies)
+        for expr_id, deps in self.invariants.iteritems():
+            self.cached[expr_id] = (self.structural_ids[expr_id], deps)
+
+        # Location paths evaluated from the context node or root can share
+        # the node sets selected by their common leading steps. This maps
+        # id(path) to a dict of {prefix length: cache id}.
+        self.path_prefixes = {}
+        share_subexpressions([self], canonical)
+
+        # Maps id(step or filter expression) to the PredicateGroups its
+        # predicates should be applied in.
+        self.predicate_plans = {}
+        planner = PredicatePlanner(statistics, namespaces or {},
+                                   self.dependencies, self.cached,
+                                   find_function)
+        for node, _parent in _walk(expr):
+            if isinstance(node, ast.Step) and node.predicates:
+                self.predicate_plans[id(node)] = planner.plan(
+                    node.predicates, node.node_test)
+            elif isinstance(node, ast.FilterExpr):
+                self.predicate_plans[id(node)] = planner.plan(node.predicates)
+
+        # Maps id(location path) to an equivalent ElementPath expression.
+        self.element_paths = find_element_paths(expr, namespaces or {})
+
+    def __repr__(self):
+        return '<CompiledExpression %r>' % (self.source,)
+
+
+class InterpretedExpression(object):
+    """A parsed expression that hasn't been analysed.
+
+    This has the same attributes as a CompiledExpression, but they're all
+    empty, so the engine evaluates it as written without caching, sharing or
+    reordering anything. It costs nothing beyond parsing to build.
+    """
+
+    def __init__(self, source, expr):
+        self.source = source
+        self.expr = expr
+        self.dependencies = {}
+        self.cached = {}
+        self.path_prefixes = {}
+        self.predicate_plans = {}
+        self.element_paths = {}
+
+    def __repr__(self):
+        return '<InterpretedExpression %r>' % (self.source,)
+
+
+def compile_expression(source, find_function, statistics=None,
+                       namespaces=None, expr=None):
+    if expr is None:
+        expr = parse(source)
+    return CompiledExpression(source, expr, find_function, statistics,
+                              namespaces)
+
+
+class CompiledExpressionSet(object):
+    """Expressions compiled together so they can be evaluated together.
+
+    Subexpressions and location path prefixes shared between the expressions
+    are only evaluated once per context when the set is evaluated.
+
+    If the sources have already been parsed, their ASTs can be passed in as
+    exprs to avoid parsing them again. ASTs aren't modified by compilation, so
+    they can be shared between any number of compiled expressions.
+    """
+
+    def __init__(self, sources, find_function, statistics=None,
+                 namespaces=None, exprs=None):
+        if exprs is None:
+            exprs = [parse(source) for source in sources]
+        canonical = {}
+        self.expressions = [
+            CompiledExpression(source, expr, find_function, statistics,
+                               namespaces, canonical)
+            for source, expr in zip(sources, exprs)]
+        share_subexpressions(self.expressions, canonical)
+
+    def __iter__(self):
+        return iter(self.expressions)
+
+    def __len__(self):
+        return len(self.expressions)
+
+    def __repr__(self):
+        return '<CompiledExpressionSet of %s>' % (len(self),)
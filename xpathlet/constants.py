@@ -1 +1,26 @@
 XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
+
+
+# Character classes for NCNames, for use in regular expressions.
+NCNAME_START_CHARS = (
+    u'a-zA-Z_'
+    u'\u00C0-\u00D6'
+    u'\u00D8-\u00F6'
+    u'\u00F8-\u02FF'
+    u'\u0370-\u037D'
+    u'\u037F-\u1FFF'
+    u'\u200C-\u200D'
+    u'\u2070-\u218F'
+    u'\u2C00-\u2FEF'
+    u'\u3001-\uD7FF'
+    u'\uF900-\uFDCF'
+    u'\uFDF0-\uFFFD'
+    # u'\u10000-\uEFFFF'
+    )
+
+NCNAME_CHARS = u''.join([
+        u'-.0-9', NCNAME_START_CHARS,
+        unichr(0xB7),
+        u'\u0300-\u036F',
+        u'\u203F-\u2040',
+        ])
@@ -5,25 +5,26 @@ from xpathlet.constants import XML_NAMESPACE
 from xpathlet.data_model import (
     XPathNodeSet, XPathBoolean, XPathNumber, XPathString,
     FunctionLibrary, xpath_function)
+from xpathlet.kernels import sum_numbers
 
 
 class CoreFunctionLibrary(FunctionLibrary):
 
     # Node Set Functions
 
-    @xpath_function(rtype='number')
+    @xpath_function(rtype='number', context=('size',))
     def last(ctx):
         return XPathNumber(ctx.size)
 
-    @xpath_function(rtype='number')
+    @xpath_function(rtype='number', context=('position',))
     def position(ctx):
         return XPathNumber(ctx.position)
 
-    @xpath_function('node-set', rtype='number')
+    @xpath_function('node-set', rtype='number', context=())
     def count(ctx, node_set):
         return XPathNumber(len(node_set.value))
 
-    @xpath_function('object', rtype='node-set')
+    @xpath_function('object', rtype='node-set', context=('root',))
     def id(ctx, obj):
         if obj.object_type == 'node-set':
             ids_str = ' '.join(n.string_value() for n in obj.value)
@@ -37,7 +38,7 @@ class CoreFunctionLibrary(FunctionLibrary):
                 nodes.add(node)
         return XPathNodeSet(nodes)
 
-    @xpath_function('node-set?', rtype='string')
+    @xpath_function('node-set?', rtype='string', context=('node',))
     def local_name(ctx, node_set=None):
         if node_set is None:
             node_set = XPathNodeSet([ctx.node])
@@ -47,7 +48,7 @@ class CoreFunctionLibrary(FunctionLibrary):
 
         return XPathString(node_set.value[0].name)
 
-    @xpath_function('node-set?', rtype='string')
+    @xpath_function('node-set?', rtype='string', context=('node',))
     def namespace_uri(ctx, node_set=None):
         if node_set is None:
             node_set = XPathNodeSet([ctx.node])
@@ -57,7 +58,7 @@ class CoreFunctionLibrary(FunctionLibrary):
 
         return XPathString(node_set.value[0].prefix)
 
-    @xpath_function('node-set?', rtype='string')
+    @xpath_function('node-set?', rtype='string', context=('node',))
     def name(ctx, node_set=None):
         # TODO: fix
         if node_set is None:
@@ -70,33 +71,33 @@ class CoreFunctionLibrary(FunctionLibrary):
 
     # String Functions
 
-    @xpath_function('object?', rtype='string')
+    @xpath_function('object?', rtype='string', context=('node',))
     def string(ctx, obj=None):
         if obj is None:
             obj = XPathNodeSet([ctx.node])
         return obj.coerce('string')
 
-    @xpath_function('string', 'string', 'string*', rtype='string')
+    @xpath_function('string', 'string', 'string*', rtype='string', context=())
     def concat(ctx, *strings):
         return XPathString(u''.join(s.value for s in strings))
 
-    @xpath_function('string', 'string', rtype='boolean')
+    @xpath_function('string', 'string', rtype='boolean', context=())
     def starts_with(ctx, haystack, needle):
         return XPathBoolean(haystack.value.startswith(needle.value))
 
-    @xpath_function('string', 'string', rtype='boolean')
+    @xpath_function('string', 'string', rtype='boolean', context=())
     def contains(ctx, haystack, needle):
         return XPathBoolean(needle.value in haystack.value)
 
-    @xpath_function('string', 'string', rtype='string')
+    @xpath_function('string', 'string', rtype='string', context=())
     def substring_before(ctx, haystack, needle):
         return XPathString(([''] + haystack.value.split(needle.value, 1))[-2])
 
-    @xpath_function('string', 'string', rtype='string')
+    @xpath_function('string', 'string', rtype='string', context=())
     def substring_after(ctx, haystack, needle):
         return XPathString((haystack.value.split(needle.value, 1) + [''])[1])
 
-    @xpath_function('string', 'number', 'number?', rtype='string')
+    @xpath_function('string', 'number', 'number?', rtype='string', context=())
     def substring(ctx, haystack, start, length=None):
         start_f = round(start.value)
         if isnan(start_f):
@@ -110,19 +111,19 @@ class CoreFunctionLibrary(FunctionLibrary):
         start = int(max(1, round(start.value))) - 1
         return XPathString(haystack.value[start:end])
 
-    @xpath_function('string?', rtype='number')
+    @xpath_function('string?', rtype='number', context=('node',))
     def string_length(ctx, text=None):
         if text is None:
             text = XPathString(ctx.node.string_value())
         return XPathNumber(len(text.value))
 
-    @xpath_function('string?', rtype='string')
+    @xpath_function('string?', rtype='string', context=('node',))
     def normalize_space(ctx, text=None):
         if text is None:
             text = XPathString(ctx.node.string_value())
         return XPathString(u' '.join(text.value.strip().split()))
 
-    @xpath_function('string', 'string', 'string', rtype='string')
+    @xpath_function('string', 'string', 'string', rtype='string', context=())
     def translate(ctx, text, from_chars, to_chars):
         mapping = dict(
             izip_longest(from_chars.value, to_chars.value, fillvalue=''))
@@ -131,23 +132,23 @@ class CoreFunctionLibrary(FunctionLibrary):
 
     # Boolean Functions
 
-    @xpath_function('object', rtype='boolean')
+    @xpath_function('object', rtype='boolean', context=())
     def boolean(ctx, obj):
         return obj.coerce('boolean')
 
-    @xpath_function('boolean', rtype='boolean', name='not')
+    @xpath_function('boolean', rtype='boolean', name='not', context=())
     def xpath_not(ctx, obj):
         return XPathBoolean(not obj.value)
 
-    @xpath_function(rtype='boolean')
+    @xpath_function(rtype='boolean', context=())
     def true(ctx):
         return XPathBoolean(True)
 
-    @xpath_function(rtype='boolean')
+    @xpath_function(rtype='boolean', context=())
     def false(ctx):
         return XPathBoolean(False)
 
-    @xpath_function('string', rtype='boolean')
+    @xpath_function('string', rtype='boolean', context=('node',))
     def lang(ctx, langstr):
         langstr_bits = langstr.value.lower().split('-')
         node = ctx.node
@@ -162,26 +163,24 @@ class CoreFunctionLibrary(FunctionLibrary):
 
     # Number Functions
 
-    @xpath_function('object?', rtype='number')
+    @xpath_function('object?', rtype='number', context=('node',))
     def number(ctx, obj=None):
         if obj is None:
             obj = XPathNodeSet([ctx.node])
         return obj.coerce('number')
 
-    @xpath_function('node-set', rtype='number')
+    @xpath_function('node-set', rtype='number', context=())
     def sum(ctx, node_set):
-        return XPathNumber(sum(
-                XPathString(n.string_value()).coerce('number').value
-                for n in node_set.value))
+        return XPathNumber(sum_numbers(node_set.string_values()))
 
-    @xpath_function('number', rtype='number')
+    @xpath_function('number', rtype='number', context=())
     def floor(ctx, number):
         return XPathNumber(floor(number.value))
 
-    @xpath_function('number', rtype='number')
+    @xpath_function('number', rtype='number', context=())
     def ceiling(ctx, number):
         return XPathNumber(ceil(number.value))
 
-    @xpath_function('number', rtype='number')
+    @xpath_function('number', rtype='number', context=())
     def round(ctx, number):
         return XPathNumber(floor(number.value + 0.5))
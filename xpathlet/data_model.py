@@ -5,9 +5,13 @@
 
 import math
 import operator
+import threading
 from itertools import dropwhile
 from xml.etree import ElementTree as ET
 
+from xpathlet.kernels import string_to_number, any_compare, number_range
+from xpathlet.statistics import DocumentStatistics
+
 
 # Stuff to work around ElementTree doing silly things.
 
@@ -23,6 +27,17 @@ def eqname(prefix, name):
     return '{%s}%s' % (prefix, name)
 
 
+def expand_qname(qname, namespaces):
+    prefix, name = '', qname
+    if ':' in qname:
+        prefix, name = qname.split(':')
+    # Ignore the default namespace here, as the engine does.
+    uri = None
+    if prefix:
+        uri = namespaces[prefix]
+    return (uri, name)
+
+
 # XPath object types
 
 class XPathObject(object):
@@ -87,47 +102,85 @@ class XPathNodeSet(XPathObject):
         return self.to_string().to_number()
 
     def _xpath_cmp(self, other, operator):
-        # This doesn't actually perform comparisons. It merely transforms
-        # itself into something that does.
-
-        # If one object to be compared is a node-set and the other is a
-        # boolean, then the comparison will be true if and only if the result
-        # of performing the comparison on the boolean and on the result of
-        # converting the node-set to a boolean using the boolean function is
-        # true.
-        if other.object_type == 'boolean':
-            return self.coerce('boolean')._xpath_cmp(other, operator)
-
-        # The rest of these iterate over nodes until a successful comparison is
-        # found.
-        for node in self.value:
-            # If both objects to be compared are node-sets, then the comparison
-            # will be true if and only if there is a node in the first node-set
-            # and a node in the second node-set such that the result of
-            # performing the comparison on the string-values of the two nodes
-            # is true.
-
-            # If one object to be compared is a node-set and the other is a
-            # string, then the comparison will be true if and only if there is
-            # a node in the node-set such that the result of performing the
-            # comparison on the string-value of the node and the other string
-            # is true.
-            node_val = XPathString(node.string_value())
-
-            # If one object to be compared is a node-set and the other is a
-            # number, then the comparison will be true if and only if there is
-            # a node in the node-set such that the result of performing the
-            # comparison on the number to be compared and on the result of
-            # converting the string-value of that node to a number using the
-            # number function is true.
-            if other.object_type == 'number':
-                node_val = node_val.to_number()
-
-            if node_val._xpath_cmp(other, operator):
-                return True
+        return compare_string_values(self.string_values(), other, operator)
+
+    def string_values(self):
+        return [node.string_value() for node in self.value]
+
+
+def compare_string_values(values, other, operator):
+    """Compare the string-values of the nodes in a node-set with an object.
+
+    The other object may also be a list of the string-values of the nodes in
+    another node-set.
+    """
+    if isinstance(other, list):
+        return _compare_node_set_values(values, other, operator)
+
+    # If one object to be compared is a node-set and the other is a
+    # boolean, then the comparison will be true if and only if the result
+    # of performing the comparison on the boolean and on the result of
+    # converting the node-set to a boolean using the boolean function is
+    # true.
+    if other.object_type == 'boolean':
+        return XPathBoolean(bool(values))._xpath_cmp(other, operator)
+
+    cmp_func = XPathObject.COMP_FUNCTIONS[operator]
+
+    # If both objects to be compared are node-sets, then the comparison
+    # will be true if and only if there is a node in the first node-set and
+    # a node in the second node-set such that the result of performing the
+    # comparison on the string-values of the two nodes is true.
+    if other.object_type == 'node-set':
+        return _compare_node_set_values(
+            values, other.string_values(), operator)
+
+    # If one object to be compared is a node-set and the other is a number,
+    # then the comparison will be true if and only if there is a node in
+    # the node-set such that the result of performing the comparison on the
+    # number to be compared and on the result of converting the
+    # string-value of that node to a number using the number function is
+    # true.
+    if other.object_type == 'number':
+        return any_compare(values, other.value, operator)
+
+    # If one object to be compared is a node-set and the other is a string,
+    # then the comparison will be true if and only if there is a node in
+    # the node-set such that the result of performing the comparison on the
+    # string-value of the node and the other string is true.
+    if operator in ('=', '!='):
+        return any(cmp_func(v, other.value) for v in values)
+    # Relational comparisons between strings convert both to numbers.
+    return any_compare(values, string_to_number(other.value), operator)
+
+
+def _compare_node_set_values(values, other_values, operator):
+    # Rather than comparing every pair of nodes, we look at the sets of
+    # values on each side as a whole.
+    if not (values and other_values):
+        return False
 
-        # Otherwise return False.
+    if operator == '=':
+        # Hash the smaller side and probe it with the larger.
+        values, other_values = sorted([values, other_values], key=len)
+        probe = set(values)
+        return any(v in probe for v in other_values)
+
+    if operator == '!=':
+        # Some pair of values differs unless all values on both sides are
+        # the same.
+        return len(set(values).union(other_values)) > 1
+
+    # For relational operators, only the extreme numbers on each side
+    # matter. NaN never compares true, so we leave it out.
+    extremes = number_range(values)
+    other_extremes = number_range(other_values)
+    if extremes is None or other_extremes is None:
         return False
+    cmp_func = XPathObject.COMP_FUNCTIONS[operator]
+    if operator in ('<', '<='):
+        return cmp_func(extremes[0], other_extremes[1])
+    return cmp_func(extremes[1], other_extremes[0])
 
 
 class XPathBoolean(XPathObject):
@@ -218,13 +271,7 @@ class XPathString(XPathObject):
         self.value = value or ''
 
     def to_number(self):
-        try:
-            val = float(self.value)
-        except ValueError:
-            val = float("nan")
-        if str(val) in (str(float("inf")), str(float("-inf"))):
-            val = float("nan")
-        return XPathNumber(val)
+        return XPathNumber(string_to_number(self.value))
 
     def to_boolean(self):
         return XPathBoolean(len(self.value) != 0)
@@ -276,6 +323,9 @@ def xpath_function(*arg_types, **kw):
         wrapper.xpath_name = name
         wrapper.xpath_arg_types = arg_types
         wrapper.xpath_return_type = return_type
+        # The parts of the evaluation context the function looks at. None
+        # means we don't know, so nothing may be assumed about it.
+        wrapper.xpath_context = kw.get('context')
         return wrapper
     return func_deco
 
@@ -419,19 +469,82 @@ class XPathNode(object):
 class XPathRootNode(XPathNode):
     node_type = 'root'
 
-    def __init__(self, document, namespaces):
+    def __init__(self, document, namespaces, statistics=None):
         self._document = document
         self._namespaces = namespaces
         self._children = None
         self._xml_ids = {}
+        self._indexes = {}
+        self._element_nodes = None
+        self._elements_modified = False
+        # Held by anything changing the tree. Readers don't need it.
+        self._write_lock = threading.Lock()
+        if statistics is None:
+            statistics = DocumentStatistics()
+        # Passing statistics=False skips gathering statistics entirely.
+        self.statistics = statistics or None
         self._build_tree()
 
     def _build_tree(self):
         self._build_node()
+        statistics = self.statistics
+        if statistics is not None:
+            statistics.start(self)
         for i, node in enumerate(self._walk_in_doc_order()):
             node._doc_position = i
+            if statistics is not None:
+                statistics.add_node(node)
             if isinstance(node, XPathElementNode) and node.xml_id is not None:
                 self._xml_ids.setdefault(node.xml_id, node)
+        if statistics is not None:
+            statistics.finish()
+
+    def expand_qname(self, qname):
+        return expand_qname(qname, self._namespaces)
+
+    def get_statistics(self):
+        """Return the DocumentStatistics gathered when this tree was built, or
+        None if statistics were disabled.
+        """
+        return self.statistics
+
+    def add_index(self, index):
+        index.build(self)
+        self._indexes[index.key] = index
+        return index
+
+    def get_index(self, index_type, owner_name, key_axis, key_name):
+        return self._indexes.get((index_type, owner_name, key_axis, key_name))
+
+    def mark_elements_modified(self):
+        """Note that elements have been removed from the tree, so it no longer
+        matches the ElementTree it was built from.
+        """
+        self._elements_modified = True
+
+    def find_elements(self, node, path):
+        """Select elements from node with an ElementPath expression.
+
+        From the root node, the path is evaluated relative to a parent of the
+        root elements. This returns None if the tree no longer matches its
+        ElementTree.
+        """
+        if self._elements_modified:
+            return None
+        if self._element_nodes is None:
+            nodes = {}
+            parent = ET.Element('')
+            for child in self.get_children():
+                if isinstance(child, XPathElementNode):
+                    parent.append(child._enode)
+            for desc in self._walk_in_doc_order():
+                if isinstance(desc, XPathElementNode):
+                    nodes[desc._enode] = desc
+            self._element_parent = parent
+            self._element_nodes = nodes
+        enode = self._element_parent if node is self else node._enode
+        element_nodes = self._element_nodes
+        return [element_nodes[e] for e in enode.iterfind(path)]
 
     def _build_node(self):
         # TODO: Build non-element children.
@@ -542,7 +655,15 @@ class XPathElementNode(XPathNode):
         return elem
 
     def remove_child(self, child):
-        self._children.remove(child)
+        # Replace the list rather than mutating it, so anything reading the
+        # children in another thread sees either the old list or the new one.
+        # Writers take the document's lock so they don't undo each other's
+        # changes.
+        root = self.get_root()
+        with root._write_lock:
+            self._children = [c for c in self._children if c is not child]
+        if child.node_type == 'element':
+            root.mark_elements_modified()
 
 
 class XPathAttributeNode(XPathNode):
@@ -2,18 +2,38 @@
 
 import math
 import operator
+import sys
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
 
 from xpathlet import ast
-from xpathlet.parser import parser
-# from xpathlet.new_parser import parser
+from xpathlet.budget import (
+    LIST_ENTRY_SIZE, PAIR_SIZE, budget_scope, value_size)
+from xpathlet.compiler import (
+    CompiledExpression, CompiledExpressionSet, InterpretedExpression,
+    compile_expression)
 from xpathlet.constants import XML_NAMESPACE
 from xpathlet.data_model import (
-    XPathRootNode, XPathNodeSet, XPathNumber, XPathString, XPathBoolean)
+    XPathRootNode, XPathObject, XPathNodeSet, XPathNumber, XPathString,
+    XPathBoolean, compare_string_values)
 from xpathlet.core_functions import CoreFunctionLibrary
+from xpathlet.indexes import NumericRangeIndex, key_values
+from xpathlet.kernels import any_compare_grouped, string_to_number
+from xpathlet.parser import parse
+from xpathlet.planner import PredicateGroup, COMPARISON_OPS
 
 
-def build_xpath_tree(source):
-    """This builds an XPath node tree with namespace prefix mappings."""
+# How many of the most recent promotions tier_statistics() reports.
+PROMOTION_HISTORY = 100
+
+
+def build_xpath_tree(source, statistics=None):
+    """This builds an XPath node tree with namespace prefix mappings.
+
+    Basic document statistics are gathered by default. Pass a configured
+    DocumentStatistics to gather more, or False to gather none.
+    """
     # TODO: Handle namespace prefix scoping?
     from xml.etree.ElementTree import iterparse, ElementTree
 
@@ -26,7 +46,23 @@ def build_xpath_tree(source):
         namespaces[prefix] = uri
 
     doc = ElementTree(ip.root)
-    return XPathRootNode(doc, namespaces)
+    return XPathRootNode(doc, namespaces, statistics)
+
+
+def index_lookups(plan):
+    """List the (index, select arguments) pairs in an index plan."""
+    if plan[0] in ('and', 'or'):
+        return index_lookups(plan[1]) + index_lookups(plan[2])
+    return [plan]
+
+
+def run_index_plan(plan):
+    if plan[0] == 'and':
+        return run_index_plan(plan[1]) & run_index_plan(plan[2])
+    if plan[0] == 'or':
+        return run_index_plan(plan[1]) | run_index_plan(plan[2])
+    index, args = plan
+    return index.select(*args)
 
 
 class Axis(object):
@@ -84,10 +120,43 @@ class Axis(object):
         raise NotImplementedError('Axis %r' % (self.axis,))
 
 
+class Evaluation(object):
+    """State shared by every context in a single evaluation."""
+
+    def __init__(self, compiled, cache=None, budget=None):
+        self.compiled = compiled
+        if cache is None:
+            cache = {}
+        self.cache = cache
+        self.budget = budget
+
+    def cache_key(self, context, expr):
+        """Build a key for caching the value of expr in this context.
+
+        Only subexpressions the compiler has identified as cacheable get a key,
+        and the key only includes the parts of the context the value depends
+        on. Everything else gets None.
+        """
+        cached = self.compiled.cached.get(id(expr))
+        if cached is None:
+            return None
+        cache_id, deps = cached
+        key = [cache_id]
+        if 'node' in deps:
+            key.append(context.node)
+        elif 'root' in deps:
+            key.append(context.node.get_root())
+        if 'position' in deps:
+            key.append(context.position)
+        if 'size' in deps:
+            key.append(context.size)
+        return tuple(key)
+
+
 class Context(object):
     def __init__(self, node, position, size, variables, functions, namespaces,
                  expression=None, root_node=None, metadata=None,
-                 trace_collector=None):
+                 trace_collector=None, evaluation=None):
         self.node = node
         self.position = position
         self.size = size
@@ -98,6 +167,7 @@ class Context(object):
         self.root_node = root_node
         self.metadata = metadata or {}
         self.trace_collector = trace_collector
+        self.evaluation = evaluation
 
     def sub_context(self, node=None, position=None, size=None):
         if node is None:
@@ -108,7 +178,7 @@ class Context(object):
             size = self.size
         return Context(node, position, size, self.variables, self.functions,
                        self.namespaces, self.expression, self.root_node,
-                       self.metadata, self.trace_collector)
+                       self.metadata, self.trace_collector, self.evaluation)
 
     def expand_qname(self, qname):
         prefix, name = '', qname
@@ -133,12 +203,45 @@ class Context(object):
         if step_id is not None:
             self.trace_collector.finish_step(step_id, result)
 
+    def trace_bulk(self, expr_node, loops, rows):
+        if self.trace_collector is not None:
+            self.trace_collector.bulk_step(expr_node, loops, rows)
+
 
 class ExpressionEngine(object):
+    """Evaluates XPath expressions against a document.
+
+    Once a document has been built, an engine, its document and any
+    expressions it has compiled may be shared between threads and used
+    concurrently. All the state for a single evaluation is kept in its own
+    Context and Evaluation, and documents and compiled expressions aren't
+    modified by evaluation. Changing the engine's variables or function
+    libraries, or adding indexes, while other threads are evaluating is not
+    supported.
+
+    If an ExpressionCache is given, expressions are parsed through it, so
+    that expressions it already has don't need parsing again.
+
+    If promote_after is given, evaluate() only parses expressions it is given
+    as source, and interprets them as written, until it has been given the
+    same source that many times. After that the expression is compiled and
+    the compiled form is used from then on. This keeps compilation off the
+    first requests for expressions that turn out to be rarely used. The
+    counts are reported by tier_statistics(). Only the tier_table_size most
+    recently used sources are remembered, so expressions built on the fly
+    don't pile up. A forgotten source starts counting again from scratch.
+    """
+
     def __init__(self, root_node, variables=None, function_libraries=None,
-                 debug=False):
+                 debug=False, expression_cache=None, promote_after=None,
+                 tier_table_size=10000):
         self.debug = debug
         self.root_node = root_node
+        self.expression_cache = expression_cache
+        self.promote_after = promote_after
+        self.tier_table_size = tier_table_size
+        self._tier_lock = threading.Lock()
+        self.reset_tiers()
         if variables is None:
             variables = {}
         self.variables = variables
@@ -150,20 +253,378 @@ class ExpressionEngine(object):
         if self.debug:
             print u' '.join(str(a) for a in args)
 
+    def compile(self, xpath_expr):
+        """Parse and analyse an expression so it can be evaluated repeatedly.
+        """
+        if isinstance(xpath_expr, CompiledExpression):
+            return xpath_expr
+        expr = None
+        if self.expression_cache is not None:
+            expr = self.expression_cache.parse(xpath_expr)
+        return compile_expression(
+            xpath_expr, self._find_function, self.root_node.statistics,
+            self.root_node._namespaces, expr)
+
+    def _tiered_compile(self, xpath_expr):
+        """Return the form of an expression evaluate() should use now.
+
+        Compiled expressions are used as they are. Sources are parsed and
+        interpreted until they have been seen promote_after times, and
+        compiled the next time they're seen.
+        """
+        if isinstance(xpath_expr, InterpretedExpression):
+            return xpath_expr
+        if self.promote_after is None or isinstance(
+                xpath_expr, CompiledExpression):
+            return self.compile(xpath_expr)
+        # Parsing and compiling happen outside the lock, so they only hold
+        # up the evaluation that needs them.
+        tier, executions = self._count_execution(xpath_expr)
+        if tier is None:
+            if self.expression_cache is not None:
+                expr = self.expression_cache.parse(xpath_expr)
+            else:
+                expr = parse(xpath_expr)
+            if expr is None:
+                # Let compile() complain about it.
+                return self.compile(xpath_expr)
+            tier, executions = self._count_execution(
+                xpath_expr, InterpretedExpression(xpath_expr, expr))
+        interpreted = tier[1]
+        if (executions < self.promote_after or
+                not isinstance(interpreted, InterpretedExpression)):
+            return interpreted
+        compiled = compile_expression(
+            xpath_expr, self._find_function, self.root_node.statistics,
+            self.root_node._namespaces, interpreted.expr)
+        with self._tier_lock:
+            # Another thread may have promoted it while we were compiling, in
+            # which case we use theirs.
+            if tier[1] is interpreted:
+                tier[1] = compiled
+                self._promotions.append((xpath_expr, executions))
+                self._tier_counts['promoted'] += 1
+            return tier[1]
+
+    def _count_execution(self, source, new_form=None):
+        """Count an execution of source and return (tier, executions before
+        this one).
+
+        If we don't know the source and aren't given a new_form for it, this
+        returns (None, None) without counting anything.
+        """
+        with self._tier_lock:
+            tier = self._tiers.pop(source, None)
+            if tier is None:
+                if new_form is None:
+                    return (None, None)
+                tier = [0, new_form]
+            # Putting it back at the end keeps the table in LRU order.
+            self._tiers[source] = tier
+            while len(self._tiers) > self.tier_table_size:
+                self._tiers.popitem(last=False)
+                self._tier_counts['evicted'] += 1
+            executions = tier[0]
+            tier[0] += 1
+            if executions < self.promote_after:
+                self._tier_counts['interpreted'] += 1
+            else:
+                self._tier_counts['compiled'] += 1
+            return (tier, executions)
+
+    def tier_statistics(self):
+        """Report how evaluate() has been running expressions.
+
+        This returns a dict with the number of evaluations that were
+        'interpreted' and 'compiled', the number of expressions still
+        'interpreting', how many have been 'promoted' and 'evicted' from the
+        table, and the most recent 'promotions' as a list of (source,
+        executions before promotion) in the order they were promoted.
+        """
+        with self._tier_lock:
+            stats = dict(self._tier_counts)
+            stats['interpreting'] = sum(
+                1 for _count, form in self._tiers.itervalues()
+                if isinstance(form, InterpretedExpression))
+            stats['promotions'] = list(self._promotions)
+        return stats
+
+    def reset_tiers(self):
+        """Forget every source evaluate() has seen, and the statistics."""
+        with self._tier_lock:
+            # Maps source to [executions, InterpretedExpression or
+            # CompiledExpression], least recently used first.
+            self._tiers = OrderedDict()
+            self._promotions = deque(maxlen=PROMOTION_HISTORY)
+            self._tier_counts = {'interpreted': 0, 'compiled': 0,
+                                 'promoted': 0, 'evicted': 0}
+
+    def compile_all(self, xpath_exprs):
+        """Compile several expressions so they can be evaluated together."""
+        if isinstance(xpath_exprs, CompiledExpressionSet):
+            return xpath_exprs
+        sources = [getattr(e, 'source', e) for e in xpath_exprs]
+        exprs = None
+        if self.expression_cache is not None:
+            exprs = [self.expression_cache.parse(s) for s in sources]
+        return CompiledExpressionSet(
+            sources, self._find_function, self.root_node.statistics,
+            self.root_node._namespaces, exprs)
+
+    def evaluate_all(self, xpath_exprs, context_node=None, variables=None,
+                     metadata=None, budget=None):
+        """Evaluate several expressions against the same context.
+
+        Work shared between the expressions, such as common location path
+        prefixes and scans of the nodes they select, is only done once. This
+        returns a list of results in the same order as the expressions.
+        """
+        if context_node is None:
+            context_node = self.root_node
+        if variables is None:
+            variables = self.variables
+        cache = {}
+        results = []
+        with budget_scope(budget, variables):
+            for compiled in self.compile_all(xpath_exprs):
+                context = Context(context_node, 1, 1, variables.copy(), {},
+                                  self.root_node._namespaces, compiled.expr,
+                                  self.root_node, metadata, None,
+                                  Evaluation(compiled, cache, budget))
+                results.append(self._eval_expr(context, compiled.expr))
+        return results
+
     def evaluate(self, xpath_expr, context_node=None, variables=None,
                  context_position=1, context_size=1, metadata=None,
-                 trace_collector=None):
+                 trace_collector=None, budget=None):
+        """Evaluate an expression and return the resulting XPathObject.
+
+        If a Budget is given, BudgetExceeded is raised as soon as the
+        evaluation goes over it. Memory allocated during the evaluation is
+        released from the budget when it finishes, but the peak remains.
+        """
         if context_node is None:
             context_node = self.root_node
         if variables is None:
             variables = self.variables
-        expr = parser.parse(xpath_expr)
+        compiled = self._tiered_compile(xpath_expr)
         context = Context(context_node, context_position, context_size,
                           variables.copy(), {}, self.root_node._namespaces,
-                          expr, self.root_node, metadata, trace_collector)
-        return self._eval_expr(context, expr)
+                          compiled.expr, self.root_node, metadata,
+                          trace_collector, Evaluation(compiled, None, budget))
+        with budget_scope(budget, variables):
+            return self._eval_expr(context, compiled.expr)
+
+    def evaluate_many(self, xpath_expr, context_nodes, variables=None,
+                      metadata=None, budget=None):
+        """Evaluate an expression once for each of the given context nodes.
+
+        The expression is compiled once and everything that doesn't depend on
+        the context node is only evaluated once. This returns a list of
+        results in the same order as the context nodes.
+        """
+        if variables is None:
+            variables = self.variables
+        compiled = self.compile(xpath_expr)
+        context_nodes = list(context_nodes)
+        # We reuse this context for every context node rather than building
+        # a new one each time.
+        context = Context(self.root_node, 1, 1, variables.copy(), {},
+                          self.root_node._namespaces, compiled.expr,
+                          self.root_node, metadata, None,
+                          Evaluation(compiled, None, budget))
+        with budget_scope(budget, variables):
+            return self._eval_many(context, compiled, context_nodes)
+
+    def _eval_many(self, context, compiled, context_nodes):
+        expr = compiled.expr
+        if isinstance(expr, ast.LocationPath) and not expr.absolute:
+            return self._eval_location_path_many(context, expr, context_nodes)
+
+        deps = compiled.dependencies[id(expr)]
+        results = {}
+        keys = []
+        for node in context_nodes:
+            key = None
+            if 'node' in deps:
+                key = node
+            elif 'root' in deps:
+                key = node.get_root()
+            if key not in results:
+                context.node = node
+                results[key] = self._eval_expr(context, expr)
+            keys.append(key)
+        return [results[key] for key in keys]
+
+    def _eval_location_path_many(self, context, expr, context_nodes):
+        # We step from each node only once, however many of the context nodes
+        # lead to it, and keep track of which context nodes those were.
+        sources = {}
+        for i, node in enumerate(context_nodes):
+            sources.setdefault(node, set()).add(i)
+        for step in expr.steps:
+            new_sources = {}
+            for node, indices in sources.iteritems():
+                context.node = node
+                for new_node in self._eval_expr(context, step).value:
+                    new_sources.setdefault(new_node, set()).update(indices)
+            sources = new_sources
+
+        results = [[] for _ in context_nodes]
+        for node, indices in sources.iteritems():
+            for i in indices:
+                results[i].append(node)
+        return [XPathNodeSet(nodes) for nodes in results]
+
+    def iterate(self, xpath_expr, context_node=None, variables=None,
+                limit=None, offset=0, metadata=None, budget=None):
+        """Yield the nodes an expression selects, in document order.
+
+        The first offset nodes are skipped and at most limit nodes are
+        yielded. Location paths whose steps are known to produce nodes in
+        document order are evaluated lazily, so no sorting is needed and the
+        underlying axes are only walked as far as necessary. Anything else is
+        evaluated in full first.
+        """
+        if context_node is None:
+            context_node = self.root_node
+        if variables is None:
+            variables = self.variables
+        compiled = self.compile(xpath_expr)
+        context = Context(context_node, 1, 1, variables.copy(), {},
+                          self.root_node._namespaces, compiled.expr,
+                          self.root_node, metadata, None,
+                          Evaluation(compiled, None, budget))
+        stop = None
+        if limit is not None:
+            stop = offset + limit
+
+        with budget_scope(budget, variables):
+            stages = self._stream_stages(context, compiled.expr)
+            if stages is None:
+                result = self._eval_expr(context, compiled.expr)
+                if result.object_type != 'node-set':
+                    raise ValueError(
+                        'Expression does not select nodes: %r' % (
+                            compiled.source,))
+                nodes = iter(result.value)
+            else:
+                nodes = iter([context_node])
+                if compiled.expr.absolute:
+                    nodes = iter([context_node.get_root()])
+                for axis, step in stages:
+                    nodes = self._stream_step(context, axis, step, nodes)
+            for node in islice(nodes, offset, stop):
+                yield node
+
+    def _lazy_predicates(self, context, step):
+        plan = self._predicate_plan(context, step)
+        return not step.predicates or (plan and all(g.fused for g in plan))
+
+    def _stream_stages(self, context, expr):
+        """Work out how to evaluate a location path lazily.
+
+        This returns a list of (axis, step) pairs which, applied in turn to
+        the starting node, produce the path's nodes in document order without
+        duplicates. If the path can't be evaluated like that, this returns
+        None.
+        """
+        if not isinstance(expr, ast.LocationPath):
+            return None
+        # Flat node-sets are in document order and none of the nodes is a
+        # descendant of another, so applying a forward axis to each in turn
+        # produces nodes in document order.
+        flat = True
+        stages = []
+        steps = list(expr.steps)
+        while steps:
+            step = steps.pop(0)
+            axis = step.axis
+            if (axis == 'descendant-or-self' and not step.predicates and
+                    isinstance(step.node_test, ast.NodeType) and
+                    step.node_test.node_type == 'node' and steps and
+                    steps[0].axis == 'child' and
+                    self._lazy_predicates(context, steps[0])):
+                # //name is the same as descendant::name unless it has
+                # positional predicates.
+                axis, step = 'descendant', steps.pop(0)
+            if axis == 'attribute':
+                flat = True
+            elif axis == 'child':
+                if not flat:
+                    return None
+            elif axis in ('descendant', 'descendant-or-self'):
+                if not flat:
+                    return None
+                flat = False
+            elif axis != 'self':
+                return None
+            stages.append((axis, step))
+        return stages
+
+    def _stream_step(self, context, axis_name, step, nodes):
+        axis = Axis(axis_name)
+        plan = self._predicate_plan(context, step)
+        lazy = self._lazy_predicates(context, step)
+        budget = context.evaluation.budget
+        for node in nodes:
+            ctx = context.sub_context(node=node)
+            if not lazy:
+                # Positional predicates need all of this node's candidates.
+                for new_node in self._eval_path_step(ctx, step).value:
+                    yield new_node
+                continue
+            for new_node in axis.select_nodes(ctx):
+                if budget is not None:
+                    budget.visit()
+                if not self._test_node(ctx, step.node_test, axis, new_node):
+                    continue
+                if step.predicates and not self._filter_predicates(
+                        ctx, step.predicates, [(1, new_node)], plan):
+                    continue
+                yield new_node
+
+    def explain(self, xpath_expr, analyze=False, context_node=None,
+                variables=None):
+        """Describe how an expression will be evaluated.
+
+        This returns an ExplainPlan, which can be rendered as text or JSON. If
+        analyze is true, the expression is also evaluated so the plan can
+        include actual cardinalities alongside the estimated ones.
+        """
+        from xpathlet.explain import AnalyzeCollector, PlanBuilder
+
+        if context_node is None:
+            context_node = self.root_node
+        if variables is None:
+            variables = self.variables
+        compiled = self.compile(xpath_expr)
+        context = Context(context_node, 1, 1, variables.copy(), {},
+                          self.root_node._namespaces, compiled.expr,
+                          self.root_node, evaluation=Evaluation(compiled))
+        plan = PlanBuilder(self, compiled, context).build_plan()
+        if analyze:
+            collector = AnalyzeCollector()
+            result = self.evaluate(compiled, context_node, variables,
+                                   trace_collector=collector)
+            plan.add_actuals(collector, result)
+        return plan
 
     def _eval_expr(self, context, expr):
+        if context.evaluation is not None:
+            cache_key = context.evaluation.cache_key(context, expr)
+            if cache_key is not None:
+                cache = context.evaluation.cache
+                if cache_key not in cache:
+                    value = self._eval_expr_uncached(context, expr)
+                    budget = context.evaluation.budget
+                    if budget is not None:
+                        budget.allocate(value_size(value))
+                    cache[cache_key] = value
+                return cache[cache_key]
+        return self._eval_expr_uncached(context, expr)
+
+    def _eval_expr_uncached(self, context, expr):
         self.dp('\n====')
         self.dp('eval:', type(expr).__name__)
         self.dp(' context:', context)
@@ -202,39 +663,156 @@ class ExpressionEngine(object):
         assert node_set.object_type == 'node-set'
 
         nodes = [(i + 1, n) for i, n in enumerate(node_set.value)]
-        nodes = self._filter_predicates(context, filter_expr.predicates, nodes)
+        nodes = self._filter_predicates(
+            context, filter_expr.predicates, nodes,
+            self._predicate_plan(context, filter_expr))
         return XPathNodeSet([n for _i, n in nodes])
 
     def _eval_location_path(self, context, expr):
-        nodes = set([context.node])
+        start_node = context.node
         if expr.absolute:
-            nodes = set([context.node.get_root()])
-        return self._apply_location_path(context, expr, nodes)
-
-    def _apply_location_path(self, context, expr, nodes):
+            start_node = context.node.get_root()
+        nodes = self._find_elements(context, expr, start_node)
+        if nodes is not None:
+            return XPathNodeSet(nodes)
+        return self._apply_location_path(
+            context, expr, set([start_node]), start_node)
+
+    def _find_elements(self, context, expr, start_node):
+        """Evaluate a location path with ElementTree's ElementPath, if we can.
+
+        Budgets and traces need to see each step, so we don't do this when
+        they're in use. Paths sharing a prefix with others are left to share
+        it, and we'd rather use an index for predicates if the document has
+        any.
+        """
+        evaluation = context.evaluation
+        if evaluation is None or evaluation.budget is not None:
+            return None
+        if context.trace_collector is not None:
+            return None
+        if id(expr) in evaluation.compiled.path_prefixes:
+            return None
+        path = evaluation.compiled.element_paths.get(id(expr))
+        if path is None or start_node.node_type not in ('root', 'element'):
+            return None
+        root = start_node.get_root()
+        if '[' in path and root._indexes:
+            return None
+        nodes = root.find_elements(start_node, path)
+        if nodes is None:
+            return None
+        # Paths with several descendant steps can find a node more than once.
+        return set(nodes)
+
+    def _apply_location_path(self, context, expr, nodes, start_node=None):
         assert isinstance(expr, ast.LocationPath)
-        for step in expr.steps:
+        # If this path shares leading steps with another path in the same
+        # expression, we may already have the nodes those steps select.
+        prefixes = {}
+        if start_node is not None and context.evaluation is not None:
+            prefixes = context.evaluation.compiled.path_prefixes.get(
+                id(expr), {})
+        cache = context.evaluation and context.evaluation.cache
+        budget = context.evaluation and context.evaluation.budget
+        done = 0
+        for length in sorted(prefixes, reverse=True):
+            cached = cache.get((prefixes[length], start_node))
+            if cached is not None:
+                nodes, done = cached, length
+                break
+
+        for length, step in enumerate(expr.steps[done:], done + 1):
             assert isinstance(step, ast.Step)
-            new_nodes = set()
-            for node in nodes:
-                new_nodes.update(self._eval_expr(
-                        context.sub_context(node=node), step).value)
+            new_nodes = None
+            if length - 1 in prefixes:
+                new_nodes = self._scan_shared_prefix(
+                    context, step, nodes, (prefixes[length - 1], start_node))
+            if new_nodes is None:
+                new_nodes = set()
+                size = 0
+                for node in nodes:
+                    new_nodes.update(self._eval_expr(
+                            context.sub_context(node=node), step).value)
+                    if budget is not None:
+                        new_size = sys.getsizeof(new_nodes)
+                        budget.allocate(new_size - size)
+                        size = new_size
+                if budget is not None:
+                    # Only one step's nodes are kept at a time.
+                    budget.free(size)
             nodes = new_nodes
+            if length in prefixes:
+                cache[(prefixes[length], start_node)] = frozenset(nodes)
+                if budget is not None:
+                    budget.allocate(sys.getsizeof(nodes))
 
         return XPathNodeSet(nodes)
 
+    def _scan_shared_prefix(self, context, step, nodes, prefix_key):
+        """Apply a step to all the nodes selected by a shared path prefix.
+
+        Children and attributes of the prefix's nodes are grouped by name in a
+        single scan, which is shared by every path that continues from the
+        same prefix. This returns None if the step can't be applied this way.
+        """
+        if step.axis not in ('child', 'attribute'):
+            return None
+        node_test = step.node_test
+        if not isinstance(node_test, ast.NameTest) or '*' in node_test.name:
+            return None
+        # Positions are relative to each parent, which the scan loses.
+        plan = self._predicate_plan(context, step)
+        if step.predicates and not (plan and all(g.fused for g in plan)):
+            return None
+
+        cache = context.evaluation.cache
+        scan_key = ('scan', step.axis) + prefix_key
+        by_name = cache.get(scan_key)
+        if by_name is None:
+            by_name = {}
+            budget = context.evaluation.budget
+            for node in nodes:
+                if step.axis == 'child':
+                    children = [c for c in node.get_children()
+                                if c.node_type == 'element']
+                else:
+                    children = node.get_attributes()
+                if budget is not None:
+                    budget.visit(len(children))
+                    budget.allocate(LIST_ENTRY_SIZE * len(children))
+                for child in children:
+                    by_name.setdefault(child.expanded_name(), []).append(child)
+            cache[scan_key] = by_name
+
+        selected = by_name.get(context.expand_qname(node_test.name), [])
+        selected = list(enumerate(selected, 1))
+        if step.predicates:
+            selected = self._filter_predicates(
+                context, step.predicates, selected, plan)
+        return set(node for _i, node in selected)
+
     def _eval_path_step(self, context, step):
         axis = Axis(step.axis)
+        budget = context.evaluation and context.evaluation.budget
 
         nodes = []
         i = 1
         for node in axis.select_nodes(context):
+            if budget is not None:
+                budget.visit()
             if self._test_node(context, step.node_test, axis, node):
                 nodes.append((i, node))
                 i += 1
+                if budget is not None:
+                    budget.allocate(PAIR_SIZE)
 
-        nodes = self._filter_predicates(context, step.predicates, nodes)
-        return XPathNodeSet([node for _i, node in nodes])
+        plan = self._predicate_plan(context, step)
+        selected = self._filter_predicates(
+            context, step.predicates, nodes, plan)
+        if budget is not None:
+            budget.free(PAIR_SIZE * len(nodes))
+        return XPathNodeSet([node for _i, node in selected])
 
     def _test_node(self, context, test_expr, axis, node):
         if isinstance(test_expr, ast.NameTest):
@@ -249,24 +827,274 @@ class ExpressionEngine(object):
 
         assert False
 
-    def _filter_predicates(self, context, predicates, nodes):
-        for predicate in predicates:
-            assert isinstance(predicate, ast.Predicate)
-            new_nodes = self._filter_predicate(context, predicate, nodes)
+    def _predicate_plan(self, context, expr):
+        if context.evaluation is None:
+            return None
+        return context.evaluation.compiled.predicate_plans.get(id(expr))
+
+    def _filter_predicates(self, context, predicates, nodes, plan=None):
+        if plan is None:
+            plan = [PredicateGroup([p], False) for p in predicates]
+        for group in plan:
+            if group.fused:
+                new_nodes = self._filter_fused_predicates(
+                    context, group.predicates, nodes)
+            else:
+                [predicate] = group.predicates
+                assert isinstance(predicate, ast.Predicate)
+                new_nodes = self._filter_predicate(context, predicate, nodes)
             if not new_nodes:
                 return []
-            nodes = [(i + 1, n[1]) for i, n in enumerate(sorted(new_nodes))]
+            # Filtering preserves order, so we only need to renumber.
+            nodes = [(i + 1, n[1]) for i, n in enumerate(new_nodes)]
+        return nodes
+
+    def _filter_fused_predicates(self, context, predicates, nodes):
+        # None of these predicates care about position or size, so we can
+        # apply each of them to all the nodes at once.
+        for predicate in predicates:
+            if not nodes:
+                break
+            matches = self._index_matches(context, predicate.expr, nodes)
+            if matches is None:
+                keep = self._bulk_values(context, predicate.expr, nodes)
+            else:
+                keep = [node in matches for _i, node in nodes]
+            context.trace_bulk(predicate, len(nodes), sum(keep))
+            nodes = [n for n, k in zip(nodes, keep) if k]
         return nodes
 
+    def _bulk_kind(self, context, expr):
+        """Work out how to evaluate an expression for many nodes at once.
+
+        This returns None if the expression has to be evaluated separately for
+        each node.
+        """
+        deps = context.evaluation.compiled.dependencies[id(expr)]
+        if deps <= set(['root']):
+            return 'constant'
+        if self._index_key_path(context, expr) is not None:
+            return 'key'
+        if isinstance(expr, ast.OperatorExpr):
+            if expr.op in ('and', 'or'):
+                return expr.op
+            if expr.op in COMPARISON_OPS:
+                kinds = set([self._bulk_kind(context, expr.left),
+                             self._bulk_kind(context, expr.right)])
+                if kinds <= set(['key', 'constant']):
+                    return 'comparison'
+        if isinstance(expr, ast.FunctionCall):
+            if expr.name in ('not', 'boolean') and len(expr.args) == 1:
+                if isinstance(self._find_function_library(expr.name),
+                              CoreFunctionLibrary):
+                    return expr.name
+        return None
+
+    def _bulk_values(self, context, expr, nodes):
+        """Evaluate expr as a boolean for each of the (position, node) pairs
+        given, and return a list of the results.
+        """
+        kind = self._bulk_kind(context, expr)
+        budget = context.evaluation.budget
+
+        if kind is None:
+            results = []
+            ctx = context.sub_context(size=len(nodes))
+            for i, node in nodes:
+                if budget is not None:
+                    budget.evaluate_predicates()
+                ctx.node, ctx.position = node, i
+                results.append(
+                    self._eval_expr(ctx, expr).coerce('boolean').value)
+            return results
+
+        if kind in ('and', 'or'):
+            left = self._bulk_values(context, expr.left, nodes)
+            # Only evaluate the right hand side for nodes that need it.
+            undecided = (kind == 'and')
+            rest = [n for n, v in zip(nodes, left) if v == undecided]
+            right = iter(rest and self._bulk_values(context, expr.right, rest))
+            return [next(right) if v == undecided else v for v in left]
+
+        if kind == 'not':
+            return [not v for v in self._bulk_values(
+                    context, expr.args[0], nodes)]
+
+        if kind == 'boolean':
+            return self._bulk_values(context, expr.args[0], nodes)
+
+        if budget is not None:
+            budget.evaluate_predicates(len(nodes))
+
+        if kind == 'constant':
+            value = self._bulk_operand(context, expr, nodes)
+            return [value.coerce('boolean').value] * len(nodes)
+
+        if kind == 'key':
+            return [bool(v) for v in self._bulk_operand(context, expr, nodes)]
+
+        op, left, right = expr.op, expr.left, expr.right
+        if self._bulk_kind(context, left) == 'constant':
+            op = XPathNumber.COMP_REFLECTIONS[op]
+            left, right = right, left
+        left = self._bulk_operand(context, left, nodes)
+        right = self._bulk_operand(context, right, nodes)
+        if isinstance(right, XPathObject):
+            # Numeric comparisons can be done for all the nodes together.
+            if right.object_type == 'number':
+                return any_compare_grouped(left, right.value, op)
+            if right.object_type == 'string' and op not in ('=', '!='):
+                return any_compare_grouped(
+                    left, string_to_number(right.value), op)
+            return [compare_string_values(v, right, op) for v in left]
+        return [compare_string_values(v, w, op) for v, w in zip(left, right)]
+
+    def _bulk_operand(self, context, expr, nodes):
+        # Constants are evaluated once, keys are fetched for each node.
+        key = self._index_key_path(context, expr)
+        if key is not None:
+            return [key_values(node, *key) for _i, node in nodes]
+        return self._eval_expr(context.sub_context(node=nodes[0][1]), expr)
+
     def _filter_predicate(self, context, predicate, nodes):
+        matches = self._index_matches(context, predicate.expr, nodes)
+        if matches is not None:
+            return [(i, node) for i, node in nodes if node in matches]
+
+        budget = context.evaluation and context.evaluation.budget
         ctx = context.sub_context(size=len(nodes))
         new_nodes = []
         for i, node in nodes:
+            if budget is not None:
+                budget.evaluate_predicates()
             if self._eval_expr(
                 ctx.sub_context(node, position=i), predicate).value:
                 new_nodes.append((i, node))
         return new_nodes
 
+    def _index_matches(self, context, expr, nodes):
+        """Answer a predicate expression from a document index, if possible.
+
+        This returns the set of nodes that match the predicate, or None if the
+        predicate has to be evaluated the slow way.
+        """
+        if not nodes:
+            return None
+        owner = nodes[0][1]
+        if owner.node_type != 'element':
+            return None
+        plan = self._index_plan(
+            context, expr, owner.get_root(), owner.expanded_name())
+        if plan is None:
+            return None
+        for index, _args in index_lookups(plan):
+            if not index.covers(n for _i, n in nodes):
+                return None
+        return run_index_plan(plan)
+
+    def _index_plan(self, context, expr, root_node, owner_name):
+        """Work out which index lookups can answer a predicate expression.
+
+        This returns None if there's no way to do it. Otherwise the plan is
+        either an (index, select arguments) pair or an ('and' or 'or', left
+        plan, right plan) triple.
+        """
+        if isinstance(expr, ast.FunctionCall):
+            return self._index_function_plan(
+                context, expr, root_node, owner_name)
+
+        if not isinstance(expr, ast.OperatorExpr):
+            return None
+
+        if expr.op in ('and', 'or'):
+            left = self._index_plan(context, expr.left, root_node, owner_name)
+            if left is None:
+                return None
+            right = self._index_plan(
+                context, expr.right, root_node, owner_name)
+            if right is None:
+                return None
+            return (expr.op, left, right)
+
+        if expr.op not in NumericRangeIndex.OPERATORS:
+            return None
+
+        op, key_path, operand = expr.op, expr.left, expr.right
+        key = self._index_key_path(context, key_path)
+        if key is None:
+            op = XPathNumber.COMP_REFLECTIONS[op]
+            key_path, operand = operand, key_path
+            key = self._index_key_path(context, key_path)
+            if key is None:
+                return None
+
+        operand = self._index_operand(context, operand)
+        if operand is None:
+            return None
+        # A node-set compared to a string with = is a string comparison, which
+        # a numeric index can't help with.
+        if op == '=' and operand.object_type != 'number':
+            return None
+
+        index = root_node.get_index('numeric', owner_name, *key)
+        if index is None:
+            return None
+        return (index, (op, operand.coerce('number').value))
+
+    def _index_function_plan(self, context, function_call, root_node,
+                             owner_name):
+        index_type = {
+            'contains': 'substring',
+            'starts-with': 'prefix',
+            }.get(function_call.name)
+        if index_type is None or len(function_call.args) != 2:
+            return None
+        # Only the core implementations are known to match the index.
+        if not isinstance(self._find_function_library(function_call.name),
+                          CoreFunctionLibrary):
+            return None
+
+        haystack, needle = function_call.args
+        key = self._index_key_path(context, haystack)
+        needle = self._index_operand(context, needle)
+        if key is None or needle is None:
+            return None
+
+        index = root_node.get_index(index_type, owner_name, *key)
+        if index is None:
+            return None
+        return (index, (needle.coerce('string').value,))
+
+    def _index_key_path(self, context, expr):
+        if not isinstance(expr, ast.LocationPath) or expr.absolute:
+            return None
+        if len(expr.steps) != 1 or expr.steps[0].predicates:
+            return None
+        [step] = expr.steps
+        node_test = step.node_test
+        if step.axis == 'self' and isinstance(node_test, ast.NodeType):
+            if node_test.node_type == 'node':
+                return ('self', None)
+        if step.axis in ('attribute', 'child'):
+            if isinstance(node_test, ast.NameTest):
+                if '*' not in node_test.name:
+                    return (step.axis, context.expand_qname(node_test.name))
+        return None
+
+    def _index_operand(self, context, expr):
+        if isinstance(expr, ast.Number):
+            return XPathNumber(expr.value)
+        if isinstance(expr, ast.StringLiteral):
+            return XPathString(expr.value)
+        if isinstance(expr, ast.UnaryExpr):
+            if isinstance(expr.expr, ast.Number):
+                return XPathNumber(-expr.expr.value)
+        if isinstance(expr, ast.VariableReference):
+            value = context.variables.get(expr.name)
+            if value is not None and value.object_type in ('number', 'string'):
+                return value
+        return None
+
     def _eval_predicate(self, context, predicate):
         result = self._eval_expr(context, predicate.expr)
         if isinstance(result, XPathNumber):
@@ -282,12 +1110,24 @@ class ExpressionEngine(object):
     def _eval_variable_reference(self, context, variable_reference):
         return context.variables[variable_reference.name]
 
+    def _find_function_library(self, name):
+        for func_lib in reversed(self.function_libraries):
+            if name in func_lib:
+                return func_lib
+        return None
+
+    def _find_function(self, name):
+        func_lib = self._find_function_library(name)
+        if func_lib is not None:
+            return func_lib[name]
+        return None
+
     def _eval_function_call(self, context, function_call):
         # TODO: Context function libraries?
         args = [self._eval_expr(context, arg) for arg in function_call.args]
-        for func_lib in reversed(self.function_libraries):
-            if function_call.name in func_lib:
-                return func_lib[function_call.name](context, *args)
+        func = self._find_function(function_call.name)
+        if func is not None:
+            return func(context, *args)
         raise ValueError("Undefined function: '%s'" % (function_call.name,))
 
     def _eval_operator_expr(self, context, operator_expr):
@@ -301,7 +1141,7 @@ class ExpressionEngine(object):
             assert all(n.object_type == 'node-set' for n in (left, right))
             return XPathNodeSet(set(left.value) | set(right.value))
 
-        if operator_expr.op in set(['=', '!=', '<=', '<', '>=', '>']):
+        if operator_expr.op in COMPARISON_OPS:
             return left.compare(right, operator_expr.op)
 
         if operator_expr.op in set(['+', '-', '*', 'div', 'mod']):
@@ -0,0 +1,401 @@
+# -*- test-case-name: xpathlet.tests.test_explain -*-
+
+import json
+
+from xpathlet import ast
+from xpathlet.engine import index_lookups
+from xpathlet.planner import PredicateGroup, PredicatePlanner, result_type
+
+
+# Used for name tests when we have no document statistics to go on.
+DEFAULT_NAME_FRACTION = 0.25
+
+
+def _result_rows(result):
+    if result.object_type == 'node-set':
+        return len(result.value)
+    if result.object_type == 'boolean':
+        return int(result.value)
+    return 1
+
+
+def _describe_lookup(index, args):
+    return u'%s %s/%s %s' % (index.index_type, index.owner_qname,
+                             index.key_path, u' '.join(map(unicode, args)))
+
+
+class AnalyzeCollector(object):
+    """A trace collector that counts evaluations and the rows they produce.
+
+    Rows are the number of nodes in a node-set result, one for a true boolean
+    and zero for a false one, and one for anything else.
+    """
+
+    def __init__(self):
+        self.loops = {}
+        self.rows = {}
+
+    def start_step(self, expr, expr_node, root_node, node, position, size):
+        return expr_node
+
+    def finish_step(self, expr_node, result):
+        key = id(expr_node)
+        self.loops[key] = self.loops.get(key, 0) + 1
+        self.rows[key] = self.rows.get(key, 0) + _result_rows(result)
+
+    def bulk_step(self, expr_node, loops, rows):
+        key = id(expr_node)
+        self.loops[key] = self.loops.get(key, 0) + loops
+        self.rows[key] = self.rows.get(key, 0) + rows
+
+
+class PlanNode(object):
+    """One operation in an ExplainPlan.
+
+    Estimated and actual rows are totals over all the times the operation is
+    evaluated, and loops are the number of times it is evaluated.
+    """
+
+    def __init__(self, kind, expr, estimated_rows, estimated_loops,
+                 strategy=None, children=(), flags=(), details=None):
+        self.kind = kind
+        self.expr = expr
+        self.estimated_rows = estimated_rows
+        self.estimated_loops = estimated_loops
+        self.strategy = strategy
+        self.children = list(children)
+        self.flags = list(flags)
+        self.details = details or {}
+        self.actual_rows = None
+        self.actual_loops = None
+
+    def __repr__(self):
+        return '<PlanNode %s %s>' % (self.kind, self.expr.to_str())
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            for node in child.walk():
+                yield node
+
+    def label(self):
+        if self.kind == 'predicate':
+            order = self.details['order']
+            written = self.details['written']
+            if order == written:
+                return u'predicate %s' % (order,)
+            return u'predicate %s (written %s)' % (order, written)
+        return self.kind
+
+    def to_dict(self):
+        return dict(self.details, **{
+                'kind': self.kind,
+                'expr': self.expr.to_str(),
+                'strategy': self.strategy,
+                'flags': self.flags,
+                'estimated_rows': self.estimated_rows,
+                'estimated_loops': self.estimated_loops,
+                'actual_rows': self.actual_rows,
+                'actual_loops': self.actual_loops,
+                'children': [c.to_dict() for c in self.children],
+                })
+
+    def to_lines(self, depth=0):
+        bits = [u'%s%s: %s' % (u'  ' * depth, self.label(),
+                               self.expr.to_str())]
+        if self.strategy is not None:
+            bits.append(u'[%s]' % (self.strategy,))
+        if self.flags:
+            bits.append(u'{%s}' % (u', '.join(self.flags),))
+        bits.append(u'(rows=%.1f loops=%.1f)' % (
+                self.estimated_rows, self.estimated_loops))
+        if self.actual_loops is not None:
+            bits.append(u'(actual rows=%d loops=%d)' % (
+                    self.actual_rows, self.actual_loops))
+        lines = [u' '.join(bits)]
+        for lookup in self.details.get('index_lookups', ()):
+            lines.append(u'%s  index: %s' % (u'  ' * depth, lookup))
+        for child in self.children:
+            lines.extend(child.to_lines(depth + 1))
+        return lines
+
+
+class ExplainPlan(object):
+    """The plan for evaluating an expression, as returned by explain()."""
+
+    def __init__(self, compiled, root, hoisted):
+        self.compiled = compiled
+        self.root = root
+        self.hoisted = hoisted
+        self.analyzed = False
+        self.result = None
+
+    def add_actuals(self, collector, result):
+        for node in self.root.walk():
+            node.actual_loops = collector.loops.get(id(node.expr), 0)
+            node.actual_rows = collector.rows.get(id(node.expr), 0)
+        self.analyzed = True
+        self.result = result
+
+    def to_dict(self):
+        return {
+            'source': self.compiled.source,
+            'expression': self.compiled.expr.to_str(),
+            'hoisted': self.hoisted,
+            'analyzed': self.analyzed,
+            'plan': self.root.to_dict(),
+            }
+
+    def to_json(self, **kw):
+        return json.dumps(self.to_dict(), **kw)
+
+    def to_text(self):
+        lines = [u'Expression: %s' % (self.compiled.expr.to_str(),)]
+        for hoisted in self.hoisted:
+            lines.append(u'Hoisted: %s' % (hoisted,))
+        lines.extend(self.root.to_lines())
+        return u'\n'.join(lines)
+
+    def __unicode__(self):
+        return self.to_text()
+
+
+class PlanBuilder(object):
+    """Builds an ExplainPlan for a compiled expression.
+
+    The plan mirrors the expression's AST, and is annotated with what the
+    engine will do at each step and how many rows we expect it to produce.
+    """
+
+    def __init__(self, engine, compiled, context):
+        self.engine = engine
+        self.compiled = compiled
+        self.context = context
+        self.root_node = context.root_node
+        self.statistics = self.root_node.statistics
+        self.planner = PredicatePlanner(
+            self.statistics, self.root_node._namespaces,
+            compiled.dependencies, compiled.cached, engine._find_function)
+
+    def build_plan(self):
+        hoisted = []
+        for node in self._walk(self.compiled.expr):
+            if id(node) in self.compiled.invariants:
+                hoisted.append(node.to_str())
+        return ExplainPlan(
+            self.compiled, self.build(self.compiled.expr, 1.0), hoisted)
+
+    def _walk(self, expr):
+        yield expr
+        for child in expr.children():
+            for node in self._walk(child):
+                yield node
+
+    def build(self, expr, loops, element_name=None):
+        flags = []
+        if id(expr) in self.compiled.invariants:
+            # Hoisted expressions are only evaluated once.
+            flags.append('hoisted')
+            loops = 1.0
+        elif id(expr) in self.compiled.cached:
+            flags.append('shared')
+
+        build_func = {
+            ast.AbsoluteLocationPath: self._build_location_path,
+            ast.LocationPath: self._build_location_path,
+            ast.PathExpr: self._build_path_expr,
+            ast.FilterExpr: self._build_filter_expr,
+            ast.FunctionCall: self._build_function_call,
+            ast.OperatorExpr: self._build_operator_expr,
+            ast.UnaryExpr: self._build_unary_expr,
+            }.get(type(expr), self._build_leaf)
+        node = build_func(expr, loops, element_name)
+        node.flags[:0] = flags
+        return node
+
+    def _build_leaf(self, expr, loops, element_name):
+        kind = {
+            ast.Number: 'number',
+            ast.StringLiteral: 'string',
+            ast.VariableReference: 'variable',
+            }[type(expr)]
+        return PlanNode(kind, expr, loops, loops)
+
+    def _build_location_path(self, expr, loops, element_name):
+        steps, rows = self._build_steps(expr.steps, loops)
+        flags = []
+        if id(expr) in self.compiled.path_prefixes:
+            flags.append('shared prefix')
+        kind = 'absolute path' if expr.absolute else 'path'
+        return PlanNode(kind, expr, rows, loops, children=steps, flags=flags)
+
+    def _build_path_expr(self, expr, loops, element_name):
+        left = self.build(expr.left, loops)
+        steps, rows = self._build_steps(
+            expr.right.steps, left.estimated_rows)
+        return PlanNode('path expression', expr, rows, loops,
+                        children=[left] + steps)
+
+    def _build_filter_expr(self, expr, loops, element_name):
+        inner = self.build(expr.expr, loops)
+        predicates, rows = self._build_predicates(
+            expr, expr.predicates, inner.estimated_rows, loops, None)
+        return PlanNode('filter', expr, rows, loops,
+                        children=[inner] + predicates)
+
+    def _build_function_call(self, expr, loops, element_name):
+        args = [self.build(a, loops, element_name) for a in expr.args]
+        return PlanNode('function', expr,
+                        self._scalar_rows(expr, loops, element_name), loops,
+                        children=args)
+
+    def _build_operator_expr(self, expr, loops, element_name):
+        left = self.build(expr.left, loops, element_name)
+        # The right hand side of a boolean operator isn't always evaluated.
+        right_loops = loops
+        if expr.op in ('and', 'or'):
+            selectivity = self.planner.selectivity(expr.left, element_name)
+            if expr.op == 'or':
+                selectivity = 1 - selectivity
+            right_loops = loops * selectivity
+        right = self.build(expr.right, right_loops, element_name)
+        if expr.op == '|':
+            rows = left.estimated_rows + right.estimated_rows
+        else:
+            rows = self._scalar_rows(expr, loops, element_name)
+        return PlanNode('operator', expr, rows, loops, children=[left, right])
+
+    def _build_unary_expr(self, expr, loops, element_name):
+        return PlanNode('operator', expr, loops, loops,
+                        children=[self.build(expr.expr, loops)])
+
+    def _scalar_rows(self, expr, loops, element_name):
+        if result_type(expr, self.engine._find_function) == 'boolean':
+            return loops * self.planner.selectivity(expr, element_name)
+        return loops
+
+    def _build_steps(self, steps, rows):
+        nodes = []
+        for step in steps:
+            node = self._build_step(step, rows)
+            nodes.append(node)
+            rows = node.estimated_rows
+        return nodes, rows
+
+    def _name_fraction(self, step):
+        """Estimate the fraction of nodes on an axis that pass a node test."""
+        node_test = step.node_test
+        if isinstance(node_test, ast.NodeType):
+            if node_test.node_type == 'node':
+                return 1.0
+            return DEFAULT_NAME_FRACTION
+        name = self.planner._expand_name(node_test)
+        stats = self.statistics
+        if stats is None:
+            return 1.0 if name is None else DEFAULT_NAME_FRACTION
+        if step.axis == 'attribute':
+            total = stats.node_count('attribute')
+            if name is None:
+                return 1.0
+            count = sum(c for (_e, a), c in stats.attribute_counts.iteritems()
+                        if a == name)
+        else:
+            total = stats.node_count()
+            count = stats.element_count(name)
+        if not total:
+            return 0.0
+        return float(count) / total
+
+    def _max_rows(self, step, loops):
+        # Each node has only one parent, so these axes can't select any node
+        # more than once.
+        stats = self.statistics
+        if stats is None or not isinstance(step.node_test, ast.NameTest):
+            return None
+        if step.axis not in ('child', 'self') and loops > 1:
+            return None
+        if step.axis == 'attribute' or '*' in step.node_test.name:
+            return None
+        name = self.planner._expand_name(step.node_test)
+        if name is None:
+            return None
+        return float(stats.element_count(name))
+
+    def _build_step(self, step, loops):
+        rows = loops * self.planner.fanout(step) * self._name_fraction(step)
+        max_rows = self._max_rows(step, loops)
+        if max_rows is not None:
+            rows = min(rows, max_rows)
+        element_name = None
+        if step.axis != 'attribute':
+            element_name = self.planner._expand_name(step.node_test)
+        predicates, rows = self._build_predicates(
+            step, step.predicates, rows, loops, element_name)
+
+        strategy = 'axis scan'
+        if any(p.strategy == 'value index' for p in predicates):
+            strategy = 'axis scan + value index'
+        return PlanNode('step', step, rows, loops, strategy,
+                        children=predicates)
+
+    def _build_predicates(self, expr, predicates, rows, loops, element_name):
+        if not predicates:
+            return [], rows
+        plan = self.compiled.predicate_plans.get(id(expr))
+        if plan is None:
+            plan = [PredicateGroup([p], False) for p in predicates]
+
+        nodes = []
+        for group in plan:
+            for predicate in group.predicates:
+                node = self._build_predicate(
+                    predicate, rows, loops, element_name, group.fused)
+                node.details['order'] = len(nodes) + 1
+                node.details['written'] = predicates.index(predicate) + 1
+                if group.fused:
+                    node.flags.append('fused')
+                nodes.append(node)
+                rows = node.estimated_rows
+        return nodes, rows
+
+    def _bulk_strategy(self, expr):
+        kind = self.engine._bulk_kind(self.context, expr)
+        if kind is None:
+            return 'per node'
+        children = []
+        if kind in ('and', 'or', 'not', 'boolean'):
+            children = expr.children()
+        if any(self._bulk_strategy(c) != 'bulk' for c in children):
+            return 'bulk + per node'
+        return 'bulk'
+
+    def _build_predicate(self, predicate, rows, loops, element_name, fused):
+        index_plan = None
+        if element_name is not None:
+            index_plan = self.engine._index_plan(
+                self.context, predicate.expr, self.root_node, element_name)
+
+        if index_plan is not None:
+            # The predicate expression is never evaluated.
+            inner = self.build(predicate.expr, 0.0, element_name)
+            strategy = 'value index'
+        else:
+            inner = self.build(predicate.expr, rows, element_name)
+            strategy = 'evaluate'
+            if fused:
+                strategy = self._bulk_strategy(predicate.expr)
+
+        if isinstance(predicate.expr, ast.Number):
+            # At most one node from each evaluation of the step.
+            new_rows = min(rows, loops)
+        else:
+            new_rows = rows * self.planner.selectivity(
+                predicate.expr, element_name)
+
+        details = {}
+        if index_plan is not None:
+            details['index_lookups'] = [
+                _describe_lookup(index, args)
+                for index, args in index_lookups(index_plan)]
+        return PlanNode('predicate', predicate, new_rows, rows, strategy,
+                        children=[inner], details=details)
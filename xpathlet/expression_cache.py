@@ -0,0 +1,175 @@
+# -*- test-case-name: xpathlet.tests.test_expression_cache -*-
+
+"""Parsed expressions saved to disk, so they needn't be parsed again.
+
+Services that compile many expressions at startup can give their engine an
+ExpressionCache to skip parsing expressions they've seen before. The rest of
+compilation depends on the document and function libraries, and is cheap
+compared to parsing, so only the ASTs are cached.
+
+Cache files are written with marshal rather than pickle, so loading one
+doesn't run arbitrary code, and entries are only ever turned into AST nodes.
+marshal isn't safe against deliberately crafted input, though, so cache files
+should only be written where untrusted users can't write. A file written by a
+different version of xpathlet, grammar or Python is ignored, as are any
+entries that can't be turned back into ASTs.
+"""
+
+import marshal
+import os
+import sys
+import tempfile
+import threading
+
+from xpathlet import ast, parsetab
+from xpathlet.parser import parse
+
+
+# Change this whenever the AST classes change in a way the grammar doesn't.
+CACHE_VERSION = 1
+
+_ast_classes = dict(
+    (name, cls) for name, cls in vars(ast).items()
+    if isinstance(cls, type) and issubclass(cls, ast.Node))
+
+
+def cache_version():
+    """Identify the versions a cache file must have been written with."""
+    return (CACHE_VERSION, parsetab._lr_signature, sys.version_info[:2])
+
+
+def encode_ast(node):
+    """Convert an AST into lists, tuples, dicts and strings for marshal."""
+    if isinstance(node, ast.Node):
+        # Private attributes are things like display hints, not structure.
+        encoded = dict((k, encode_ast(v)) for k, v in vars(node).items()
+                       if not k.startswith('_'))
+        encoded[''] = type(node).__name__
+        return encoded
+    if isinstance(node, (list, tuple)):
+        return type(node)(encode_ast(item) for item in node)
+    return node
+
+
+def decode_ast(encoded):
+    """Rebuild an AST encoded with encode_ast().
+
+    This raises ValueError if it finds anything that isn't an AST node.
+    """
+    if isinstance(encoded, dict):
+        attrs = dict((k, decode_ast(v)) for k, v in encoded.items())
+        cls = _ast_classes.get(attrs.pop('', None))
+        if cls is None:
+            raise ValueError('Not an AST node: %r' % (encoded,))
+        node = cls.__new__(cls)
+        node.__dict__.update(attrs)
+        return node
+    if isinstance(encoded, (list, tuple)):
+        return type(encoded)(decode_ast(item) for item in encoded)
+    return encoded
+
+
+class ExpressionCache(object):
+    """Parsed expressions, keyed by their source, backed by a file.
+
+    The file is read when the cache is created and only written by save().
+    Missing, unreadable or outdated files are treated as empty caches.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._encoded = self._load()
+        self._exprs = {}
+        self._dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = marshal.load(f)
+        except (IOError, EOFError, ValueError, TypeError):
+            return {}
+        if not isinstance(data, tuple) or len(data) != 2:
+            return {}
+        version, entries = data
+        if version != cache_version() or not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def __len__(self):
+        with self._lock:
+            return len(set(self._encoded) | set(self._exprs))
+
+    def __contains__(self, source):
+        return source in self._exprs or source in self._encoded
+
+    def parse(self, source):
+        """Return the AST for source, parsing it only if it isn't cached.
+
+        ASTs aren't modified by compilation, so the same one is returned every
+        time.
+        """
+        with self._lock:
+            expr = self._exprs.get(source)
+            if expr is not None:
+                self.hits += 1
+                return expr
+            encoded = self._encoded.get(source)
+
+        # Decoding and parsing happen outside the lock, so other threads
+        # aren't kept waiting.
+        miss = True
+        if encoded is not None:
+            try:
+                expr = decode_ast(encoded)
+                # Make sure everything the AST needs is there.
+                expr.to_str()
+                miss = False
+            except (ValueError, AttributeError, TypeError):
+                pass
+        if miss:
+            expr = parse(source)
+            if expr is None:
+                # Not a valid expression, so there's nothing to cache.
+                with self._lock:
+                    self.misses += 1
+                return None
+
+        with self._lock:
+            if miss:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if source not in self._exprs:
+                self._exprs[source] = expr
+                if miss:
+                    self._dirty = True
+            # Another thread may have got here first, and we always return
+            # the same AST.
+            return self._exprs[source]
+
+    def save(self):
+        """Write the cache to its file, if anything has been added.
+
+        The file is replaced atomically, so a crash never leaves a partly
+        written cache behind for the next process to find.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = dict(self._encoded)
+            for source, expr in self._exprs.items():
+                entries[source] = encode_ast(expr)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    marshal.dump((cache_version(), entries), f)
+                os.rename(temp_path, self.path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+            self._encoded = entries
+            self._dirty = False
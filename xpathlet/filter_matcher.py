@@ -0,0 +1,293 @@
+# -*- test-case-name: xpathlet.tests.test_filter_matcher -*-
+
+from xml.etree.ElementTree import iterparse
+
+from xpathlet import ast
+from xpathlet.data_model import (
+    XPathNumber, XPathString, compare_string_values, expand_qname,
+    split_eqname)
+from xpathlet.parser import parse
+
+
+class _State(object):
+    """A state in the filter NFA.
+
+    Transitions are keyed by element name (or '*') and then by the attribute
+    tests an element must pass to take them. Every state reached by a
+    descendant step gets a single shared descendant state, which loops on any
+    element.
+    """
+
+    def __init__(self, self_loop=False):
+        self.transitions = {}
+        self.descendant_state = None
+        self.self_loop = self_loop
+        self.accepting = set()
+
+    def child(self, name, tests):
+        targets = self.transitions.setdefault(name, {})
+        if tests not in targets:
+            targets[tests] = _State()
+        return targets[tests]
+
+    def descendant(self):
+        if self.descendant_state is None:
+            self.descendant_state = _State(self_loop=True)
+        return self.descendant_state
+
+
+def _run_test(test, attributes):
+    if test[0] == 'exists':
+        return test[1] in attributes
+    _cmp, name, op, literal_type, literal = test
+    value = attributes.get(name)
+    if value is None:
+        # Comparisons with an empty node-set are always false.
+        return False
+    if literal_type == 'number':
+        other = XPathNumber(literal)
+    else:
+        other = XPathString(literal)
+    return compare_string_values([value], other, op)
+
+
+class FilterMatcher(object):
+    """Matches documents against many path filters at once.
+
+    Filters are a subset of XPath location paths: child and descendant steps
+    with name tests, and predicates that test attributes for existence or
+    compare them with literals. A document matches a filter if the path
+    selects anything from the root.
+
+    All the filters are compiled into a single NFA which shares common
+    prefixes, in the style of YFilter. Documents are matched in a single pass,
+    so the cost depends on the size of the document and how many filters
+    are partway matched, not on the total number of filters.
+    """
+
+    def __init__(self, namespaces=None):
+        self.namespaces = namespaces or {}
+        self._start = _State()
+        self._subscriptions = {}
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def add(self, subscription_id, xpath_expr):
+        """Add a filter, which will be reported as subscription_id."""
+        if subscription_id in self._subscriptions:
+            raise ValueError(
+                'Duplicate subscription id: %r' % (subscription_id,))
+        expr = parse(xpath_expr)
+        if not isinstance(expr, ast.LocationPath):
+            raise ValueError('Unsupported filter: %r' % (xpath_expr,))
+        states = []
+        for transitions in self._compile_steps(expr.steps, xpath_expr):
+            state = self._start
+            for kind, name, tests in transitions:
+                if kind == 'descendant':
+                    state = state.descendant()
+                state = state.child(name, tests)
+            state.accepting.add(subscription_id)
+            states.append(state)
+        self._subscriptions[subscription_id] = states
+
+    def remove(self, subscription_id):
+        for state in self._subscriptions.pop(subscription_id):
+            state.accepting.discard(subscription_id)
+
+    def _compile_steps(self, steps, xpath_expr):
+        """Turn location steps into lists of (kind, name, tests)
+        transitions, one for each alternative way the filter can match.
+
+        The kind is 'child' or 'descendant', the name is an expanded name or
+        '*' and the tests are a tuple of attribute tests.
+        """
+        def unsupported():
+            return ValueError('Unsupported filter: %r' % (xpath_expr,))
+
+        transitions = []
+        alternatives = [transitions]
+        descendant = False
+        for i, step in enumerate(steps):
+            node_test = step.node_test
+            is_node = (isinstance(node_test, ast.NodeType) and
+                       node_test.node_type == 'node')
+
+            if step.axis == 'descendant-or-self' and is_node:
+                if step.predicates:
+                    raise unsupported()
+                descendant = True
+                continue
+
+            if step.axis == 'self' and is_node and not step.predicates:
+                continue
+
+            if step.axis == 'attribute' and i == len(steps) - 1:
+                # A trailing attribute step is the same as an existence test
+                # on the element before it.
+                if step.predicates:
+                    raise unsupported()
+                test = ('exists', self._attribute_name(step, unsupported))
+                if descendant and transitions:
+                    # '//@a' after an element step also includes that
+                    # element's own attributes, so that's another way to
+                    # match.
+                    own = [list(t) for t in transitions]
+                    own[-1][2] += (test,)
+                    alternatives.insert(0, own)
+                if descendant:
+                    transitions.append(['descendant', '*', ()])
+                elif not transitions:
+                    raise unsupported()
+                transitions[-1][2] += (test,)
+                continue
+
+            if step.axis == 'descendant':
+                descendant = True
+            elif step.axis != 'child':
+                raise unsupported()
+            if not isinstance(node_test, ast.NameTest):
+                raise unsupported()
+
+            name = '*'
+            if node_test.name != '*':
+                try:
+                    name = expand_qname(node_test.name, self.namespaces)
+                except KeyError:
+                    raise unsupported()
+            tests = ()
+            for predicate in step.predicates:
+                tests += self._predicate_tests(predicate.expr, unsupported)
+            transitions.append(
+                ['descendant' if descendant else 'child', name, tests])
+            descendant = False
+
+        return [[(kind, name, tuple(sorted(set(tests))))
+                 for kind, name, tests in alt] for alt in alternatives]
+
+    def _attribute_name(self, step, unsupported):
+        if not isinstance(step.node_test, ast.NameTest):
+            raise unsupported()
+        if '*' in step.node_test.name:
+            raise unsupported()
+        try:
+            return expand_qname(step.node_test.name, self.namespaces)
+        except KeyError:
+            raise unsupported()
+
+    def _attribute_path(self, expr, unsupported):
+        if not isinstance(expr, ast.LocationPath) or expr.absolute:
+            return None
+        if len(expr.steps) != 1:
+            return None
+        [step] = expr.steps
+        if step.axis != 'attribute' or step.predicates:
+            return None
+        return self._attribute_name(step, unsupported)
+
+    def _literal(self, expr):
+        if isinstance(expr, ast.StringLiteral):
+            return ('string', expr.value)
+        if isinstance(expr, ast.Number):
+            return ('number', expr.value)
+        if isinstance(expr, ast.UnaryExpr):
+            if isinstance(expr.expr, ast.Number):
+                return ('number', -expr.expr.value)
+        return None
+
+    def _predicate_tests(self, expr, unsupported):
+        name = self._attribute_path(expr, unsupported)
+        if name is not None:
+            return (('exists', name),)
+        if not isinstance(expr, ast.OperatorExpr):
+            raise unsupported()
+        if expr.op == 'and':
+            return (self._predicate_tests(expr.left, unsupported) +
+                    self._predicate_tests(expr.right, unsupported))
+        if expr.op not in XPathString.COMP_FUNCTIONS:
+            raise unsupported()
+
+        op, path, literal = expr.op, expr.left, expr.right
+        name = self._attribute_path(path, unsupported)
+        if name is None:
+            op = XPathString.COMP_REFLECTIONS[op]
+            path, literal = literal, path
+            name = self._attribute_path(path, unsupported)
+        literal = self._literal(literal)
+        if name is None or literal is None:
+            raise unsupported()
+        return (('cmp', name, op) + literal,)
+
+    def _closure(self, state, states):
+        if state not in states:
+            states.add(state)
+            if state.descendant_state is not None:
+                self._closure(state.descendant_state, states)
+
+    def _initial_states(self):
+        states = set()
+        self._closure(self._start, states)
+        return states
+
+    def _next_states(self, states, name, attributes):
+        new_states = set()
+        results = {}
+        for state in states:
+            if state.self_loop:
+                self._closure(state, new_states)
+            for key in (name, '*'):
+                for tests, target in state.transitions.get(key, {}).items():
+                    if tests not in results:
+                        results[tests] = all(
+                            _run_test(t, attributes) for t in tests)
+                    if results[tests]:
+                        self._closure(target, new_states)
+        return new_states
+
+    def _accepted(self, states):
+        matched = set()
+        for state in states:
+            matched.update(state.accepting)
+        return matched
+
+    def match(self, source):
+        """Find the subscriptions that match a document.
+
+        The document is parsed incrementally and the elements are thrown away
+        as we go, so this works on documents too large to build a tree for.
+        """
+        states = self._initial_states()
+        matched = self._accepted(states)
+        stack = []
+        for event, elem in iterparse(source, ('start', 'end')):
+            if event == 'start':
+                stack.append(states)
+                attributes = dict((split_eqname(k), v)
+                                  for k, v in elem.attrib.iteritems())
+                states = self._next_states(
+                    states, split_eqname(elem.tag), attributes)
+                matched.update(self._accepted(states))
+            else:
+                states = stack.pop()
+                elem.clear()
+        return matched
+
+    def match_tree(self, node):
+        """Find the subscriptions that match an already built node tree."""
+        states = self._initial_states()
+        matched = self._accepted(states)
+        self._match_children(node, states, matched)
+        return matched
+
+    def _match_children(self, node, states, matched):
+        for child in node.get_children():
+            if child.node_type != 'element':
+                continue
+            attributes = dict((a.expanded_name(), a.value)
+                              for a in child.get_attributes())
+            child_states = self._next_states(
+                states, child.expanded_name(), attributes)
+            if child_states:
+                matched.update(self._accepted(child_states))
+                self._match_children(child, child_states, matched)
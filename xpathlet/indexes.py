@@ -0,0 +1,239 @@
+# -*- test-case-name: xpathlet.tests.test_indexes -*-
+
+import time
+from bisect import bisect_left, bisect_right
+from math import isnan
+
+from xpathlet.data_model import string_to_number, expand_qname
+
+
+def parse_key_path(key_path, namespaces):
+    """Turn an index key path into an (axis, expanded name) pair.
+
+    Supported key paths are '@attr' (an attribute of the owner element),
+    'child' (child elements of the owner element) and '.' (the owner element's
+    own string-value).
+    """
+    if key_path == '.':
+        return ('self', None)
+    if key_path.startswith('@'):
+        return ('attribute', expand_qname(key_path[1:], namespaces))
+    return ('child', expand_qname(key_path, namespaces))
+
+
+def key_values(node, key_axis, key_name):
+    """Find the string-values of a node's keys.
+
+    The keys are the node itself, or its attributes or child elements with
+    the given expanded name.
+    """
+    if key_axis == 'self':
+        return [node.string_value()]
+    if key_axis == 'attribute':
+        candidates = node.get_attributes()
+    else:
+        candidates = [n for n in node.get_children()
+                      if n.node_type == 'element']
+    return [n.string_value() for n in candidates
+            if n.expanded_name() == key_name]
+
+
+class DocumentIndex(object):
+    """Base class for per-document indexes.
+
+    An index covers all elements with a given name and some value associated
+    with each of them. Indexes are built once from the current state of the
+    tree and are not maintained across tree modification.
+    """
+
+    index_type = None
+
+    def __init__(self, owner_name, key_path='.'):
+        self.owner_qname = owner_name
+        self.key_path = key_path
+        self.owner_name = None
+        self.key_axis = None
+        self.key_name = None
+        self.build_time = None
+
+    @property
+    def key(self):
+        return (self.index_type, self.owner_name, self.key_axis, self.key_name)
+
+    def __repr__(self):
+        return '<%s %s %s>' % (
+            type(self).__name__, self.owner_qname, self.key_path)
+
+    def key_values(self, node):
+        return key_values(node, self.key_axis, self.key_name)
+
+    def build(self, root_node):
+        start = time.time()
+        namespaces = root_node._namespaces
+        self.owner_name = expand_qname(self.owner_qname, namespaces)
+        self.key_axis, self.key_name = parse_key_path(
+            self.key_path, namespaces)
+        entries = []
+        self._owners = set()
+        for node in root_node._walk_in_doc_order():
+            if node.node_type != 'element':
+                continue
+            if node.expanded_name() != self.owner_name:
+                continue
+            self._owners.add(node)
+            for value in self.key_values(node):
+                entries.append((value, node))
+        self._build_entries(entries)
+        self.build_time = time.time() - start
+
+    def _build_entries(self, entries):
+        raise NotImplementedError()
+
+    def covers(self, nodes):
+        """Check that every node given is one this index knows about."""
+        return all(n in self._owners for n in nodes)
+
+    def stats(self):
+        """Report how big this index is and how long it took to build."""
+        return {
+            'index_type': self.index_type,
+            'owner': self.owner_qname,
+            'key': self.key_path,
+            'owners': len(self._owners),
+            'entries': len(self),
+            'build_time': self.build_time,
+            }
+
+
+class NumericRangeIndex(DocumentIndex):
+    """Sorted index of key values converted to numbers.
+
+    Values are converted as if by the XPath number() function. Values that
+    convert to NaN can never satisfy a numeric comparison, so they are left
+    out of the index entirely.
+    """
+
+    index_type = 'numeric'
+
+    # Operators for which "node-set op number" can be answered by bisection.
+    # Note that != is missing, because NaN values compare unequal to
+    # everything and aren't in the index.
+    OPERATORS = ('=', '<', '<=', '>', '>=')
+
+    def _build_entries(self, entries):
+        numbered = []
+        for value, node in entries:
+            number = string_to_number(value)
+            if not isnan(number):
+                numbered.append((number, node._doc_position, node))
+        numbered.sort()
+        self._values = [v for v, _p, _n in numbered]
+        self._nodes = [n for _v, _p, n in numbered]
+
+    def __len__(self):
+        return len(self._values)
+
+    def select(self, op, number):
+        """Return the set of owner nodes with a key value satisfying
+        "value op number".
+        """
+        assert op in self.OPERATORS
+        if isnan(number):
+            return set()
+        values = self._values
+        start, end = 0, len(values)
+        if op in ('=', '>='):
+            start = bisect_left(values, number)
+        elif op == '>':
+            start = bisect_right(values, number)
+        if op in ('=', '<='):
+            end = bisect_right(values, number)
+        elif op == '<':
+            end = bisect_left(values, number)
+        return set(self._nodes[start:end])
+
+
+class _StringIndex(DocumentIndex):
+    # String functions only look at the first node of a node-set argument, so
+    # we only keep the first key value for each owner.
+
+    def _build_entries(self, entries):
+        self._strings = {}
+        for value, node in entries:
+            self._strings.setdefault(node, value)
+        self._build_strings()
+
+    def _build_strings(self):
+        raise NotImplementedError()
+
+    def __len__(self):
+        return len(self._strings)
+
+
+class TrigramIndex(_StringIndex):
+    """Substring index for contains().
+
+    Each key value is broken into the overlapping three-character substrings
+    it contains. Candidates for a needle are the owners containing all of the
+    needle's trigrams, which are then checked exactly.
+    """
+
+    index_type = 'substring'
+
+    def _build_strings(self):
+        self._trigrams = {}
+        for node, value in self._strings.iteritems():
+            for trigram in self._split(value):
+                self._trigrams.setdefault(trigram, set()).add(node)
+
+    def _split(self, text):
+        return set(text[i:i + 3] for i in xrange(len(text) - 2))
+
+    def stats(self):
+        stats = super(TrigramIndex, self).stats()
+        stats['trigrams'] = len(self._trigrams)
+        stats['postings'] = sum(len(v) for v in self._trigrams.itervalues())
+        return stats
+
+    def select(self, needle):
+        """Return the set of owner nodes for which contains(key, needle) is
+        true.
+        """
+        if not needle:
+            return set(self._owners)
+        if len(needle) < 3:
+            return set(n for n, v in self._strings.iteritems() if needle in v)
+
+        postings = []
+        for trigram in self._split(needle):
+            if trigram not in self._trigrams:
+                return set()
+            postings.append(self._trigrams[trigram])
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return set(n for n in candidates if needle in self._strings[n])
+
+
+class PrefixIndex(_StringIndex):
+    """Sorted string index for starts-with()."""
+
+    index_type = 'prefix'
+
+    def _build_strings(self):
+        ordered = sorted((value, node._doc_position, node)
+                         for node, value in self._strings.iteritems())
+        self._values = [v for v, _p, _n in ordered]
+        self._nodes = [n for _v, _p, n in ordered]
+
+    def select(self, prefix):
+        """Return the set of owner nodes for which starts-with(key, prefix) is
+        true.
+        """
+        if not prefix:
+            return set(self._owners)
+        matches = set()
+        for i in xrange(bisect_left(self._values, prefix), len(self._values)):
+            if not self._values[i].startswith(prefix):
+                break
+            matches.add(self._nodes[i])
+        return matches
@@ -0,0 +1,119 @@
+# -*- test-case-name: xpathlet.tests.test_kernels -*-
+
+"""Numeric kernels for working with the string-values of many nodes at once.
+
+If NumPy is installed, large inputs are converted to arrays and processed
+with vectorised operations. Otherwise, or for small inputs where the array
+overhead isn't worth it, we fall back to plain Python.
+"""
+
+import math
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Inputs smaller than this are always handled in plain Python.
+VECTOR_THRESHOLD = 64
+
+COMP_FUNCTIONS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    }
+
+
+def string_to_number(value):
+    """Convert a string to a float as if by the XPath number() function."""
+    try:
+        val = float(value)
+    except ValueError:
+        return float("nan")
+    if math.isinf(val):
+        return float("nan")
+    return val
+
+
+def _use_numpy(values):
+    return numpy is not None and len(values) >= VECTOR_THRESHOLD
+
+
+def to_number_array(values):
+    """Convert a list of strings to a NumPy array of numbers.
+
+    The conversion is the same as string_to_number(), so strings that aren't
+    numbers become NaN.
+    """
+    try:
+        numbers = numpy.array(values, dtype=numpy.float64)
+    except ValueError:
+        # At least one value isn't a number, so we have to go the slow way.
+        return numpy.fromiter((string_to_number(v) for v in values),
+                              numpy.float64, len(values))
+    numbers[numpy.isinf(numbers)] = numpy.nan
+    return numbers
+
+
+def sum_numbers(values):
+    """Sum a list of strings as numbers, as the XPath sum() function does."""
+    if _use_numpy(values):
+        # numpy.sum() adds pairwise, which rounds differently, so we only
+        # vectorise the conversion and add the numbers up in order.
+        return sum(to_number_array(values).tolist())
+    return sum(string_to_number(v) for v in values)
+
+
+def number_range(values):
+    """Find the smallest and largest numbers in a list of strings.
+
+    Strings that aren't numbers are ignored. This returns None if there are
+    no numbers at all.
+    """
+    if _use_numpy(values):
+        numbers = to_number_array(values)
+        numbers = numbers[~numpy.isnan(numbers)]
+        if not len(numbers):
+            return None
+        return (float(numbers.min()), float(numbers.max()))
+    numbers = [n for n in map(string_to_number, values) if n == n]
+    if not numbers:
+        return None
+    return (min(numbers), max(numbers))
+
+
+def any_compare(values, number, op):
+    """Check whether any of a list of strings compares true with a number."""
+    cmp_func = COMP_FUNCTIONS[op]
+    if _use_numpy(values):
+        with numpy.errstate(invalid='ignore'):
+            return bool(numpy.any(cmp_func(to_number_array(values), number)))
+    return any(cmp_func(string_to_number(v), number) for v in values)
+
+
+def any_compare_grouped(value_lists, number, op):
+    """Like any_compare(), but for each of a list of lists of strings.
+
+    This returns a list of booleans, one for each list of strings.
+    """
+    if not _use_numpy(value_lists):
+        return [any_compare(values, number, op) for values in value_lists]
+
+    lengths = numpy.fromiter(
+        (len(values) for values in value_lists), numpy.intp, len(value_lists))
+    flat = [v for values in value_lists for v in values]
+    if not flat:
+        return [False] * len(value_lists)
+    # NaN compares false (or true for !=), which is what we want, so we don't
+    # need NumPy warning us about it.
+    with numpy.errstate(invalid='ignore'):
+        matched = COMP_FUNCTIONS[op](to_number_array(flat), number)
+    # Count the matches belonging to each list.
+    owners = numpy.repeat(numpy.arange(len(value_lists)), lengths)
+    counts = numpy.bincount(owners[matched], minlength=len(value_lists))
+    return (counts > 0).tolist()
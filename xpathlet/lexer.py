@@ -4,6 +4,8 @@ import re
 
 from ply import lex
 
+from xpathlet.constants import NCNAME_CHARS, NCNAME_START_CHARS
+
 
 tokens = (
     'LITERAL',
@@ -23,30 +25,7 @@ tokens = (
     )
 
 
-_ncname_start_chars = (
-    u'a-zA-Z_'
-    u'\u00C0-\u00D6'
-    u'\u00D8-\u00F6'
-    u'\u00F8-\u02FF'
-    u'\u0370-\u037D'
-    u'\u037F-\u1FFF'
-    u'\u200C-\u200D'
-    u'\u2070-\u218F'
-    u'\u2C00-\u2FEF'
-    u'\u3001-\uD7FF'
-    u'\uF900-\uFDCF'
-    u'\uFDF0-\uFFFD'
-    # u'\u10000-\uEFFFF'
-    )
-
-_ncname_chars = u''.join([
-        u'-.0-9', _ncname_start_chars,
-        unichr(0xB7),
-        u'\u0300-\u036F',
-        u'\u203F-\u2040',
-        ])
-
-_ncname = u'[%s][%s]*' % (_ncname_start_chars, _ncname_chars)
+_ncname = u'[%s][%s]*' % (NCNAME_START_CHARS, NCNAME_CHARS)
 
 
 t_ignore = ' \t\r\n'
@@ -93,4 +72,14 @@ def t_error(t):
     # t.lexer.skip(1)
 
 
-lexer = lex.lex(reflags=re.UNICODE)
+# Building the lexer compiles some large regular expressions, so we put it off
+# until something needs it.
+_lexer = None
+
+
+def get_lexer():
+    """Return the PLY lexer, building it the first time we need it."""
+    global _lexer
+    if _lexer is None:
+        _lexer = lex.lex(reflags=re.UNICODE)
+    return _lexer
@@ -1,9 +1,12 @@
 # -*- test-case-name: xpathlet.tests.test_parser -*-
 
+import os.path
+import threading
+
 from ply import yacc
 
-from xpathlet.lexer import tokens
-from xpathlet import ast
+from xpathlet.lexer import get_lexer, tokens
+from xpathlet import ast, pratt_parser
 
 
 def p_expr(p):
@@ -271,4 +274,51 @@ def p_empty(p):
 # To keep pyflakes happy:
 tokens
 
-parser = yacc.yacc()
+# The parse tables are shipped in this module, so they never need to be
+# generated at runtime. Use build_parse_tables() to update them after changing
+# the grammar.
+TABLE_MODULE = 'xpathlet.parsetab'
+
+# PLY keeps the parser and lexer state on the shared module-level objects, so
+# only one thread may be parsing at a time.
+_parse_lock = threading.Lock()
+
+_parser = None
+
+
+def get_parser():
+    """Return the PLY parser, building it the first time we need it.
+
+    Nothing is written to disk. If the shipped tables are out of date, new
+    ones are generated in memory instead.
+    """
+    global _parser
+    if _parser is None:
+        _parser = yacc.yacc(tabmodule=TABLE_MODULE, write_tables=False,
+                            debug=False)
+    return _parser
+
+
+def build_parse_tables():
+    """Regenerate the parse tables shipped in xpathlet/parsetab.py."""
+    yacc.yacc(tabmodule='parsetab', outputdir=os.path.dirname(__file__),
+              debug=False)
+
+
+# The parser parse() uses when none is asked for: 'ply' for the PLY grammar
+# above, or 'pratt' for the hand-written parser in xpathlet.pratt_parser.
+default_backend = 'ply'
+
+
+def parse(source, backend=None):
+    """Parse an XPath expression into an AST. This is safe to call from
+    multiple threads.
+    """
+    if backend is None:
+        backend = default_backend
+    if backend == 'pratt':
+        return pratt_parser.parse(source)
+    if backend != 'ply':
+        raise ValueError('Unknown parser backend: %r' % (backend,))
+    with _parse_lock:
+        return get_parser().parse(source, lexer=get_lexer())
@@ -0,0 +1,105 @@
+
+# parsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = "DOUBLECOLON DOUBLEDOT DOUBLESLASH LITERAL NCNAME NODETYPE NUMBER OP_AND OP_DIV OP_GE OP_LE OP_MOD OP_NE OP_ORExpr : OrExpr\n    LocationPath : RelativeLocationPath\n                    | AbsoluteLocationPath\n    AbsoluteLocationPath : '/'\n                            | '/' RelativeLocationPath\n                            | DoubleSlash RelativeLocationPath\n    RelativeLocationPath : Step\n                            | RelativeLocationPath '/' Step\n                            | RelativeLocationPath DoubleSlash Step\n    Step : AxisSpecifier NodeTest Predicates\n    Step : NodeTest Predicates\n            | '.'\n            | DOUBLEDOT\n    AxisSpecifier : NCName DOUBLECOLON\n                     | '@'\n    NodeTest : NameTest\n                | NODETYPE '(' ')'\n                | NODETYPE '(' Literal ')'\n    NameTest : '*'\n                | NCName ':' '*'\n                | QName\n    Predicates : Predicates Predicate\n                  | empty\n    Predicate : '[' Expr ']'\n    PrimaryExpr : VariableReference\n                   | '(' Expr ')'\n                   | Literal\n                   | Number\n                   | FunctionCall\n    Number : NUMBER\n    FunctionCall : FunctionName '(' Arguments ')'\n    Arguments : Arguments ',' Expr\n                 | Expr\n    Arguments : empty\n    UnionExpr : PathExpr\n                 | UnionExpr '|' PathExpr\n    PathExpr : LocationPath\n                | FilterExpr\n                | FilterExpr '/' RelativeLocationPath\n                | FilterExpr DoubleSlash RelativeLocationPath\n    FilterExpr : PrimaryExpr\n                  | FilterExpr Predicate\n    OrExpr : AndExpr\n              | OrExpr OP_OR AndExpr\n\n       AndExpr : EqualityExpr\n               | AndExpr OP_AND EqualityExpr\n\n       EqualityExpr : RelationalExpr\n                    | EqualityExpr '=' RelationalExpr\n                    | EqualityExpr OP_NE RelationalExpr\n\n       RelationalExpr : AdditiveExpr\n                      | RelationalExpr '<' AdditiveExpr\n                      | RelationalExpr '>' AdditiveExpr\n                      | RelationalExpr OP_LE AdditiveExpr\n                      | RelationalExpr OP_GE AdditiveExpr\n\n       AdditiveExpr : MultiplicativeExpr\n                    | AdditiveExpr '+' MultiplicativeExpr\n                    | AdditiveExpr '-' MultiplicativeExpr\n\n       MultiplicativeExpr : UnaryExpr\n                          | MultiplicativeExpr '*' UnaryExpr\n                          | MultiplicativeExpr OP_DIV UnaryExpr\n                          | MultiplicativeExpr OP_MOD UnaryExpr\n    UnaryExpr : UnionExpr\n                 | '-' UnaryExpr\n    VariableReference : '$' QName\n    DoubleSlash : DOUBLESLASH\n    NCName : NCNAME\n              | NODETYPE\n              | OP_DIV\n              | OP_MOD\n    FunctionName : NCNAME\n                    | NCName ':' NCName\n    QName : NCName\n             | NCName ':' NCName\n    Literal : LITERAL\n    empty :"
+    
+_lr_action_items = {'NCNAME':([0,14,18,19,23,28,36,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,73,74,79,87,88,112,],[3,50,3,50,-15,-65,50,50,3,3,3,3,3,50,50,3,3,3,3,3,3,3,3,3,50,50,3,3,50,-14,3,50,50,3,]),'NUMBER':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,4,]),'OP_AND':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,31,32,33,34,35,38,39,41,42,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,99,100,101,102,103,104,106,107,108,109,110,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,-47,-55,-21,-58,-74,-3,-2,-45,-67,-72,-25,-29,-41,79,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,79,-9,-8,-49,-48,-17,-73,-20,-10,-26,-46,-31,-73,-24,-18,]),'OP_LE':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,31,32,34,35,38,39,41,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,100,101,102,103,104,106,107,108,109,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,61,-55,-21,-58,-74,-3,-2,-67,-72,-25,-29,-41,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,-9,-8,61,61,-17,-73,-20,-10,-26,-31,-73,-24,-18,]),'DOUBLEDOT':([0,18,19,28,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,79,112,],[12,12,12,-65,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,12,]),'OP_NE':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,31,32,33,34,35,38,39,41,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,100,101,102,103,104,106,107,108,109,110,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,-47,-55,-21,-58,-74,-3,-2,70,-67,-72,-25,-29,-41,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,-9,-8,-49,-48,-17,-73,-20,-10,-26,70,-31,-73,-24,-18,]),'$':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,14,]),'OP_DIV':([0,1,2,3,4,5,6,7,8,11,12,13,14,15,16,17,18,19,20,21,23,24,26,27,28,29,31,32,34,35,36,37,38,39,40,41,43,44,45,46,47,48,49,50,51,52,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,73,74,75,76,77,79,80,81,82,83,87,88,89,90,96,97,98,100,101,104,106,107,108,109,111,112,113,114,115,],[15,-75,-62,-66,-30,-28,-27,-16,-12,-35,-13,-7,15,-68,-37,-19,15,15,-38,-69,-15,64,-21,-58,-65,-74,-3,-2,-67,-72,15,15,-25,-29,15,-41,-11,-23,15,15,15,15,-67,-66,-64,-72,-63,-5,-72,-42,15,15,15,15,15,15,15,15,15,15,15,15,15,15,15,15,-14,-75,-72,-6,15,-22,-36,64,64,15,15,-39,-40,-60,-61,-59,-9,-8,-17,-73,-20,-10,-26,-31,15,-73,-24,-18,]),')':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,30,31,32,33,34,35,38,39,41,42,43,44,48,49,50,51,52,53,54,55,56,72,75,76,77,78,80,81,82,83,84,85,86,89,90,92,93,94,95,96,97,98,99,100,101,102,103,104,105,106,107,108,109,110,111,113,114,115,116,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,-47,-55,-21,-58,-74,-1,-3,-2,-45,-67,-72,-25,-29,-41,-43,-11,-23,-75,-67,-66,-64,-72,-63,-5,-72,-42,104,-75,-72,-6,109,-22,-36,-56,-57,111,-34,-33,-39,-40,-51,-53,-54,-52,-60,-61,-59,-44,-9,-8,-49,-48,-17,115,-73,-20,-10,-26,-46,-31,-73,-24,-18,-32,]),'(':([0,3,10,15,18,21,34,40,45,46,47,48,49,50,59,60,61,62,63,64,65,66,67,70,71,79,106,112,],[40,-70,48,-68,40,-69,72,40,40,40,40,40,-67,-66,40,40,40,40,40,40,40,40,40,40,40,40,-71,40,]),'+':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,24,26,27,29,31,32,34,35,38,39,41,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,100,101,104,106,107,108,109,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,46,-35,-13,-7,-68,-37,-19,-4,-38,-69,-55,-21,-58,-74,-3,-2,-67,-72,-25,-29,-41,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,46,46,46,46,-60,-61,-59,-9,-8,-17,-73,-20,-10,-26,-31,-73,-24,-18,]),'*':([0,1,2,3,4,5,6,7,8,11,12,13,15,16,17,18,19,20,21,23,24,26,27,28,29,31,32,34,35,36,37,38,39,40,41,43,44,45,46,47,48,49,50,51,52,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,73,74,75,76,77,79,80,81,82,83,88,89,90,96,97,98,100,101,104,106,107,108,109,111,112,113,114,115,],[17,-75,-62,-66,-30,-28,-27,-16,-12,-35,-13,-7,-68,-37,-19,17,17,-38,-69,-15,66,-21,-58,-65,-74,-3,-2,-67,-72,17,17,-25,-29,17,-41,-11,-23,17,17,17,17,-67,-66,-64,-72,-63,-5,-72,-42,17,17,17,17,17,17,17,17,17,17,17,17,17,17,17,107,-14,-75,-72,-6,17,-22,-36,66,66,107,-39,-40,-60,-61,-59,-9,-8,-17,-73,-20,-10,-26,-31,17,-73,-24,-18,]),'-':([0,1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,18,19,20,21,24,26,27,29,31,32,34,35,38,39,40,41,43,44,46,47,48,49,50,51,52,53,54,55,56,59,60,61,62,63,64,65,66,67,70,71,75,76,77,79,80,81,82,83,89,90,92,93,94,95,96,97,98,100,101,104,106,107,108,109,111,112,113,114,115,],[18,-75,-62,-66,-30,-28,-27,-16,-12,47,-35,-13,-7,-68,-37,-19,18,-4,-38,-69,-55,-21,-58,-74,-3,-2,-67,-72,-25,-29,18,-41,-11,-23,18,18,18,-67,-66,-64,-72,-63,-5,-72,-42,18,18,18,18,18,18,18,18,18,18,18,-75,-72,-6,18,-22,-36,-56,-57,-39,-40,47,47,47,47,-60,-61,-59,-9,-8,-17,-73,-20,-10,-26,-31,18,-73,-24,-18,]),',':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,30,31,32,33,34,35,38,39,41,42,43,44,48,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,84,85,86,89,90,92,93,94,95,96,97,98,99,100,101,102,103,104,106,107,108,109,110,111,113,114,115,116,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,-47,-55,-21,-58,-74,-1,-3,-2,-45,-67,-72,-25,-29,-41,-43,-11,-23,-75,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,112,-34,-33,-39,-40,-51,-53,-54,-52,-60,-61,-59,-44,-9,-8,-49,-48,-17,-73,-20,-10,-26,-46,-31,-73,-24,-18,-32,]),'/':([0,1,3,4,5,6,7,8,12,13,15,17,18,20,21,26,29,32,34,35,38,39,40,41,43,44,45,46,47,48,49,50,51,52,54,55,56,59,60,61,62,63,64,65,66,67,70,71,75,76,77,79,80,89,90,100,101,104,106,107,108,109,111,112,113,114,115,],[19,-75,-66,-30,-28,-27,-16,-12,-13,-7,-68,-19,19,57,-69,-21,-74,69,-67,-72,-25,-29,19,-41,-11,-23,19,19,19,19,-67,-66,-64,-72,69,-72,-42,19,19,19,19,19,19,19,19,19,19,19,-75,-72,69,19,-22,69,69,-9,-8,-17,-73,-20,-10,-26,-31,19,-73,-24,-18,]),'.':([0,18,19,28,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,79,112,],[8,8,8,-65,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,8,]),'OP_MOD':([0,1,2,3,4,5,6,7,8,11,12,13,14,15,16,17,18,19,20,21,23,24,26,27,28,29,31,32,34,35,36,37,38,39,40,41,43,44,45,46,47,48,49,50,51,52,53,54,55,56,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,73,74,75,76,77,79,80,81,82,83,87,88,89,90,96,97,98,100,101,104,106,107,108,109,111,112,113,114,115,],[21,-75,-62,-66,-30,-28,-27,-16,-12,-35,-13,-7,21,-68,-37,-19,21,21,-38,-69,-15,65,-21,-58,-65,-74,-3,-2,-67,-72,21,21,-25,-29,21,-41,-11,-23,21,21,21,21,-67,-66,-64,-72,-63,-5,-72,-42,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,21,-14,-75,-72,-6,21,-22,-36,65,65,21,21,-39,-40,-60,-61,-59,-9,-8,-17,-73,-20,-10,-26,-31,21,-73,-24,-18,]),'DOUBLECOLON':([3,15,21,34,35,50,55,],[-66,-68,-69,-67,74,-66,74,]),':':([3,15,21,34,35,49,50,52,55,76,],[-66,-68,-69,-67,73,-67,-66,87,88,88,]),'=':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,31,32,33,34,35,38,39,41,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,100,101,102,103,104,106,107,108,109,110,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,-47,-55,-21,-58,-74,-3,-2,71,-67,-72,-25,-29,-41,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,-9,-8,-49,-48,-17,-73,-20,-10,-26,71,-31,-73,-24,-18,]),'<':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,31,32,34,35,38,39,41,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,100,101,102,103,104,106,107,108,109,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,60,-55,-21,-58,-74,-3,-2,-67,-72,-25,-29,-41,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,-9,-8,60,60,-17,-73,-20,-10,-26,-31,-73,-24,-18,]),'$end':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,25,26,27,29,30,31,32,33,34,35,38,39,41,42,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,99,100,101,102,103,104,106,107,108,109,110,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,-47,-55,0,-21,-58,-74,-1,-3,-2,-45,-67,-72,-25,-29,-41,-43,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,-44,-9,-8,-49,-48,-17,-73,-20,-10,-26,-46,-31,-73,-24,-18,]),'@':([0,18,19,28,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,79,112,],[23,23,23,-65,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,23,]),'DOUBLESLASH':([0,1,3,4,5,6,7,8,12,13,15,17,18,20,21,26,29,32,34,35,38,39,40,41,43,44,45,46,47,48,49,50,51,52,54,55,56,59,60,61,62,63,64,65,66,67,70,71,75,76,77,79,80,89,90,100,101,104,106,107,108,109,111,112,113,114,115,],[28,-75,-66,-30,-28,-27,-16,-12,-13,-7,-68,-19,28,28,-69,-21,-74,28,-67,-72,-25,-29,28,-41,-11,-23,28,28,28,28,-67,-66,-64,-72,28,-72,-42,28,28,28,28,28,28,28,28,28,28,28,-75,-72,28,28,-22,28,28,-9,-8,-17,-73,-20,-10,-26,-31,28,-73,-24,-18,]),'LITERAL':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,72,79,112,],[29,29,29,29,29,29,29,29,29,29,29,29,29,29,29,29,29,29,29,29,29,]),'[':([1,3,4,5,6,7,15,17,20,21,26,29,34,35,38,39,41,43,44,49,50,51,52,55,56,75,76,80,104,106,107,108,109,111,113,114,115,],[-75,-66,-30,-28,-27,-16,-68,-19,59,-69,-21,-74,-67,-72,-25,-29,-41,59,-23,-67,-66,-64,-72,-72,-42,-75,-72,-22,-17,-73,-20,59,-26,-31,-73,-24,-18,]),']':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,30,31,32,33,34,35,38,39,41,42,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,91,92,93,94,95,96,97,98,99,100,101,102,103,104,106,107,108,109,110,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,-47,-55,-21,-58,-74,-1,-3,-2,-45,-67,-72,-25,-29,-41,-43,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,114,-51,-53,-54,-52,-60,-61,-59,-44,-9,-8,-49,-48,-17,-73,-20,-10,-26,-46,-31,-73,-24,-18,]),'NODETYPE':([0,14,18,19,23,28,36,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,73,74,79,87,88,112,],[34,49,34,34,-15,-65,34,34,34,34,34,34,34,34,34,34,34,34,34,34,34,34,34,34,34,34,34,34,49,-14,34,49,49,34,]),'|':([1,2,3,4,5,6,7,8,11,12,13,15,16,17,19,20,21,26,29,31,32,34,35,38,39,41,43,44,49,50,51,52,54,55,56,75,76,77,80,81,89,90,100,101,104,106,107,108,109,111,113,114,115,],[-75,45,-66,-30,-28,-27,-16,-12,-35,-13,-7,-68,-37,-19,-4,-38,-69,-21,-74,-3,-2,-67,-72,-25,-29,-41,-11,-23,-67,-66,-64,-72,-5,-72,-42,-75,-72,-6,-22,-36,-39,-40,-9,-8,-17,-73,-20,-10,-26,-31,-73,-24,-18,]),'OP_OR':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,30,31,32,33,34,35,38,39,41,42,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,99,100,101,102,103,104,106,107,108,109,110,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,-47,-55,-21,-58,-74,67,-3,-2,-45,-67,-72,-25,-29,-41,-43,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,-44,-9,-8,-49,-48,-17,-73,-20,-10,-26,-46,-31,-73,-24,-18,]),'>':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,31,32,34,35,38,39,41,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,100,101,102,103,104,106,107,108,109,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,63,-55,-21,-58,-74,-3,-2,-67,-72,-25,-29,-41,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,-9,-8,63,63,-17,-73,-20,-10,-26,-31,-73,-24,-18,]),'OP_GE':([1,2,3,4,5,6,7,8,9,11,12,13,15,16,17,19,20,21,22,24,26,27,29,31,32,34,35,38,39,41,43,44,49,50,51,52,53,54,55,56,75,76,77,80,81,82,83,89,90,92,93,94,95,96,97,98,100,101,102,103,104,106,107,108,109,111,113,114,115,],[-75,-62,-66,-30,-28,-27,-16,-12,-50,-35,-13,-7,-68,-37,-19,-4,-38,-69,62,-55,-21,-58,-74,-3,-2,-67,-72,-25,-29,-41,-11,-23,-67,-66,-64,-72,-63,-5,-72,-42,-75,-72,-6,-22,-36,-56,-57,-39,-40,-51,-53,-54,-52,-60,-61,-59,-9,-8,62,62,-17,-73,-20,-10,-26,-31,-73,-24,-18,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'NodeTest':([0,18,19,36,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,79,112,],[1,1,1,75,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,]),'UnionExpr':([0,18,40,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,2,]),'Number':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,5,]),'Literal':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,72,79,112,],[6,6,6,6,6,6,6,6,6,6,6,6,6,6,6,6,6,6,105,6,6,]),'Arguments':([48,],[84,]),'NameTest':([0,18,19,36,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,79,112,],[7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,7,]),'LocationPath':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,16,]),'AdditiveExpr':([0,40,48,59,60,61,62,63,67,70,71,79,112,],[9,9,9,9,92,93,94,95,9,9,9,9,9,]),'FunctionName':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,10,]),'Predicate':([20,43,108,],[56,80,80,]),'EqualityExpr':([0,40,48,59,67,79,112,],[33,33,33,33,33,110,33,]),'Step':([0,18,19,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,79,112,],[13,13,13,13,13,13,13,13,13,13,13,13,13,13,13,13,13,13,13,13,100,101,13,13,13,13,]),'Predicates':([1,75,],[43,108,]),'empty':([1,48,75,],[44,85,44,]),'RelationalExpr':([0,40,48,59,67,70,71,79,112,],[22,22,22,22,22,102,103,22,22,]),'MultiplicativeExpr':([0,40,46,47,48,59,60,61,62,63,67,70,71,79,112,],[24,24,82,83,24,24,24,24,24,24,24,24,24,24,24,]),'Expr':([0,40,48,59,112,],[25,78,86,91,116,]),'QName':([0,14,18,19,36,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,79,112,],[26,51,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,26,]),'UnaryExpr':([0,18,40,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[27,53,27,27,27,27,27,27,27,27,27,96,97,98,27,27,27,27,27,]),'OrExpr':([0,40,48,59,112,],[30,30,30,30,30,]),'AndExpr':([0,40,48,59,67,112,],[42,42,42,42,99,42,]),'AbsoluteLocationPath':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[31,31,31,31,31,31,31,31,31,31,31,31,31,31,31,31,31,31,31,31,]),'RelativeLocationPath':([0,18,19,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,70,71,79,112,],[32,32,54,77,32,32,32,32,32,89,90,32,32,32,32,32,32,32,32,32,32,32,32,32,]),'FilterExpr':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,20,]),'NCName':([0,14,18,19,36,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,73,79,87,88,112,],[35,52,35,55,76,55,35,35,35,35,35,55,55,35,35,35,35,35,35,35,35,35,55,55,35,35,106,35,113,113,35,]),'AxisSpecifier':([0,18,19,37,40,45,46,47,48,57,58,59,60,61,62,63,64,65,66,67,68,69,70,71,79,112,],[36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,36,]),'DoubleSlash':([0,18,20,32,40,45,46,47,48,54,59,60,61,62,63,64,65,66,67,70,71,77,79,89,90,112,],[37,37,58,68,37,37,37,37,37,68,37,37,37,37,37,37,37,37,37,37,37,68,37,68,68,37,]),'VariableReference':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,38,]),'FunctionCall':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,39,]),'PrimaryExpr':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,41,]),'PathExpr':([0,18,40,45,46,47,48,59,60,61,62,63,64,65,66,67,70,71,79,112,],[11,11,11,81,11,11,11,11,11,11,11,11,11,11,11,11,11,11,11,11,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> Expr","S'",1,None,None,None),
+  ('Expr -> OrExpr','Expr',1,'p_expr','parser.py',13),
+  ('LocationPath -> RelativeLocationPath','LocationPath',1,'p_location_path','parser.py',19),
+  ('LocationPath -> AbsoluteLocationPath','LocationPath',1,'p_location_path','parser.py',20),
+  ('AbsoluteLocationPath -> /','AbsoluteLocationPath',1,'p_absolute_location_path','parser.py',26),
+  ('AbsoluteLocationPath -> / RelativeLocationPath','AbsoluteLocationPath',2,'p_absolute_location_path','parser.py',27),
+  ('AbsoluteLocationPath -> DoubleSlash RelativeLocationPath','AbsoluteLocationPath',2,'p_absolute_location_path','parser.py',28),
+  ('RelativeLocationPath -> Step','RelativeLocationPath',1,'p_relative_location_path','parser.py',34),
+  ('RelativeLocationPath -> RelativeLocationPath / Step','RelativeLocationPath',3,'p_relative_location_path','parser.py',35),
+  ('RelativeLocationPath -> RelativeLocationPath DoubleSlash Step','RelativeLocationPath',3,'p_relative_location_path','parser.py',36),
+  ('Step -> AxisSpecifier NodeTest Predicates','Step',3,'p_step_with_axis','parser.py',42),
+  ('Step -> NodeTest Predicates','Step',2,'p_step_without_axis','parser.py',48),
+  ('Step -> .','Step',1,'p_step_without_axis','parser.py',49),
+  ('Step -> DOUBLEDOT','Step',1,'p_step_without_axis','parser.py',50),
+  ('AxisSpecifier -> NCName DOUBLECOLON','AxisSpecifier',2,'p_axis_specifier','parser.py',68),
+  ('AxisSpecifier -> @','AxisSpecifier',1,'p_axis_specifier','parser.py',69),
+  ('NodeTest -> NameTest','NodeTest',1,'p_node_test','parser.py',75),
+  ('NodeTest -> NODETYPE ( )','NodeTest',3,'p_node_test','parser.py',76),
+  ('NodeTest -> NODETYPE ( Literal )','NodeTest',4,'p_node_test','parser.py',77),
+  ('NameTest -> *','NameTest',1,'p_name_test','parser.py',88),
+  ('NameTest -> NCName : *','NameTest',3,'p_name_test','parser.py',89),
+  ('NameTest -> QName','NameTest',1,'p_name_test','parser.py',90),
+  ('Predicates -> Predicates Predicate','Predicates',2,'p_predicates','parser.py',96),
+  ('Predicates -> empty','Predicates',1,'p_predicates','parser.py',97),
+  ('Predicate -> [ Expr ]','Predicate',3,'p_predicate','parser.py',106),
+  ('PrimaryExpr -> VariableReference','PrimaryExpr',1,'p_primary_expr','parser.py',112),
+  ('PrimaryExpr -> ( Expr )','PrimaryExpr',3,'p_primary_expr','parser.py',113),
+  ('PrimaryExpr -> Literal','PrimaryExpr',1,'p_primary_expr','parser.py',114),
+  ('PrimaryExpr -> Number','PrimaryExpr',1,'p_primary_expr','parser.py',115),
+  ('PrimaryExpr -> FunctionCall','PrimaryExpr',1,'p_primary_expr','parser.py',116),
+  ('Number -> NUMBER','Number',1,'p_number','parser.py',125),
+  ('FunctionCall -> FunctionName ( Arguments )','FunctionCall',4,'p_function_call','parser.py',131),
+  ('Arguments -> Arguments , Expr','Arguments',3,'p_arguments','parser.py',137),
+  ('Arguments -> Expr','Arguments',1,'p_arguments','parser.py',138),
+  ('Arguments -> empty','Arguments',1,'p_arguments_empty','parser.py',147),
+  ('UnionExpr -> PathExpr','UnionExpr',1,'p_union_expr','parser.py',153),
+  ('UnionExpr -> UnionExpr | PathExpr','UnionExpr',3,'p_union_expr','parser.py',154),
+  ('PathExpr -> LocationPath','PathExpr',1,'p_path_expr','parser.py',163),
+  ('PathExpr -> FilterExpr','PathExpr',1,'p_path_expr','parser.py',164),
+  ('PathExpr -> FilterExpr / RelativeLocationPath','PathExpr',3,'p_path_expr','parser.py',165),
+  ('PathExpr -> FilterExpr DoubleSlash RelativeLocationPath','PathExpr',3,'p_path_expr','parser.py',166),
+  ('FilterExpr -> PrimaryExpr','FilterExpr',1,'p_filter_expr','parser.py',175),
+  ('FilterExpr -> FilterExpr Predicate','FilterExpr',2,'p_filter_expr','parser.py',176),
+  ('OrExpr -> AndExpr','OrExpr',1,'p_operator_exprs','parser.py',185),
+  ('OrExpr -> OrExpr OP_OR AndExpr','OrExpr',3,'p_operator_exprs','parser.py',186),
+  ('AndExpr -> EqualityExpr','AndExpr',1,'p_operator_exprs','parser.py',188),
+  ('AndExpr -> AndExpr OP_AND EqualityExpr','AndExpr',3,'p_operator_exprs','parser.py',189),
+  ('EqualityExpr -> RelationalExpr','EqualityExpr',1,'p_operator_exprs','parser.py',191),
+  ('EqualityExpr -> EqualityExpr = RelationalExpr','EqualityExpr',3,'p_operator_exprs','parser.py',192),
+  ('EqualityExpr -> EqualityExpr OP_NE RelationalExpr','EqualityExpr',3,'p_operator_exprs','parser.py',193),
+  ('RelationalExpr -> AdditiveExpr','RelationalExpr',1,'p_operator_exprs','parser.py',195),
+  ('RelationalExpr -> RelationalExpr < AdditiveExpr','RelationalExpr',3,'p_operator_exprs','parser.py',196),
+  ('RelationalExpr -> RelationalExpr > AdditiveExpr','RelationalExpr',3,'p_operator_exprs','parser.py',197),
+  ('RelationalExpr -> RelationalExpr OP_LE AdditiveExpr','RelationalExpr',3,'p_operator_exprs','parser.py',198),
+  ('RelationalExpr -> RelationalExpr OP_GE AdditiveExpr','RelationalExpr',3,'p_operator_exprs','parser.py',199),
+  ('AdditiveExpr -> MultiplicativeExpr','AdditiveExpr',1,'p_operator_exprs','parser.py',201),
+  ('AdditiveExpr -> AdditiveExpr + MultiplicativeExpr','AdditiveExpr',3,'p_operator_exprs','parser.py',202),
+  ('AdditiveExpr -> AdditiveExpr - MultiplicativeExpr','AdditiveExpr',3,'p_operator_exprs','parser.py',203),
+  ('MultiplicativeExpr -> UnaryExpr','MultiplicativeExpr',1,'p_operator_exprs','parser.py',205),
+  ('MultiplicativeExpr -> MultiplicativeExpr * UnaryExpr','MultiplicativeExpr',3,'p_operator_exprs','parser.py',206),
+  ('MultiplicativeExpr -> MultiplicativeExpr OP_DIV UnaryExpr','MultiplicativeExpr',3,'p_operator_exprs','parser.py',207),
+  ('MultiplicativeExpr -> MultiplicativeExpr OP_MOD UnaryExpr','MultiplicativeExpr',3,'p_operator_exprs','parser.py',208),
+  ('UnaryExpr -> UnionExpr','UnaryExpr',1,'p_unary_expr','parser.py',217),
+  ('UnaryExpr -> - UnaryExpr','UnaryExpr',2,'p_unary_expr','parser.py',218),
+  ('VariableReference -> $ QName','VariableReference',2,'p_variable_reference','parser.py',227),
+  ('DoubleSlash -> DOUBLESLASH','DoubleSlash',1,'p_double_slash','parser.py',233),
+  ('NCName -> NCNAME','NCName',1,'p_ncname','parser.py',242),
+  ('NCName -> NODETYPE','NCName',1,'p_ncname','parser.py',243),
+  ('NCName -> OP_DIV','NCName',1,'p_ncname','parser.py',244),
+  ('NCName -> OP_MOD','NCName',1,'p_ncname','parser.py',245),
+  ('FunctionName -> NCNAME','FunctionName',1,'p_function_name','parser.py',251),
+  ('FunctionName -> NCName : NCName','FunctionName',3,'p_function_name','parser.py',252),
+  ('QName -> NCName','QName',1,'p_qname','parser.py',258),
+  ('QName -> NCName : NCName','QName',3,'p_qname','parser.py',259),
+  ('Literal -> LITERAL','Literal',1,'p_literal','parser.py',265),
+  ('empty -> <empty>','empty',0,'p_empty','parser.py',271),
+]
@@ -0,0 +1,269 @@
+# -*- test-case-name: xpathlet.tests.test_planner -*-
+
+from xpathlet import ast
+from xpathlet.data_model import expand_qname
+
+
+# Guesses used when we have no document statistics to go on.
+DEFAULT_FANOUT = 4.0
+DEFAULT_DEPTH = 5.0
+DEFAULT_SUBTREE = 50.0
+
+COMPARISON_OPS = set(['=', '!=', '<', '<=', '>', '>='])
+BOOLEAN_OPS = set(['and', 'or']) | COMPARISON_OPS
+
+# Functions that have to look at every character of their arguments.
+STRING_SCAN_FUNCTIONS = set([
+        'concat', 'contains', 'starts-with', 'substring', 'substring-before',
+        'substring-after', 'string-length', 'normalize-space', 'translate',
+        ])
+
+FUNCTION_SELECTIVITY = {
+    'contains': 0.25,
+    'starts-with': 0.2,
+    'lang': 0.5,
+    'true': 1.0,
+    'false': 0.0,
+    }
+
+OPERATOR_SELECTIVITY = {
+    '=': 0.1,
+    '!=': 0.9,
+    '<': 0.33,
+    '<=': 0.33,
+    '>': 0.33,
+    '>=': 0.33,
+    }
+
+
+def result_type(expr, find_function):
+    """Work out the type of object an expression evaluates to, if we can.
+
+    This returns 'object' if the type depends on things we don't know until
+    evaluation time, such as the value of a variable.
+    """
+    if isinstance(expr, (ast.LocationPath, ast.PathExpr, ast.FilterExpr)):
+        return 'node-set'
+    if isinstance(expr, (ast.Number, ast.UnaryExpr)):
+        return 'number'
+    if isinstance(expr, ast.StringLiteral):
+        return 'string'
+    if isinstance(expr, ast.OperatorExpr):
+        if expr.op in BOOLEAN_OPS:
+            return 'boolean'
+        if expr.op == '|':
+            return 'node-set'
+        return 'number'
+    if isinstance(expr, ast.FunctionCall):
+        func = find_function(expr.name)
+        return getattr(func, 'xpath_return_type', 'object')
+    return 'object'
+
+
+def is_positional(predicate, dependencies, find_function):
+    """Check whether a predicate might depend on the position of the node.
+
+    Predicates that use position() or last(), or that might evaluate to a
+    number (and therefore be compared to the context position), can't be
+    reordered.
+    """
+    if dependencies[id(predicate.expr)] & set(['position', 'size']):
+        return True
+    return result_type(predicate.expr, find_function) in ('number', 'object')
+
+
+class PredicateGroup(object):
+    """Predicates that are applied together.
+
+    A fused group contains only position-independent predicates, which are
+    applied to each node in a single pass in the order given. An unfused group
+    contains a single predicate applied the normal way.
+    """
+
+    def __init__(self, predicates, fused):
+        self.predicates = predicates
+        self.fused = fused
+
+    def __repr__(self):
+        return '<PredicateGroup%s %s>' % (
+            ' (fused)' if self.fused else '',
+            ' '.join(p.to_str() for p in self.predicates))
+
+
+class PredicatePlanner(object):
+    """Orders predicates by estimated cost and selectivity.
+
+    Costs are rough estimates of the number of nodes visited to evaluate a
+    predicate for one candidate node. Selectivities are the estimated fraction
+    of candidates a predicate lets through.
+    """
+
+    def __init__(self, statistics, namespaces, dependencies, cached,
+                 find_function):
+        self.statistics = statistics
+        self.namespaces = namespaces
+        self.dependencies = dependencies
+        self.cached = cached
+        self.find_function = find_function
+
+    def _expand_name(self, node_test):
+        if not isinstance(node_test, ast.NameTest):
+            return None
+        if '*' in node_test.name:
+            return None
+        try:
+            return expand_qname(node_test.name, self.namespaces)
+        except KeyError:
+            return None
+
+    def _ratio(self, numerator, denominator, default):
+        if self.statistics is None or not denominator:
+            return default
+        return float(numerator) / denominator
+
+    def fanout(self, step):
+        stats = self.statistics
+        if step.axis in ('self', 'parent'):
+            return 1.0
+        if stats is None:
+            return {
+                'attribute': 1.0,
+                'child': DEFAULT_FANOUT,
+                'ancestor': DEFAULT_DEPTH,
+                'ancestor-or-self': DEFAULT_DEPTH,
+                }.get(step.axis, DEFAULT_SUBTREE)
+        elements = stats.element_count()
+        if step.axis == 'attribute':
+            return self._ratio(stats.node_count('attribute'), elements, 1.0)
+        if step.axis == 'child':
+            # Elements and the text nodes between them.
+            return 2 * stats.average_fanout() + 1
+        if step.axis in ('ancestor', 'ancestor-or-self'):
+            return stats.average_depth() or DEFAULT_DEPTH
+        # The other axes can cover large parts of the document, so assume
+        # they visit half of it.
+        return self._ratio(stats.node_count(), 2, DEFAULT_SUBTREE)
+
+    def cost(self, expr):
+        deps = self.dependencies[id(expr)]
+        if id(expr) in self.cached and deps <= set(['root']):
+            # Hoisted, so only evaluated once.
+            return 1.0
+        if isinstance(expr, (ast.Number, ast.StringLiteral,
+                             ast.VariableReference)):
+            return 0.0
+        if isinstance(expr, ast.LocationPath):
+            cost, cardinality = 0.0, 1.0
+            for step in expr.steps:
+                cardinality *= self.fanout(step)
+                cost += cardinality * (1 + sum(
+                        self.cost(p.expr) for p in step.predicates))
+            return cost
+        if isinstance(expr, ast.FunctionCall):
+            func = self.find_function(expr.name)
+            if getattr(func, 'xpath_context', None) is None:
+                own_cost = 10.0
+            elif expr.name in STRING_SCAN_FUNCTIONS:
+                own_cost = 5.0
+            else:
+                own_cost = 1.0
+            return own_cost + sum(self.cost(a) for a in expr.args)
+        return 1.0 + sum(self.cost(c) for c in expr.children())
+
+    def _attribute_name(self, expr, element_name):
+        if self.statistics is None or element_name is None:
+            return None
+        if not isinstance(expr, ast.LocationPath) or expr.absolute:
+            return None
+        if len(expr.steps) != 1 or expr.steps[0].axis != 'attribute':
+            return None
+        return self._expand_name(expr.steps[0].node_test)
+
+    def _attribute_frequency(self, expr, element_name):
+        attribute_name = self._attribute_name(expr, element_name)
+        if attribute_name is None:
+            return None
+        return self.statistics.attribute_frequency(
+            element_name, attribute_name)
+
+    def _equality_selectivity(self, expr, element_name):
+        # If we know how many distinct values an attribute has, we assume
+        # they're all equally likely.
+        for operand in (expr.left, expr.right):
+            attribute_name = self._attribute_name(operand, element_name)
+            if attribute_name is None:
+                continue
+            distinct = self.statistics.distinct_values(
+                element_name, attribute_name)
+            if distinct:
+                return 1.0 / max(distinct, 1.0)
+        return OPERATOR_SELECTIVITY['=']
+
+    def selectivity(self, expr, element_name=None):
+        if isinstance(expr, ast.OperatorExpr):
+            if expr.op == 'and':
+                return (self.selectivity(expr.left, element_name) *
+                        self.selectivity(expr.right, element_name))
+            if expr.op == 'or':
+                left = self.selectivity(expr.left, element_name)
+                right = self.selectivity(expr.right, element_name)
+                return left + right - left * right
+            if expr.op in OPERATOR_SELECTIVITY:
+                selectivity = OPERATOR_SELECTIVITY[expr.op]
+                if expr.op == '=':
+                    selectivity = self._equality_selectivity(
+                        expr, element_name)
+                for operand in (expr.left, expr.right):
+                    frequency = self._attribute_frequency(
+                        operand, element_name)
+                    if frequency is not None:
+                        selectivity *= frequency
+                return selectivity
+        if isinstance(expr, ast.FunctionCall):
+            if expr.name == 'not' and len(expr.args) == 1:
+                return 1 - self.selectivity(expr.args[0], element_name)
+            if expr.name == 'boolean' and len(expr.args) == 1:
+                return self.selectivity(expr.args[0], element_name)
+            return FUNCTION_SELECTIVITY.get(expr.name, 0.5)
+        frequency = self._attribute_frequency(expr, element_name)
+        if frequency is not None:
+            return frequency
+        return 0.5
+
+    def rank(self, predicate, element_name=None):
+        """Lower ranks should be applied first.
+
+        Cheap predicates that reject lots of nodes are the most useful ones to
+        apply early.
+        """
+        rejected = 1 - self.selectivity(predicate.expr, element_name)
+        return self.cost(predicate.expr) / max(rejected, 0.01)
+
+    def plan(self, predicates, node_test=None):
+        """Split predicates into groups and order the fusable ones.
+
+        Positional predicates stay where they are, because they depend on
+        exactly which nodes came before them. Runs of position-independent
+        predicates between them can be reordered and applied in one pass.
+        """
+        element_name = None
+        if node_test is not None:
+            element_name = self._expand_name(node_test)
+
+        groups = []
+        run = []
+
+        def flush_run():
+            if run:
+                run.sort(key=lambda p: self.rank(p, element_name))
+                groups.append(PredicateGroup(run[:], True))
+                del run[:]
+
+        for predicate in predicates:
+            if is_positional(predicate, self.dependencies, self.find_function):
+                flush_run()
+                groups.append(PredicateGroup([predicate], False))
+            else:
+                run.append(predicate)
+        flush_run()
+        return groups
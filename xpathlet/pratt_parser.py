@@ -0,0 +1,305 @@
+# -*- test-case-name: xpathlet.tests.test_pratt_parser -*-
+
+"""A hand-written XPath parser that doesn't need PLY.
+
+Binary operators are parsed by precedence climbing and everything else by
+recursive descent. The ASTs it builds are the same as the ones from
+xpathlet.parser, and like that parser it doesn't treat 'and' and 'or' as
+names. Parsers keep no shared state, so this is safe to call from any number
+of threads at once.
+"""
+
+import re
+
+from xpathlet import ast
+from xpathlet.constants import NCNAME_CHARS, NCNAME_START_CHARS
+
+
+class ParseError(ValueError):
+    """Raised for expressions that aren't valid XPath."""
+
+
+_ncname = u'[%s][%s]*' % (NCNAME_START_CHARS, NCNAME_CHARS)
+
+_token_pattern = u'|'.join([
+        u'(?P<space>[ \t\r\n]+)',
+        u'(?P<literal>"[^"]*"|\'[^\']*\')',
+        u'(?P<number>[0-9]+(?:\\.[0-9]*)?|\\.[0-9]+)',
+        # A QName, or a name test for any name with a prefix.
+        u'(?P<name>%s(?::(?:%s|\\*))?)' % (_ncname, _ncname),
+        u'(?P<symbol>//|::|\\.\\.|!=|<=|>=|[()\\[\\].,@/|+\\-=<>*$])',
+        ])
+
+# Compiling the pattern takes a while, so we only do it when we first need it.
+_token_re = None
+
+NODE_TYPES = frozenset(['comment', 'text', 'processing-instruction', 'node'])
+
+# Names which are always operators.
+RESERVED_NAMES = frozenset(['and', 'or'])
+
+# Binding power of each binary operator other than '|', which binds tighter
+# than unary minus and is handled separately.
+BINARY_OPERATORS = {
+    'or': 1,
+    'and': 2,
+    '=': 3, '!=': 3,
+    '<': 4, '>': 4, '<=': 4, '>=': 4,
+    '+': 5, '-': 5,
+    '*': 6, 'div': 6, 'mod': 6,
+    }
+
+END = ('end', None)
+
+
+def tokenize(source):
+    """Split an expression into a list of (kind, value) tokens.
+
+    The kinds are 'literal', 'number', 'name' and 'symbol'. Literals have
+    their quotes removed. The list always finishes with an 'end' token.
+    """
+    global _token_re
+    if _token_re is None:
+        _token_re = re.compile(_token_pattern, re.UNICODE)
+    tokens = []
+    pos = 0
+    while pos < len(source):
+        match = _token_re.match(source, pos)
+        if match is None:
+            raise ParseError('Unexpected %r at position %s in %r.' % (
+                    source[pos], pos, source))
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'literal':
+            tokens.append((kind, value[1:-1]))
+        elif kind != 'space':
+            tokens.append((kind, value))
+        pos = match.end()
+    tokens.append(END)
+    return tokens
+
+
+class Parser(object):
+    """Parses a single expression."""
+
+    def __init__(self, source):
+        self.source = source
+        # We never look more than one token past the end.
+        self.tokens = tokenize(source) + [END]
+        self.pos = 0
+
+    def peek(self, offset=0):
+        return self.tokens[self.pos + offset]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def at(self, value, offset=0):
+        return self.tokens[self.pos + offset] == ('symbol', value)
+
+    def expect(self, value):
+        if not self.at(value):
+            self.error('Expected %r' % (value,))
+        return self.next()[1]
+
+    def error(self, message=None):
+        kind, value = self.peek()
+        if kind == 'end':
+            found = 'end of expression'
+        else:
+            found = repr(value)
+        raise ParseError('%s at %s in %r.' % (
+                message or 'Unexpected', found, self.source))
+
+    def parse(self):
+        expr = self.parse_expr()
+        if self.peek() is not END:
+            self.error()
+        return expr
+
+    def binary_operator(self):
+        """Return the binary operator at the current token, if there is one.
+
+        Names and '*' are only operators where an operator is expected, which
+        is the only place we ask.
+        """
+        kind, value = self.peek()
+        if kind in ('symbol', 'name') and value in BINARY_OPERATORS:
+            return value
+        return None
+
+    def parse_expr(self, min_power=1):
+        left = self.parse_unary_expr()
+        while True:
+            op = self.binary_operator()
+            if op is None or BINARY_OPERATORS[op] < min_power:
+                return left
+            self.next()
+            right = self.parse_expr(BINARY_OPERATORS[op] + 1)
+            left = ast.OperatorExpr(op, left, right)
+
+    def parse_unary_expr(self):
+        if self.at('-'):
+            op = self.next()[1]
+            return ast.UnaryExpr(op, self.parse_unary_expr())
+        return self.parse_union_expr()
+
+    def parse_union_expr(self):
+        left = self.parse_path_expr()
+        while self.at('|'):
+            op = self.next()[1]
+            left = ast.OperatorExpr(op, left, self.parse_path_expr())
+        return left
+
+    def starts_filter_expr(self):
+        kind, value = self.peek()
+        if kind in ('literal', 'number'):
+            return True
+        if kind == 'symbol':
+            return value in ('$', '(')
+        # Function calls, but not node type tests.
+        return (kind == 'name' and self.at('(', 1) and
+                value not in NODE_TYPES and value not in BINARY_OPERATORS)
+
+    def parse_path_expr(self):
+        if not self.starts_filter_expr():
+            return self.parse_location_path()
+        expr = self.parse_primary_expr()
+        while self.at('['):
+            expr = ast.FilterExpr(expr, self.parse_predicate())
+        if self.at('/'):
+            self.next()
+            return ast.PathExpr(
+                expr, ast.LocationPath(self.parse_relative_location_path()))
+        if self.at('//'):
+            self.next()
+            return ast.PathExpr(expr, ast.LocationPath(
+                    self.descendant_or_self(),
+                    self.parse_relative_location_path()))
+        return expr
+
+    def parse_primary_expr(self):
+        kind, value = self.next()
+        if kind == 'literal':
+            return ast.StringLiteral(value)
+        if kind == 'number':
+            return ast.Number(value)
+        if value == '$':
+            return ast.VariableReference(self.parse_qname())
+        if value == '(':
+            expr = self.parse_expr()
+            self.expect(')')
+            return expr
+        # Otherwise it's a function call.
+        self.expect('(')
+        args = []
+        if not self.at(')'):
+            args.append(self.parse_expr())
+            while self.at(','):
+                self.next()
+                args.append(self.parse_expr())
+        self.expect(')')
+        return ast.FunctionCall(u'' + value, *args)
+
+    def parse_qname(self):
+        kind, value = self.peek()
+        if kind != 'name' or value in RESERVED_NAMES or value.endswith('*'):
+            self.error('Expected a name')
+        self.next()
+        return u'' + value
+
+    def descendant_or_self(self):
+        return ast.Step('descendant-or-self', ast.NodeType('node'), [])
+
+    def parse_location_path(self):
+        if self.at('/'):
+            self.next()
+            if self.starts_step():
+                return ast.AbsoluteLocationPath(
+                    self.parse_relative_location_path())
+            return ast.AbsoluteLocationPath()
+        if self.at('//'):
+            self.next()
+            return ast.AbsoluteLocationPath(
+                self.descendant_or_self(),
+                self.parse_relative_location_path())
+        return self.parse_relative_location_path()
+
+    def starts_step(self):
+        kind, value = self.peek()
+        if kind == 'symbol':
+            return value in ('.', '..', '@', '*')
+        return kind == 'name' and value not in RESERVED_NAMES
+
+    def parse_relative_location_path(self):
+        steps = [self.parse_step()]
+        while True:
+            if self.at('/'):
+                self.next()
+            elif self.at('//'):
+                self.next()
+                steps.append(self.descendant_or_self())
+            else:
+                return ast.LocationPath(*steps)
+            steps.append(self.parse_step())
+
+    def parse_step(self):
+        if self.at('.'):
+            self.next()
+            return ast.Step('self', ast.NodeType('node'), [])
+        if self.at('..'):
+            self.next()
+            return ast.Step('parent', ast.NodeType('node'), [])
+
+        axis = 'child'
+        if self.at('@'):
+            axis = ast.normalise_axis(self.next()[1])
+        elif self.peek()[0] == 'name' and self.at('::', 1):
+            name = self.next()[1]
+            if name not in ast.AXIS_NAMES:
+                raise ParseError('Unknown axis %r in %r.' % (
+                        name, self.source))
+            axis = ast.normalise_axis(name)
+            self.next()
+
+        node_test = self.parse_node_test()
+        predicates = []
+        while self.at('['):
+            predicates.append(self.parse_predicate())
+        return ast.Step(axis, node_test, predicates)
+
+    def parse_node_test(self):
+        if self.at('*'):
+            return ast.NameTest(self.next()[1])
+        kind, value = self.peek()
+        if kind == 'name' and value in NODE_TYPES and self.at('(', 1):
+            self.next()
+            self.next()
+            if self.peek()[0] == 'literal':
+                literal = ast.StringLiteral(self.next()[1])
+                if value != 'processing-instruction':
+                    self.error('Unexpected literal')
+                self.expect(')')
+                return ast.NodeType(value, literal)
+            self.expect(')')
+            return ast.NodeType(value)
+        if kind != 'name' or value in RESERVED_NAMES:
+            self.error('Expected a node test')
+        self.next()
+        return ast.NameTest(value)
+
+    def parse_predicate(self):
+        self.expect('[')
+        expr = self.parse_expr()
+        self.expect(']')
+        return ast.Predicate(expr)
+
+
+def parse(source):
+    """Parse an XPath expression into an AST.
+
+    This raises ParseError if the expression isn't valid.
+    """
+    return Parser(source).parse()
@@ -0,0 +1,224 @@
+# -*- test-case-name: xpathlet.tests.test_sharding -*-
+
+"""Evaluate a location path over a large document in several processes.
+
+The children of the root element are split into contiguous shards. Each
+shard is evaluated in a forked worker process, which shares the parent's tree
+copy-on-write and simply hides the other shards' children from the root
+element. The workers send back document positions, which the parent turns
+back into its own nodes.
+
+This only gives the right answer for paths that never need to see more than
+one shard at a time, so check_shardable() is quite strict about what it
+accepts: absolute paths with downward axes, where predicates on anything that
+might be the root or the root element only look at attributes, and where
+predicates on the root element's children don't depend on their positions.
+"""
+
+import multiprocessing
+
+from xpathlet import ast
+from xpathlet.core_functions import CoreFunctionLibrary
+from xpathlet.data_model import XPathNodeSet
+
+
+DOWNWARD_AXES = frozenset([
+        'child', 'descendant', 'descendant-or-self', 'self', 'attribute'])
+
+# Functions that look outside the context node's subtree.
+NONLOCAL_FUNCTIONS = frozenset(['id', 'lang'])
+
+# Functions of the context node that don't need its descendants.
+NAME_FUNCTIONS = frozenset(['name', 'local-name', 'namespace-uri'])
+
+
+def _matches(engine, node_test, node, principal_node_type):
+    if isinstance(node_test, ast.NodeType):
+        return node_test.node_type in ('node', node.node_type)
+    if node.node_type != principal_node_type:
+        return False
+    if node_test.name == '*':
+        return True
+    return node.expanded_name() == engine.root_node.expand_qname(
+        node_test.name)
+
+
+def _step_targets(engine, step, sources, top):
+    """Work out where a step can go from the given kinds of node.
+
+    Nodes are classified as 'root', 'top' (the root element), 'inner'
+    (anything inside the shards) and 'attribute'.
+    """
+    axis = step.axis
+    targets = set()
+    for source in sources:
+        if axis == 'attribute':
+            if source in ('top', 'inner'):
+                targets.add('attribute')
+            continue
+        if axis in ('self', 'descendant-or-self'):
+            if source == 'root':
+                if _matches(engine, step.node_test, engine.root_node, None):
+                    targets.add('root')
+            elif source == 'top':
+                if _matches(engine, step.node_test, top, 'element'):
+                    targets.add('top')
+            else:
+                targets.add(source)
+        if axis in ('child', 'descendant', 'descendant-or-self'):
+            if source == 'root':
+                if _matches(engine, step.node_test, top, 'element'):
+                    targets.add('top')
+                if axis != 'child':
+                    targets.add('inner')
+            elif source in ('top', 'inner'):
+                targets.add('inner')
+    return targets
+
+
+def _check_local(engine, expr, spine, unsupported):
+    """Check that a predicate expression only looks below its context node.
+
+    If spine is set, the context node might be the root or the root element,
+    whose descendants are split between shards, so only attributes may be
+    looked at.
+    """
+    if isinstance(expr, (ast.Number, ast.StringLiteral,
+                         ast.VariableReference)):
+        return
+    if isinstance(expr, ast.LocationPath):
+        if expr.absolute:
+            raise unsupported()
+        for step in expr.steps:
+            if step.axis not in DOWNWARD_AXES:
+                raise unsupported()
+            if spine and step.axis != 'attribute':
+                raise unsupported()
+            for predicate in step.predicates:
+                _check_local(engine, predicate.expr, False, unsupported)
+        return
+    if isinstance(expr, ast.FunctionCall):
+        func_lib = engine._find_function_library(expr.name)
+        if (not isinstance(func_lib, CoreFunctionLibrary) or
+                expr.name in NONLOCAL_FUNCTIONS):
+            raise unsupported()
+        func = func_lib[expr.name]
+        if spine and not expr.args and expr.name not in NAME_FUNCTIONS:
+            if 'node' in func.xpath_context:
+                raise unsupported()
+        for arg in expr.args:
+            _check_local(engine, arg, spine, unsupported)
+        return
+    if isinstance(expr, ast.FilterExpr):
+        _check_local(engine, expr.expr, spine, unsupported)
+        for predicate in expr.predicates:
+            _check_local(engine, predicate.expr, False, unsupported)
+        return
+    if isinstance(expr, ast.PathExpr):
+        _check_local(engine, expr.left, spine, unsupported)
+        _check_local(engine, expr.right, False, unsupported)
+        return
+    if isinstance(expr, ast.OperatorExpr):
+        _check_local(engine, expr.left, spine, unsupported)
+        _check_local(engine, expr.right, spine, unsupported)
+        return
+    if isinstance(expr, ast.UnaryExpr):
+        _check_local(engine, expr.expr, spine, unsupported)
+        return
+    raise unsupported()
+
+
+def check_shardable(engine, compiled):
+    """Raise ValueError if a compiled expression can't be evaluated a shard
+    at a time against the engine's document.
+    """
+    def unsupported():
+        return ValueError('Expression cannot be sharded: %r' % (
+                compiled.source,))
+
+    expr = compiled.expr
+    if not isinstance(expr, ast.AbsoluteLocationPath):
+        raise unsupported()
+    [top] = engine.root_node.get_children()
+    sources = set(['root'])
+    for step in expr.steps:
+        if step.axis not in DOWNWARD_AXES:
+            raise unsupported()
+        targets = _step_targets(engine, step, sources, top)
+        if step.predicates:
+            # Positions among the root element's children or descendants
+            # would be counted within a shard.
+            spine_axis = step.axis not in ('self', 'attribute')
+            if spine_axis and sources & set(['root', 'top']):
+                plan = compiled.predicate_plans[id(step)]
+                if not all(group.fused for group in plan):
+                    raise unsupported()
+            spine = bool(targets & set(['root', 'top']))
+            for predicate in step.predicates:
+                _check_local(engine, predicate.expr, spine, unsupported)
+        sources = targets
+
+
+def _split(children, shards):
+    if not children:
+        # We still need to evaluate the root and the root element.
+        return [(0, 0)]
+    size = max(1, -(-len(children) // shards))
+    return [(i, i + size) for i in range(0, len(children), size)]
+
+
+# Set in the parent before the workers are forked, so they inherit it.
+_job = None
+
+
+def _evaluate_shard(bounds):
+    engine, compiled, top, children = _job
+    start, end = bounds
+    top._children = children[start:end]
+    engine.root_node.mark_elements_modified()
+    result = engine.evaluate(compiled)
+    return [node._doc_position for node in result.value]
+
+
+def evaluate_sharded(engine, xpath_expr, processes=None, shards=None):
+    """Evaluate a location path against the engine's document in parallel.
+
+    The root element's children are split into shards (by default, four for
+    each process) which are evaluated in forked worker processes. This
+    returns the same node-set as evaluating the expression normally, or
+    raises ValueError if the expression isn't one check_shardable() accepts.
+
+    This relies on the workers being forked, so it isn't available on
+    platforms where multiprocessing has to start new interpreters.
+    """
+    global _job
+
+    compiled = engine.compile(xpath_expr)
+    check_shardable(engine, compiled)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if shards is None:
+        shards = processes * 4
+    [top] = engine.root_node.get_children()
+    children = top.get_children()
+
+    _job = (engine, compiled, top, children)
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_evaluate_shard, _split(children, shards))
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+        _job = None
+
+    positions = set()
+    for result in results:
+        positions.update(result)
+    if not positions:
+        return XPathNodeSet([])
+    by_position = {}
+    for node in engine.root_node._walk_in_doc_order():
+        if node._doc_position in positions:
+            by_position[node._doc_position] = node
+    return XPathNodeSet(by_position.values())
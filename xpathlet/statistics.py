@@ -0,0 +1,173 @@
+# -*- test-case-name: xpathlet.tests.test_statistics -*-
+
+import math
+import struct
+from hashlib import md5
+
+
+class HyperLogLog(object):
+    """Estimates the number of distinct values seen in fixed memory.
+
+    With the default precision of 10 this uses 1024 small registers and has a
+    typical error of around 3%.
+    """
+
+    def __init__(self, precision=10):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = [0] * self.size
+
+    def add(self, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        [hashed] = struct.unpack('<Q', md5(value).digest()[:8])
+        register = hashed & (self.size - 1)
+        rest = hashed >> self.precision
+        # The rank is the position of the lowest set bit in the rest of the
+        # hash, counting from one.
+        rank = 1
+        while rank <= 64 - self.precision and not rest & 1:
+            rank += 1
+            rest >>= 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def estimate(self):
+        m = float(self.size)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        empty = self.registers.count(0)
+        if raw <= 2.5 * m and empty:
+            # Small cardinalities are better estimated by linear counting.
+            return m * math.log(m / empty)
+        return raw
+
+
+class DocumentStatistics(object):
+    """Counts gathered while building a document's node tree.
+
+    The basic counts are cheap enough to collect for every document and are
+    used by the planner to estimate how expensive and how selective
+    expressions are. Distinct value estimates cost a hash per value, so they
+    are only gathered for the attributes named in distinct_attributes.
+    """
+
+    def __init__(self, distinct_attributes=()):
+        self.distinct_attributes = distinct_attributes
+        self.node_counts = {}
+        self.element_counts = {}
+        self.attribute_counts = {}
+        self.child_element_count = 0
+        self.max_fanout = 0
+        self.depth_counts = {}
+        self._distinct = {}
+        self._distinct_names = set()
+        self._depths = {}
+
+    def start(self, root_node):
+        self._distinct_names = set(
+            root_node.expand_qname(name) for name in self.distinct_attributes)
+        self._depths = {id(root_node): 0}
+
+    def add_node(self, node):
+        self.node_counts[node.node_type] = (
+            self.node_counts.get(node.node_type, 0) + 1)
+        if node.node_type == 'element':
+            name = node.expanded_name()
+            self.element_counts[name] = self.element_counts.get(name, 0) + 1
+            children = sum(1 for c in node.get_children()
+                           if c.node_type == 'element')
+            self.child_element_count += children
+            self.max_fanout = max(self.max_fanout, children)
+            # We walk in document order, so the parent is always seen first.
+            depth = self._depths[id(node.parent)] + 1
+            self.depth_counts[depth] = self.depth_counts.get(depth, 0) + 1
+            if children:
+                self._depths[id(node)] = depth
+        elif node.node_type == 'attribute':
+            key = (node.parent.expanded_name(), node.expanded_name())
+            self.attribute_counts[key] = self.attribute_counts.get(key, 0) + 1
+            if key[1] in self._distinct_names:
+                if key not in self._distinct:
+                    self._distinct[key] = HyperLogLog()
+                self._distinct[key].add(node.value)
+
+    def finish(self):
+        self._depths = {}
+
+    def node_count(self, node_type=None):
+        if node_type is None:
+            return sum(self.node_counts.itervalues())
+        return self.node_counts.get(node_type, 0)
+
+    def element_count(self, name=None):
+        if name is None:
+            return self.node_count('element')
+        return self.element_counts.get(name, 0)
+
+    def attribute_frequency(self, element_name, attribute_name):
+        """The fraction of elements with the given name that have the given
+        attribute.
+        """
+        elements = self.element_count(element_name)
+        if not elements:
+            return 0.0
+        attributes = self.attribute_counts.get(
+            (element_name, attribute_name), 0)
+        return float(attributes) / elements
+
+    def distinct_values(self, element_name, attribute_name):
+        """The estimated number of distinct values of the given attribute on
+        elements with the given name, or None if we aren't tracking it.
+        """
+        hll = self._distinct.get((element_name, attribute_name))
+        if hll is None:
+            if attribute_name in self._distinct_names:
+                return 0.0
+            return None
+        return hll.estimate()
+
+    def average_fanout(self):
+        """The average number of child elements an element has."""
+        elements = self.element_count()
+        if not elements:
+            return 0.0
+        return float(self.child_element_count) / elements
+
+    def depth_histogram(self):
+        """Element counts by depth, with the document element at depth 1."""
+        return dict(self.depth_counts)
+
+    def max_depth(self):
+        return max(self.depth_counts or [0])
+
+    def average_depth(self):
+        elements = self.element_count()
+        if not elements:
+            return 0.0
+        return float(sum(d * c for d, c in self.depth_counts.iteritems())) / (
+            elements)
+
+    def to_dict(self):
+        """Summarise these statistics in a form suitable for serialising."""
+        def name_str(name):
+            if name[0] is None:
+                return name[1]
+            return '{%s}%s' % name
+
+        def key_str(key):
+            return '%s/@%s' % (name_str(key[0]), name_str(key[1]))
+
+        return {
+            'nodes': dict(self.node_counts),
+            'elements': dict((name_str(k), v)
+                             for k, v in self.element_counts.iteritems()),
+            'attributes': dict((key_str(k), v)
+                               for k, v in self.attribute_counts.iteritems()),
+            'average_fanout': self.average_fanout(),
+            'max_fanout': self.max_fanout,
+            'depth_histogram': self.depth_histogram(),
+            'average_depth': self.average_depth(),
+            'distinct_values': dict((key_str(k), v.estimate())
+                                    for k, v in self._distinct.iteritems()),
+            }
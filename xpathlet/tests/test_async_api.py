@@ -0,0 +1,112 @@
+import threading
+import time
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet import async_api
+from xpathlet.data_model import XPathNumber
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+
+
+TEST_XML = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<carrot xmlns:jr="http://example.com/jr">',
+        '  <jr:foo id="1">',
+        '    <bar>one</bar>',
+        '    <bar>two</bar>',
+        '  </jr:foo>',
+        '</carrot>',
+        ])
+
+
+class QueueExecutor(object):
+    """Holds on to submitted work until we run it."""
+
+    def __init__(self):
+        self.queue = []
+
+    def submit(self, func):
+        self.queue.append(func)
+
+    def run_all(self):
+        while self.queue:
+            self.queue.pop(0)()
+
+
+class TestFuture(TestCase):
+    def test_result(self):
+        executor = QueueExecutor()
+        future = async_api.run_in_background(
+            lambda a, b: a + b, (1,), {'b': 2}, executor)
+        self.assertEqual(False, future.done())
+        self.assertRaises(async_api.TimeoutError, future.result, 0)
+        executor.run_all()
+        self.assertEqual(True, future.done())
+        self.assertEqual(3, future.result())
+
+    def test_exception(self):
+        executor = QueueExecutor()
+        future = async_api.run_in_background(lambda: 1 / 0, (), None,
+                                             executor)
+        executor.run_all()
+        self.assertTrue(isinstance(future.exception(), ZeroDivisionError))
+        self.assertRaises(ZeroDivisionError, future.result)
+
+    def test_cancel_before_running(self):
+        executor = QueueExecutor()
+        called = []
+        future = async_api.run_in_background(called.append, (1,), None,
+                                             executor)
+        done = []
+        future.add_done_callback(done.append)
+        self.assertEqual(True, future.cancel())
+        self.assertEqual([future], done)
+        executor.run_all()
+        self.assertEqual([], called)
+        self.assertRaises(async_api.CancelledError, future.result)
+
+    def test_cancel_after_finishing(self):
+        executor = QueueExecutor()
+        future = async_api.run_in_background(lambda: 1, (), None, executor)
+        executor.run_all()
+        self.assertEqual(False, future.cancel())
+        self.assertEqual(1, future.result())
+
+    def test_timeout(self):
+        release = threading.Event()
+        future = async_api.run_in_background(release.wait, timeout=0.05)
+        self.assertRaises(async_api.TimeoutError, future.result, 5)
+        release.set()
+        # The late result doesn't replace the timeout.
+        time.sleep(0.05)
+        self.assertTrue(
+            isinstance(future.exception(), async_api.TimeoutError))
+
+
+class TestAsyncEvaluation(TestCase):
+    def test_evaluate_async(self):
+        engine = ExpressionEngine(build_xpath_tree(StringIO(TEST_XML)))
+        futures = [async_api.evaluate_async(
+                engine, 'count(//bar) + $n', variables={'n': XPathNumber(n)},
+                timeout=5) for n in range(10)]
+        self.assertEqual(range(2, 12), [f.result(5).value for f in futures])
+
+    def test_build_tree_async(self):
+        future = async_api.build_tree_async(StringIO(TEST_XML))
+        engine = ExpressionEngine(future.result(5))
+        self.assertEqual(2, engine.evaluate('count(//jr:foo/*)').value)
+
+    def test_incremental_builder(self):
+        builder = async_api.IncrementalTreeBuilder()
+        for i in range(0, len(TEST_XML), 7):
+            builder.feed(TEST_XML[i:i + 7])
+        executor = QueueExecutor()
+        future = builder.close_async(executor)
+        executor.run_all()
+        root = future.result()
+        expected = build_xpath_tree(StringIO(TEST_XML))
+        self.assertEqual(expected._namespaces, root._namespaces)
+        self.assertEqual(expected.statistics.to_dict(),
+                         root.statistics.to_dict())
+        self.assertEqual(u'1', ExpressionEngine(root).evaluate(
+                'string(/*/jr:foo/@id)').value)
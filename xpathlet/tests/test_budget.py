@@ -0,0 +1,115 @@
+import threading
+import time
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet import async_api
+from xpathlet.budget import (
+    PAIR_SIZE, Budget, BudgetExceeded, CancellationToken, EvaluationCancelled,
+    value_size)
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+
+
+TEST_XML = '<r>%s</r>' % ''.join(
+    '<a n="%s"><b/><c>%s</c></a>' % (i, i) for i in range(100))
+
+SLOW_EXPR = '//*[count(preceding::*) > count(following::*)]'
+
+
+class TestBudget(TestCase):
+    def setUp(self):
+        self.engine = ExpressionEngine(build_xpath_tree(StringIO(TEST_XML)))
+
+    def test_within_budget(self):
+        budget = Budget(max_nodes=10000, timeout=60)
+        result = self.engine.evaluate('//a[@n > 97]/c', budget=budget)
+        self.assertEqual([u'98', u'99'], result.string_values())
+        stats = budget.statistics()
+        self.assertTrue(0 < stats['nodes_visited'] <= 10000)
+        self.assertEqual(100, stats['predicates_evaluated'])
+
+    def test_max_nodes(self):
+        budget = Budget(max_nodes=1000)
+        try:
+            self.engine.evaluate(SLOW_EXPR, budget=budget)
+        except BudgetExceeded as e:
+            self.assertEqual('nodes', e.reason)
+            self.assertEqual(1001, e.statistics['nodes_visited'])
+        else:
+            self.fail('Expected BudgetExceeded.')
+
+    def test_deadline(self):
+        budget = Budget(timeout=0.01)
+        start = time.time()
+        try:
+            self.engine.evaluate(SLOW_EXPR, budget=budget)
+        except BudgetExceeded as e:
+            self.assertEqual('deadline', e.reason)
+            self.assertTrue(e.statistics['elapsed'] >= 0.01)
+        else:
+            self.fail('Expected BudgetExceeded.')
+        self.assertTrue(time.time() - start < 1)
+
+    def test_cancellation(self):
+        token = CancellationToken()
+        threading.Timer(0.01, token.cancel).start()
+        try:
+            self.engine.evaluate(SLOW_EXPR, budget=Budget(token=token))
+        except EvaluationCancelled as e:
+            self.assertEqual('cancelled', e.reason)
+            self.assertTrue(e.statistics['nodes_visited'] > 0)
+        else:
+            self.fail('Expected EvaluationCancelled.')
+
+    def test_shared_budget(self):
+        budget = Budget()
+        self.engine.evaluate('//c', budget=budget)
+        budget = Budget(max_nodes=budget.nodes_visited * 3 / 2)
+        self.engine.evaluate('//c', budget=budget)
+        self.assertRaises(BudgetExceeded, self.engine.evaluate_all,
+                          ['//b', '//c'], budget=budget)
+
+    def test_memory_ceiling(self):
+        budget = Budget(max_memory=20000)
+        try:
+            self.engine.evaluate('//*/following::*', budget=budget)
+        except BudgetExceeded as e:
+            self.assertEqual('memory', e.reason)
+            self.assertTrue(e.statistics['peak_memory'] > 20000)
+        else:
+            self.fail('Expected BudgetExceeded.')
+        # Nothing is left allocated after the evaluation is aborted.
+        self.assertEqual(0, budget.memory)
+
+    def test_peak_memory(self):
+        budget = Budget()
+        self.engine.evaluate('//a[@n > 50]/c', budget=budget)
+        stats = budget.statistics()
+        self.assertEqual(0, stats['memory'])
+        # At least the (position, node) pairs for the children of r.
+        self.assertTrue(stats['peak_memory'] > 100 * PAIR_SIZE)
+
+    def test_variables_counted(self):
+        nodes = self.engine.evaluate('//*')
+        budget = Budget()
+        self.engine.evaluate('1', variables={'nodes': nodes}, budget=budget)
+        self.assertEqual(value_size(nodes), budget.peak_memory)
+        self.assertRaises(
+            BudgetExceeded, self.engine.evaluate, '1',
+            variables={'nodes': nodes}, budget=Budget(max_memory=1000))
+
+    def test_async_cancel_stops_evaluation(self):
+        finished = threading.Event()
+        orig_evaluate = self.engine.evaluate
+
+        def evaluate(*args, **kw):
+            try:
+                return orig_evaluate(*args, **kw)
+            finally:
+                finished.set()
+
+        self.engine.evaluate = evaluate
+        future = async_api.evaluate_async(self.engine, SLOW_EXPR)
+        time.sleep(0.01)
+        future.cancel()
+        self.assertTrue(finished.wait(1))
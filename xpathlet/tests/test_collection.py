@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet import collection
+from xpathlet.data_model import XPathNumber
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+
+
+TEST_XML = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<order xmlns:x="http://example.com/x" id="o%s">',
+        '  <line product="a" qty="%s"/>',
+        '  <line product="b" qty="2"/>',
+        '  <x:note>fragile</x:note>',
+        '</order>',
+        ])
+
+
+class TestNodePath(TestCase):
+    def test_paths_select_node(self):
+        xml = ('<r xmlns="http://example.com/d" '
+               'xmlns:x="http://example.com/x">'
+               'one<a x:b="1" c="2"/><x:a/>two<a/><b/></r>')
+        engine = ExpressionEngine(build_xpath_tree(StringIO(xml)))
+        nodes = engine.evaluate('//node() | //@*').value
+        paths = [collection.node_path(node) for node in nodes]
+        self.assertEqual([u'/*[1]/*[1]/@x:b', u'/*[1]/x:a[1]',
+                          u'/*[1]/text()[2]', u'/*[1]/*[3]'], paths[4:8])
+        for node, path in zip(nodes, paths):
+            self.assertEqual([node], engine.evaluate(path).value, path)
+
+    def test_root(self):
+        root = build_xpath_tree(StringIO('<r/>'))
+        self.assertEqual(u'/', collection.node_path(root))
+
+
+class TestEvaluateCollection(TestCase):
+    EXPRESSIONS = ['/order/line[@qty > 1]', 'sum(//@qty)',
+                   'string(/order/@id)', '//x:note', 'count(//line) = $lines']
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(10):
+            path = os.path.join(self.tempdir, 'order%s.xml' % (i,))
+            with open(path, 'w') as f:
+                f.write(TEST_XML % (i, i))
+            self.paths.append(path)
+        self.variables = {'lines': XPathNumber(2)}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def expected(self, i):
+        lines = [u'/order[1]/line[1]'] if i > 1 else []
+        return (self.paths[i], [lines + [u'/order[1]/line[2]'], i + 2.0,
+                                u'o%s' % (i,), [u'/order[1]/x:note[1]'],
+                                True])
+
+    def test_ordered(self):
+        results = collection.evaluate_collection(
+            self.paths, self.EXPRESSIONS, processes=3, chunksize=2,
+            variables=self.variables)
+        self.assertEqual([self.expected(i) for i in range(10)], list(results))
+
+    def test_unordered(self):
+        results = collection.evaluate_collection(
+            self.paths, self.EXPRESSIONS, processes=3, ordered=False,
+            variables=self.variables)
+        self.assertEqual([self.expected(i) for i in range(10)],
+                         sorted(results, key=lambda r: self.paths.index(r[0])))
+
+    def test_string_values(self):
+        engine = ExpressionEngine(build_xpath_tree(StringIO('<r/>')))
+        [(path, [lines, notes])] = collection.evaluate_collection(
+            self.paths[5:6], [engine.compile('//@qty'), '//x:note'],
+            processes=1, node_values='string')
+        self.assertEqual(([u'5', u'2'], [u'fragile']), (lines, notes))
+
+    def test_worker_parses_once(self):
+        parsed = []
+        orig_parse = collection.parse
+
+        def parse(source):
+            parsed.append(source)
+            return orig_parse(source)
+
+        collection.parse = parse
+        try:
+            collection._init_worker(self.EXPRESSIONS, self.variables, None,
+                                    'path')
+            results = [collection._evaluate_path(path) for path in self.paths]
+        finally:
+            collection.parse = orig_parse
+            collection._worker = None
+        self.assertEqual([self.expected(i) for i in range(10)], results)
+        self.assertEqual(self.EXPRESSIONS, parsed)
@@ -0,0 +1,219 @@
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet import ast
+from xpathlet.data_model import (
+    XPathNodeSet, XPathNumber, FunctionLibrary, xpath_function)
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+
+
+TEST_XML = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<root>',
+        '  <config><default code="b"/></config>',
+        '  <item code="a" n="1"><name>one</name></item>',
+        '  <item code="b" n="2"><name>two</name></item>',
+        '  <item code="b" n="3"><name>three</name></item>',
+        '  <item code="c" n="4"><name>two</name></item>',
+        '  <item code="d" n="5"/>',
+        '</root>',
+        ])
+
+
+class CompilerTestCase(TestCase):
+    def setUp(self):
+        self.root = build_xpath_tree(StringIO(TEST_XML))
+        self.engine = ExpressionEngine(self.root)
+
+    def count_evals(self, expr, expr_type, evaluate=None, **kw):
+        """Evaluate expr, counting evaluations of the given AST type."""
+        counts = []
+        orig_eval = self.engine._eval_expr_uncached
+
+        def eval_expr(context, expr):
+            if type(expr) is expr_type:
+                counts.append(expr)
+            return orig_eval(context, expr)
+
+        if evaluate is None:
+            evaluate = lambda: self.engine.evaluate(expr, **kw)
+        self.engine._eval_expr_uncached = eval_expr
+        try:
+            result = evaluate()
+        finally:
+            del self.engine._eval_expr_uncached
+        return result, len(counts)
+
+    def names(self, result):
+        return [n.string_value() for n in result.value]
+
+
+class TestDependencies(CompilerTestCase):
+    def deps(self, expr):
+        compiled = self.engine.compile(expr)
+        return set(compiled.dependencies[id(compiled.expr)])
+
+    def test_constants(self):
+        self.assertEqual(set(), self.deps('1 + 2'))
+        self.assertEqual(set(), self.deps('"a"'))
+        self.assertEqual(set(), self.deps('$foo'))
+        self.assertEqual(set(), self.deps('concat($foo, "x")'))
+
+    def test_paths(self):
+        self.assertEqual(set(['node']), self.deps('foo/bar'))
+        self.assertEqual(set(['node']), self.deps('.'))
+        self.assertEqual(set(['root']), self.deps('/foo[@bar = .]'))
+        self.assertEqual(set(), self.deps('$foo/bar[position() = 2]'))
+
+    def test_functions(self):
+        self.assertEqual(set(['position']), self.deps('position()'))
+        self.assertEqual(set(['size']), self.deps('last()'))
+        self.assertEqual(set(['node']), self.deps('string()'))
+        self.assertEqual(set(), self.deps('string("x")'))
+        self.assertEqual(set(['node']), self.deps('lang("en")'))
+        self.assertEqual(set(['root']), self.deps('id("x")'))
+        self.assertEqual(set(['node', 'position', 'size', 'root']),
+                         self.deps('unknown-function()'))
+
+
+class TestHoisting(CompilerTestCase):
+    def test_absolute_path_hoisted(self):
+        result, count = self.count_evals(
+            '//item[@code = /root/config/default/@code]',
+            ast.AbsoluteLocationPath)
+        self.assertEqual(['two', 'three'], self.names(result))
+        # Once for //item and once for the hoisted path.
+        self.assertEqual(2, count)
+
+    def test_variable_path_hoisted(self):
+        self.engine.variables['x'] = XPathNodeSet(
+            self.engine.evaluate('//item[2]').value)
+        result, count = self.count_evals(
+            '//item[name = $x/name]', ast.PathExpr)
+        self.assertEqual(['two', 'two'], self.names(result))
+        self.assertEqual(1, count)
+
+    def test_function_argument_hoisted(self):
+        result, count = self.count_evals(
+            '//item[contains(concat(/root/config/default/@code, "x"), @code)]',
+            ast.FunctionCall)
+        self.assertEqual(['two', 'three'], self.names(result))
+        # contains() for each item, concat() once.
+        self.assertEqual(6, count)
+
+    def test_context_dependent_not_hoisted(self):
+        result, count = self.count_evals(
+            '//item[name = ../item[position() = last() - 1]/name]',
+            ast.LocationPath)
+        self.assertEqual(['two', 'two'], self.names(result))
+        self.assertEqual(10, count)
+
+    def test_hoisted_per_document(self):
+        other = build_xpath_tree(StringIO('<root><item code="c"/></root>'))
+        expr = self.engine.compile('/root/item[@code = /root/item/@code]')
+        self.assertEqual(5, len(self.engine.evaluate(expr).value))
+        self.assertEqual(1, len(self.engine.evaluate(expr, other).value))
+
+
+class TestCommonSubexpressions(CompilerTestCase):
+    def test_repeated_function_call(self):
+        expr = ('count(item[name]) > 0 and '
+                'sum(item[name]/@n) > count(item[name])')
+        result, count = self.count_evals(
+            expr, ast.FunctionCall, context_node=self.root.get_children()[0])
+        self.assertEqual(True, result.value)
+        # count() once, sum() once.
+        self.assertEqual(2, count)
+
+    def test_shared_path_prefix(self):
+        expr = 'sum(item[name]/@n) + count(item[name]) + count(item)'
+        result, count = self.count_evals(
+            expr, ast.Step, context_node=self.root.get_children()[0])
+        self.assertEqual(19, result.value)
+        # item[name] once, and item alone is left to ElementPath. The name
+        # predicate is checked in bulk and @n comes from a single scan of the
+        # shared prefix's nodes, so neither evaluates a step.
+        self.assertEqual(1, count)
+
+    def test_scoped_to_context(self):
+        result, count = self.count_evals(
+            '//item[name = "two" and count(name) = count(name)]',
+            ast.FunctionCall)
+        self.assertEqual(['two', 'two'], self.names(result))
+        # Once for each item that gets past the first comparison.
+        self.assertEqual(2, count)
+
+    def test_position_dependent(self):
+        result = self.engine.evaluate(
+            '//item[position() = last() or position() = last() - 1]')
+        self.assertEqual(['two', ''], self.names(result))
+
+    def test_unknown_functions_not_shared(self):
+        calls = []
+
+        class Library(FunctionLibrary):
+            @xpath_function(rtype='number')
+            def counter(ctx):
+                calls.append(ctx)
+                return XPathNumber(len(calls))
+
+        self.engine.function_libraries.append(Library())
+        result = self.engine.evaluate('counter() + counter()')
+        self.assertEqual(3, result.value)
+
+
+class TestExpressionSets(CompilerTestCase):
+    EXPRESSIONS = [
+        '//item[@code = "b"]',
+        '//item/name',
+        '//item[name = "two"]/@n',
+        'count(//item[name])',
+        '//item[1]',
+        '/root/item[@n > 2]/@code',
+        '/root/config/default/@code = //item/@code',
+        'sum(//item/@n)',
+        '//name[. = "two"]/..',
+        ]
+
+    def values(self, result):
+        if result.object_type == 'node-set':
+            return [n.string_value() for n in result.value]
+        return result.value
+
+    def test_same_results(self):
+        results = self.engine.evaluate_all(self.EXPRESSIONS)
+        self.assertEqual(
+            [self.values(self.engine.evaluate(e)) for e in self.EXPRESSIONS],
+            [self.values(r) for r in results])
+
+    def test_compiled_set(self):
+        compiled = self.engine.compile_all(self.EXPRESSIONS)
+        self.assertEqual(len(self.EXPRESSIONS), len(compiled))
+        first = [self.values(r) for r in self.engine.evaluate_all(compiled)]
+        again = [self.values(r) for r in self.engine.evaluate_all(compiled)]
+        self.assertEqual(first, again)
+        other = build_xpath_tree(StringIO('<root><item n="7"/></root>'))
+        self.assertEqual(
+            7, ExpressionEngine(other).evaluate_all(compiled)[7].value)
+
+    def test_shared_scans(self):
+        results, count = self.count_evals(
+            None, ast.Step, evaluate=lambda: self.engine.evaluate_all(
+                ['//item[@code = "b"]', '//item/name', '//config', '//item']))
+        self.assertEqual([2, 4, 1, 5], [len(r.value) for r in results])
+        # Only the descendant-or-self step is evaluated. Every step after it
+        # comes from one scan of its children.
+        self.assertEqual(1, count)
+
+    def test_unknown_functions_not_shared(self):
+        calls = []
+
+        class Library(FunctionLibrary):
+            @xpath_function(rtype='number')
+            def counter(ctx):
+                calls.append(ctx)
+                return XPathNumber(len(calls))
+
+        self.engine.function_libraries.append(Library())
+        results = self.engine.evaluate_all(['counter()', 'counter()'])
+        self.assertEqual([1, 2], [r.value for r in results])
@@ -1,8 +1,19 @@
+import sys
+import threading
 from unittest import TestCase
 from StringIO import StringIO
 
+from xpathlet import ast
 from xpathlet.data_model import XPathNumber, XPathNodeSet
-from xpathlet.engine import ExpressionEngine, build_xpath_tree
+from xpathlet.budget import Budget, BudgetExceeded
+from xpathlet.engine import (
+    Context, Evaluation, ExpressionEngine, build_xpath_tree)
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    # Python 2 only has this with the futures backport.
+    ThreadPoolExecutor = None
 
 
 TEST_XML = '\n'.join([
@@ -221,3 +232,449 @@ class TestExpressions(XPathExpressionTestCase):
         self.assertEqual(False, self.eval_xpath('1 > 1').value)
         self.assertEqual(True, self.eval_xpath('2 >= 1').value)
         self.assertEqual(True, self.eval_xpath('2 > 1').value)
+
+
+TEST_XML3 = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<order>',
+        '  <product code="a" price="5"/>',
+        '  <product code="b" price="10"/>',
+        '  <product code="c" price="x"/>',
+        '  <line product="b" qty="3"/>',
+        '  <line product="z" qty="1"/>',
+        '  <line product="a" qty="7"/>',
+        '  <same v="q"/><same v="q"/>',
+        '</order>',
+        ])
+
+
+class TestNodeSetComparisons(XPathExpressionTestCase):
+    test_xml = TEST_XML3
+
+    def assert_xpath(self, value, expr):
+        self.assertEqual(value, self.eval_xpath(expr).value, expr)
+
+    def test_node_set_equality(self):
+        self.assert_xpath(True, '//line/@product = //product/@code')
+        self.assert_xpath(False, '//line/@qty = //product/@code')
+        self.assert_xpath(False, '//line/@product = //missing')
+        self.assert_xpath(2.0, 'count(//line[@product = //product/@code])')
+
+    def test_node_set_inequality(self):
+        self.assert_xpath(True, '//line/@product != //product/@code')
+        self.assert_xpath(False, '//same/@v != //same/@v')
+        self.assert_xpath(True, '//same/@v != //line/@product')
+        self.assert_xpath(False, '//same/@v != //missing')
+
+    def test_node_set_relational(self):
+        self.assert_xpath(True, '//product/@price < //line/@qty')
+        self.assert_xpath(True, '//product/@price > //line/@qty')
+        self.assert_xpath(True, '//line/@qty <= //product/@price')
+        self.assert_xpath(False, '//line/@qty > //product/@price[. > 7]')
+        self.assert_xpath(True, '//line/@qty >= //product/@price[. < 7]')
+        self.assert_xpath(False, '//product/@code < //line/@qty')
+
+    def test_node_set_scalars(self):
+        self.assert_xpath(True, '//product/@price = 10')
+        self.assert_xpath(True, '//product/@price != 5')
+        self.assert_xpath(True, '//product/@price = "x"')
+        self.assert_xpath(False, '//product/@price > "10"')
+        self.assert_xpath(True, '"9" < //product/@price')
+        self.assert_xpath(True, '//product/@price >= true()')
+        self.assert_xpath(True, '//missing = false()')
+
+
+class TestEvaluateMany(XPathExpressionTestCase):
+    def assert_same_results(self, expr, nodes):
+        results = self.engine.evaluate_many(expr, nodes)
+        self.assertEqual(len(nodes), len(results))
+        for node, result in zip(nodes, results):
+            expected = self.engine.evaluate(expr, node)
+            self.assertEqual(expected.object_type, result.object_type)
+            self.assertEqual(expected.value, result.value, expr)
+
+    def test_paths(self):
+        nodes = self.engine.evaluate('//*').value
+        for expr in ['*', '..', '../*', '*[1]', '*[last()]/@*',
+                     'following-sibling::*[2]', 'ancestor::*[@id]', '.']:
+            self.assert_same_results(expr, nodes)
+
+    def test_expressions(self):
+        nodes = self.engine.evaluate('//*').value
+        for expr in ['count(*)', 'name()', '@id = "baz"', '//foo/@att1',
+                     'count(//*) - count(*)', '(../* | .)[1]']:
+            self.assert_same_results(expr, nodes)
+
+    def test_repeated_and_empty_context_nodes(self):
+        foo = self.get_foo()
+        results = self.engine.evaluate_many('*', [foo, self.xpath_root, foo])
+        self.assertEqual([['daughter'], ['carrot'], ['daughter']],
+                         [[n.name for n in r.value] for r in results])
+        self.assertEqual([], self.engine.evaluate_many('*', []))
+
+    def test_shared_steps_evaluated_once(self):
+        nodes = self.engine.evaluate('//mother/*').value
+        steps = []
+        orig_eval = self.engine._eval_path_step
+
+        def eval_path_step(context, step):
+            steps.append(step)
+            return orig_eval(context, step)
+
+        self.engine._eval_path_step = eval_path_step
+        results = self.engine.evaluate_many('../@id', nodes)
+        self.assertEqual([['baz']] * 3,
+                         [[n.value for n in r.value] for r in results])
+        # Once for each context node to get to mother, then only once more.
+        self.assertEqual(4, len(steps))
+
+
+class TestBulkPredicates(XPathExpressionTestCase):
+    test_xml = TEST_XML3
+
+    EXPRESSIONS = [
+        '//line[@product = "a"]',
+        '//line[@qty > 2]',
+        '//line["3" <= @qty]',
+        '//*[@code = //line/@product]',
+        '//*[@price != @code]',
+        '//product[@price = true()]',
+        '//product[. = ""]',
+        '//*[@qty and not(@product = "b")]',
+        '//*[@qty or @price < 7]',
+        '//*[boolean(@code)]',
+        '//*[@qty = $n or count(*) > 1]',
+        '//*[@missing and $undefined]',
+        ]
+
+    def setUp(self):
+        super(TestBulkPredicates, self).setUp()
+        self.engine.variables['n'] = XPathNumber(3)
+
+    def test_same_results(self):
+        for expr in self.EXPRESSIONS:
+            compiled = self.engine.compile(expr)
+            bulk = self.engine.evaluate(compiled).value
+            # Without plans, every predicate is evaluated node by node.
+            compiled.predicate_plans.clear()
+            self.assertEqual(self.engine.evaluate(compiled).value, bulk, expr)
+
+    def test_no_per_node_evaluation(self):
+        evaluated = []
+        orig_eval = self.engine._eval_expr_uncached
+
+        def eval_expr(context, expr):
+            if not isinstance(expr, ast.Step):
+                evaluated.append(type(expr).__name__)
+            return orig_eval(context, expr)
+
+        self.engine._eval_expr_uncached = eval_expr
+        result = self.engine.evaluate('//line[@product = "a" and @qty > 2]')
+        self.assertEqual(1, len(result.value))
+        # Only the path itself and each of the literals once.
+        self.assertEqual(
+            ['AbsoluteLocationPath', 'StringLiteral', 'Number'], evaluated)
+
+
+def run_in_threads(func, args, workers=8):
+    if ThreadPoolExecutor is not None:
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(func, args))
+
+    results = [None] * len(args)
+    errors = []
+    args = list(enumerate(args))
+
+    def worker():
+        while args:
+            try:
+                i, arg = args.pop()
+            except IndexError:
+                return
+            try:
+                results[i] = func(arg)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+class TestConcurrency(XPathExpressionTestCase):
+    EXPRESSIONS = [
+        '//*[@id]',
+        'count(//*) + count(//@*)',
+        '//foo/@*[. = "baz"]',
+        'string(//daughter/@datt)',
+        '//mother/*[last()]',
+        'id("baz")/sister | //uncle',
+        '//*[count(*) > 1]/@id',
+        ]
+
+    def summarise(self, result):
+        if result.object_type == 'node-set':
+            return sorted(node._doc_position for node in result.value)
+        return result.value
+
+    def test_shared_compiled_expressions(self):
+        compiled = [self.engine.compile(expr) for expr in self.EXPRESSIONS]
+        expected = [self.summarise(self.engine.evaluate(c))
+                    for c in compiled]
+        results = run_in_threads(
+            lambda i: self.summarise(self.engine.evaluate(compiled[i % 7])),
+            range(2000))
+        self.assertEqual([expected[i % 7] for i in range(2000)], results)
+
+    def test_concurrent_compilation(self):
+        expressions = ['//*[@id][%d] | //foo/@att%d' % (i, i)
+                       for i in range(200)]
+        results = run_in_threads(
+            lambda expr: self.engine.compile(expr).expr.to_str(), expressions)
+        self.assertEqual([self.engine.compile(e).expr.to_str()
+                          for e in expressions], results)
+
+    def test_evaluate_while_removing_children(self):
+        mother = self.engine.evaluate('//mother').only()
+        texts = [c for c in mother.get_children() if c.node_type == 'text']
+
+        def work(i):
+            if i < len(texts):
+                mother.remove_child(texts[i])
+            return [n.name for n in self.engine.evaluate('//mother/*').value]
+
+        results = run_in_threads(work, range(500))
+        self.assertEqual([['sister', 'foo', 'brother']] * 500,
+                         [sorted(r, key=['sister', 'foo', 'brother'].index)
+                          for r in results])
+        self.assertEqual(['element'] * 3,
+                         [c.node_type for c in mother.get_children()])
+
+    def test_concurrent_removals(self):
+        # Switch threads as often as possible, so that writers interleave.
+        interval = sys.getcheckinterval()
+        self.addCleanup(sys.setcheckinterval, interval)
+        sys.setcheckinterval(1)
+        for _ in range(20):
+            root = build_xpath_tree(StringIO('<r>%s</r>' % ('<a/>' * 50,)))
+            [parent] = root.get_children()
+            start = threading.Event()
+
+            def remove(child):
+                start.wait()
+                parent.remove_child(child)
+
+            threads = [threading.Thread(target=remove, args=(child,))
+                       for child in parent.get_children()]
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([], parent.get_children())
+
+
+class TestIterate(XPathExpressionTestCase):
+    EXPRESSIONS = [
+        '//*', '/carrot/grandfather/*', '//@*', '//foo//*', '//*[@id]/*',
+        '//mother/*[2]', 'descendant::*[last()]', '//*[@id]//@*', '//node()',
+        '/descendant::*/@id', '//grandson/ancestor::*', '//*/*',
+        '(//* | //@*)[position() < 4]', '//*[@id][1]/child::*',
+        ]
+
+    def assert_same_results(self, expr, **kw):
+        expected = self.engine.evaluate(expr).value
+        offset, limit = kw.get('offset', 0), kw.get('limit')
+        if limit is not None:
+            expected = expected[offset:offset + limit]
+        else:
+            expected = expected[offset:]
+        self.assertEqual(expected, list(self.engine.iterate(expr, **kw)),
+                         (expr, kw))
+
+    def test_same_results(self):
+        for expr in self.EXPRESSIONS:
+            self.assert_same_results(expr)
+            self.assert_same_results(expr, limit=2)
+            self.assert_same_results(expr, offset=3)
+            self.assert_same_results(expr, offset=1, limit=3)
+
+    def test_streamed(self):
+        # Paths that could select a node more than once, or out of order,
+        # are evaluated in full.
+        streamed = ['//*', '/carrot/grandfather/*', '//@*',
+                    'descendant::*[last()]', '//node()', '/descendant::*/@id']
+        compiled = [self.engine.compile(e) for e in self.EXPRESSIONS]
+        self.assertEqual(streamed, [
+                c.source for c in compiled
+                if self.engine._stream_stages(self.build_context(c),
+                                              c.expr) is not None])
+
+    def build_context(self, compiled):
+        return Context(self.xpath_root, 1, 1, {}, {}, {}, compiled.expr,
+                       self.xpath_root, evaluation=Evaluation(compiled))
+
+    def test_stops_early(self):
+        xml = '<r>%s</r>' % ('<a><b/></a>' * 1000,)
+        engine = ExpressionEngine(build_xpath_tree(StringIO(xml)))
+        budget = Budget()
+        nodes = list(engine.iterate('//b', limit=5, budget=budget))
+        self.assertEqual(['b'] * 5, [n.name for n in nodes])
+        self.assertTrue(budget.nodes_visited < 20)
+
+    def test_not_a_node_set(self):
+        self.assertRaises(ValueError, list, self.engine.iterate('1 + 1'))
+
+
+class TestElementPaths(XPathExpressionTestCase):
+    test_xml = '\n'.join([
+            '<?xml version="1.0"?>',
+            '<root xmlns:jr="http://openrosa.org/javarosa">',
+            '  <a x="1"><b>one</b><c x="y"/><b x="2">two</b></a>',
+            '  <a><c/><a><b>three</b><c x="y"><b/></c></a></a>',
+            '  <jr:d jr:x="z"><b>four</b><jr:d><b/></jr:d></jr:d>',
+            '</root>',
+            ])
+
+    EXPRESSIONS = [
+        'a/b', './/c[@x="y"]', '//b[2]', '/root/a', '/root/a[1]/b[last()]',
+        '//a//b', '//*', '*/b', '//a[b]', '//a[b = "two"]', '//a[@x]',
+        '//c[@x = "y"]/b', '/*/*', 'descendant::b', '//b[1]', '//jr:d/b',
+        '//jr:d[@jr:x = "z"]', '//*[b = "three"]', './/a/./b', '/root',
+        '//jr:d//b[last()]', "//b[@x = 'y']", "//a['two' = b]",
+        ]
+
+    def test_same_results(self):
+        contexts = [None] + self.engine.evaluate('//a').value
+        for expr in self.EXPRESSIONS:
+            compiled = self.engine.compile(expr)
+            self.assertTrue(id(compiled.expr) in compiled.element_paths, expr)
+            for node in contexts:
+                # Budgets need every step evaluated, so they get the slow
+                # path.
+                slow = self.engine.evaluate(compiled, node, budget=Budget())
+                fast = self.engine.evaluate(compiled, node)
+                self.assertEqual(slow.value, fast.value, (expr, node))
+
+    def test_not_translated(self):
+        for expr in ['//b/..', '*[2]', 'b[@x][1]', 'descendant::b[1]',
+                     '//@x', '//a[b = 1]', '//a[@x > 1]', '/', '.',
+                     '//jr:*', 'self::a/b', '//a[position() = 1]',
+                     '//b[0]', 'b[1.5]', '//text()', 'xx:a', '//b[. = "two"]']:
+            compiled = self.engine.compile(expr)
+            self.assertFalse(id(compiled.expr) in compiled.element_paths, expr)
+
+    def test_element_paths(self):
+        def element_paths(expr):
+            return sorted(self.engine.compile(expr).element_paths.values())
+
+        self.assertEqual([".//c[@x='y']"], element_paths('.//c[@x="y"]'))
+        self.assertEqual(['./a/b[2]'], element_paths('a/b[2]'))
+        self.assertEqual(['.//{http://openrosa.org/javarosa}d'],
+                         element_paths('descendant::jr:d'))
+        self.assertEqual(['./a', './b'], element_paths('count(a) + count(b)'))
+        self.assertEqual(["./a[@x='1']", './b'],
+                         element_paths('a[@x = "1"] | b'))
+
+    def test_modified_tree(self):
+        [a1, a2] = self.engine.evaluate('/root/a').value
+        b = self.engine.evaluate('b', a1).value[0]
+        a1.remove_child(b)
+        self.assertEqual([u'two'], self.engine.evaluate(
+                'b', a1).string_values())
+
+
+class TestTieredExecution(XPathExpressionTestCase):
+    EXPRESSIONS = [
+        '//foo/@*', 'count(//*[@id]) + 1', '//*[@id = "baz"]/*[2]',
+        'descendant::*[last()]', '//daughter/ancestor::*[@id][1]',
+        'string(//foo/@att1) = "bar" and not(//nothing)',
+        ]
+
+    def setUp(self):
+        super(TestTieredExecution, self).setUp()
+        self.tiered = ExpressionEngine(self.xpath_root, promote_after=2)
+
+    def test_promotion(self):
+        self.tiered.evaluate('//foo')
+        self.assertEqual({'interpreted': 1, 'compiled': 0, 'interpreting': 1,
+                          'promoted': 0, 'evicted': 0, 'promotions': []},
+                         self.tiered.tier_statistics())
+        self.tiered.evaluate('//foo')
+        self.tiered.evaluate('//foo')
+        self.tiered.evaluate('//foo')
+        self.assertEqual({'interpreted': 2, 'compiled': 2, 'interpreting': 0,
+                          'promoted': 1, 'evicted': 0,
+                          'promotions': [('//foo', 2)]},
+                         self.tiered.tier_statistics())
+
+    def test_same_results(self):
+        foo = self.get_foo()
+        for expr in self.EXPRESSIONS * 3:
+            for node in [None, foo]:
+                self.assertEqual(self.engine.evaluate(expr, node).value,
+                                 self.tiered.evaluate(expr, node).value,
+                                 (expr, node))
+        stats = self.tiered.tier_statistics()
+        self.assertEqual(len(self.EXPRESSIONS), len(stats['promotions']))
+        self.assertEqual(len(self.EXPRESSIONS) * 2, stats['interpreted'])
+
+    def test_interpreted_form(self):
+        self.tiered.evaluate('//*[@id]')
+        [(_count, interpreted)] = self.tiered._tiers.values()
+        self.assertEqual({}, interpreted.element_paths)
+        self.assertEqual({}, interpreted.predicate_plans)
+        self.assertEqual('//*[@id]', interpreted.source)
+
+    def test_compiled_expressions_not_counted(self):
+        compiled = self.tiered.compile('//foo')
+        self.tiered.evaluate(compiled)
+        self.assertEqual({'interpreted': 0, 'compiled': 0, 'interpreting': 0,
+                          'promoted': 0, 'evicted': 0, 'promotions': []},
+                         self.tiered.tier_statistics())
+
+    def test_table_size(self):
+        tiered = ExpressionEngine(self.xpath_root, promote_after=2,
+                                  tier_table_size=3)
+        for i in range(10):
+            tiered.evaluate('//foo')
+            tiered.evaluate('count(//*) > %d' % (i,))
+        stats = tiered.tier_statistics()
+        self.assertEqual(3, len(tiered._tiers))
+        self.assertEqual(8, stats['evicted'])
+        # The hot expression is used too often to be evicted.
+        self.assertEqual([('//foo', 2)], stats['promotions'])
+        self.assertEqual(2, stats['interpreting'])
+
+    def test_reset_tiers(self):
+        for _ in range(3):
+            self.tiered.evaluate('//foo')
+        self.tiered.reset_tiers()
+        self.tiered.evaluate('//foo')
+        self.assertEqual({'interpreted': 1, 'compiled': 0, 'interpreting': 1,
+                          'promoted': 0, 'evicted': 0, 'promotions': []},
+                         self.tiered.tier_statistics())
+
+    def test_work_outside_lock(self):
+        locked = []
+
+        class Engine(ExpressionEngine):
+            def _find_function(self, name):
+                locked.append(self._tier_lock.locked())
+                return super(Engine, self)._find_function(name)
+
+        tiered = Engine(self.xpath_root, promote_after=1)
+        for _ in range(3):
+            tiered.evaluate('count(//foo)')
+        self.assertTrue(locked)
+        self.assertFalse(any(locked))
+
+    def test_budget(self):
+        budget = Budget(max_nodes=3)
+        self.assertRaises(BudgetExceeded, self.tiered.evaluate, '//*',
+                          budget=budget)
@@ -0,0 +1,105 @@
+import json
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+from xpathlet.indexes import NumericRangeIndex
+
+
+TEST_XML = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<shop>',
+        '  <config min="100"/>',
+        '  <item type="a" price="50"><name>one</name></item>',
+        '  <item type="b" price="150"><name>two</name></item>',
+        '  <item type="a" price="250"><name>three</name></item>',
+        '  <item type="b" price="350"/>',
+        '</shop>',
+        ])
+
+
+class TestExplain(TestCase):
+    def setUp(self):
+        self.root = build_xpath_tree(StringIO(TEST_XML))
+        self.engine = ExpressionEngine(self.root)
+
+    def find(self, plan, kind, expr):
+        [node] = [n for n in plan.root.walk()
+                  if n.kind == kind and n.expr.to_str() == expr]
+        return node
+
+    def test_estimates_only(self):
+        plan = self.engine.explain('/shop/item[name]')
+        self.assertEqual(False, plan.analyzed)
+        step = self.find(plan, 'step', 'child::item[child::name]')
+        self.assertEqual('axis scan', step.strategy)
+        self.assertEqual(None, step.actual_rows)
+        self.assertTrue(step.estimated_rows > 0)
+
+    def test_predicate_order(self):
+        plan = self.engine.explain(
+            '//item[contains(name, "o")][@type = "a"][1]')
+        predicates = [n for n in plan.root.walk() if n.kind == 'predicate']
+        self.assertEqual(
+            [(1, 2, ['fused']), (2, 1, ['fused']), (3, 3, [])],
+            [(p.details['order'], p.details['written'], p.flags)
+             for p in predicates])
+        self.assertTrue('predicate 1 (written 2): ' in plan.to_text())
+
+    def test_bulk_strategies(self):
+        plan = self.engine.explain(
+            '//item[@type = "a"][name and count(*) > 0][last()]')
+        predicates = [n for n in plan.root.walk() if n.kind == 'predicate']
+        self.assertEqual(['bulk', 'bulk + per node', 'evaluate'],
+                         [p.strategy for p in predicates])
+
+    def test_hoisted(self):
+        plan = self.engine.explain('//item[@price > /shop/config/@min]')
+        self.assertEqual(['/child::shop/child::config/attribute::min'],
+                         plan.hoisted)
+        path = self.find(plan, 'absolute path',
+                         '/child::shop/child::config/attribute::min')
+        self.assertEqual(['hoisted'], path.flags)
+        self.assertEqual(1.0, path.estimated_loops)
+        self.assertTrue('Hoisted: /child::shop' in plan.to_text())
+
+    def test_analyze(self):
+        plan = self.engine.explain('//item[@price > 100]', analyze=True)
+        self.assertEqual(3, len(plan.result.value))
+        step = self.find(plan, 'step', 'child::item[attribute::price > 100.0]')
+        self.assertEqual(3, step.actual_rows)
+        predicate = self.find(plan, 'predicate', '[attribute::price > 100.0]')
+        self.assertEqual((3, 4), (predicate.actual_rows,
+                                  predicate.actual_loops))
+        self.assertTrue('(actual rows=3 loops=4)' in plan.to_text())
+
+    def test_analyze_hoisted(self):
+        plan = self.engine.explain(
+            '//item[@price > /shop/config/@min]', analyze=True)
+        path = self.find(plan, 'absolute path',
+                         '/child::shop/child::config/attribute::min')
+        self.assertEqual((1, 1), (path.actual_rows, path.actual_loops))
+
+    def test_value_index(self):
+        self.root.add_index(NumericRangeIndex('item', '@price'))
+        plan = self.engine.explain('//item[@price > 100]', analyze=True)
+        step = self.find(plan, 'step', 'child::item[attribute::price > 100.0]')
+        self.assertEqual('axis scan + value index', step.strategy)
+        self.assertEqual(3, step.actual_rows)
+        predicate = self.find(plan, 'predicate', '[attribute::price > 100.0]')
+        self.assertEqual('value index', predicate.strategy)
+        self.assertEqual(['numeric item/@price > 100.0'],
+                         predicate.details['index_lookups'])
+        self.assertEqual((3, 4), (predicate.actual_rows,
+                                  predicate.actual_loops))
+
+    def test_json(self):
+        plan = self.engine.explain('count(//item[name])', analyze=True)
+        data = json.loads(plan.to_json())
+        self.assertEqual('count(//item[name])', data['source'])
+        self.assertEqual(True, data['analyzed'])
+        self.assertEqual('function', data['plan']['kind'])
+        self.assertEqual(1, data['plan']['actual_rows'])
+        [path] = data['plan']['children']
+        self.assertEqual('absolute path', path['kind'])
+        self.assertEqual(3, path['actual_rows'])
@@ -0,0 +1,149 @@
+import marshal
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet import expression_cache
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+from xpathlet.expression_cache import (
+    ExpressionCache, cache_version, decode_ast, encode_ast)
+from xpathlet.parser import parse
+
+
+TEST_XML = '<root><item n="1">one</item><item n="2">two</item></root>'
+
+EXPRESSIONS = [
+    '/root/item[@n > 1]',
+    'sum(//item/@n) div count(//item)',
+    'concat(string(item[1]), "-", $x)',
+    '(//item | /root)[last()]/ancestor-or-self::node()',
+    'processing-instruction("pi") or -1.5 != 2',
+    ]
+
+
+class TestExpressionCache(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.path = os.path.join(self.tempdir, 'exprs.cache')
+        self.root = build_xpath_tree(StringIO(TEST_XML))
+
+    def fill_cache(self):
+        cache = ExpressionCache(self.path)
+        for source in EXPRESSIONS:
+            cache.parse(source)
+        cache.save()
+        return cache
+
+    def test_encode_round_trip(self):
+        for source in EXPRESSIONS:
+            expr = parse(source)
+            decoded = decode_ast(encode_ast(expr))
+            self.assertEqual(repr(expr), repr(decoded))
+            self.assertEqual(expr.to_str(), decoded.to_str())
+
+    def test_decode_rejects_other_objects(self):
+        self.assertRaises(ValueError, decode_ast, {'': 'ExpressionCache'})
+        self.assertRaises(ValueError, decode_ast, [{'value': 1}])
+
+    def test_warm_restart(self):
+        self.assertEqual(len(EXPRESSIONS), self.fill_cache().misses)
+        cache = ExpressionCache(self.path)
+        self.assertEqual(len(EXPRESSIONS), len(cache))
+        engine = ExpressionEngine(self.root, expression_cache=cache)
+        cold_engine = ExpressionEngine(self.root)
+        self.assertEqual(
+            [cold_engine.evaluate(e).value for e in EXPRESSIONS[:2]],
+            [engine.evaluate(e).value for e in EXPRESSIONS[:2]])
+        engine.compile_all(EXPRESSIONS)
+        self.assertEqual(0, cache.misses)
+        self.assertEqual(len(EXPRESSIONS) + 2, cache.hits)
+
+    def test_new_expressions_saved(self):
+        self.fill_cache()
+        cache = ExpressionCache(self.path)
+        ExpressionEngine(self.root, expression_cache=cache).compile('1 + 1')
+        cache.save()
+        self.assertEqual(len(EXPRESSIONS) + 1, len(ExpressionCache(self.path)))
+        self.assertEqual(['exprs.cache'], os.listdir(self.tempdir))
+
+    def test_unchanged_cache_not_written(self):
+        self.fill_cache()
+        inode = os.stat(self.path).st_ino
+        cache = ExpressionCache(self.path)
+        cache.parse(EXPRESSIONS[0])
+        cache.save()
+        # Saving replaces the file, so it would have a new inode.
+        self.assertEqual(inode, os.stat(self.path).st_ino)
+
+    def test_outdated_cache_discarded(self):
+        self.fill_cache()
+        self.patch_version(expression_cache.CACHE_VERSION + 1)
+        cache = ExpressionCache(self.path)
+        self.assertEqual(0, len(cache))
+        cache.parse(EXPRESSIONS[0])
+        self.assertEqual(1, cache.misses)
+
+    def patch_version(self, version):
+        orig_version = expression_cache.CACHE_VERSION
+        expression_cache.CACHE_VERSION = version
+        self.addCleanup(setattr, expression_cache, 'CACHE_VERSION',
+                        orig_version)
+
+    def test_corrupt_cache_discarded(self):
+        with open(self.path, 'wb') as f:
+            f.write('not a cache')
+        self.assertEqual(0, len(ExpressionCache(self.path)))
+
+    def test_bad_entries_reparsed(self):
+        with open(self.path, 'wb') as f:
+            marshal.dump((cache_version(), {
+                        'a/b': {'': 'LocationPath'},
+                        'c': {'': 'Step', 'axis': 'child'},
+                        'd': {'': 'object'},
+                        }), f)
+        cache = ExpressionCache(self.path)
+        for source in ['a/b', 'c', 'd']:
+            self.assertEqual(parse(source).to_str(),
+                             cache.parse(source).to_str())
+        self.assertEqual(3, cache.misses)
+
+    def test_missing_file(self):
+        cache = ExpressionCache(os.path.join(self.tempdir, 'missing'))
+        self.assertEqual(0, len(cache))
+        self.assertEqual(None, cache.parse('a ['))
+        cache.save()
+        self.assertEqual([], os.listdir(self.tempdir))
+
+    def test_parse_while_saving(self):
+        interval = sys.getcheckinterval()
+        self.addCleanup(sys.setcheckinterval, interval)
+        sys.setcheckinterval(1)
+        cache = ExpressionCache(self.path)
+        sources = ['a[%d]/b' % (i,) for i in range(1000)]
+        done = threading.Event()
+
+        def save():
+            while not done.is_set():
+                cache.save()
+
+        def parse_all(sources):
+            for source in sources:
+                cache.parse(source)
+
+        saver = threading.Thread(target=save)
+        saver.start()
+        parsers = [threading.Thread(target=parse_all, args=(sources[i::4],))
+                   for i in range(4)]
+        for thread in parsers:
+            thread.start()
+        for thread in parsers:
+            thread.join()
+        done.set()
+        saver.join()
+        cache.save()
+        self.assertEqual(len(sources), len(ExpressionCache(self.path)))
@@ -0,0 +1,102 @@
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+from xpathlet.filter_matcher import FilterMatcher
+
+
+DOCUMENTS = [
+    '<order region="EU"><item sku="1" qty="3"/><item qty="10"/></order>',
+    '<order region="US"><item sku="2"/><note><item sku="9"/></note></order>',
+    '<order><box><item qty="2" sku=""/></box><box/></order>',
+    '<invoice region="EU"><order><item sku="7"/></order></invoice>',
+    '<order xmlns:x="urn:x" x:flag="y"><x:item/></order>',
+    '<order sku="1"><line/></order>',
+    '<a k="2"/>',
+    ]
+
+FILTERS = [
+    "/order[@region='EU']//item[@sku]",
+    '/order/item',
+    '//item[@qty > 5]',
+    '//item[5 > @qty]',
+    '//item[@qty >= "3" and @sku]',
+    '/order//box/item',
+    '//box/*',
+    '/*[@region]',
+    '//order/item/@sku',
+    '//@region',
+    "//item[@sku != '1']",
+    "//item[@sku = 7]",
+    '/order/note/item[@sku = -9]',
+    '/order[@x:flag]/x:item',
+    '//x:item',
+    '/',
+    '//order/./item',
+    'order/item',
+    'descendant::box',
+    '/order//@sku',
+    '//order//@sku',
+    '/a//@k',
+    ]
+
+
+class TestFilterMatcher(TestCase):
+    def setUp(self):
+        self.matcher = FilterMatcher({'x': 'urn:x'})
+        for i, expr in enumerate(FILTERS):
+            self.matcher.add(i, expr)
+
+    def expected(self, xml):
+        root = build_xpath_tree(StringIO(xml))
+        engine = ExpressionEngine(root)
+        engine.root_node._namespaces['x'] = 'urn:x'
+        return set(i for i, expr in enumerate(FILTERS)
+                   if engine.evaluate(expr).coerce('boolean').value)
+
+    def test_same_as_engine(self):
+        for xml in DOCUMENTS:
+            expected = self.expected(xml)
+            self.assertEqual(expected, self.matcher.match(StringIO(xml)), xml)
+            self.assertEqual(expected, self.matcher.match_tree(
+                    build_xpath_tree(StringIO(xml))), xml)
+
+    def test_matches(self):
+        self.assertEqual(set([0, 1, 2, 3, 4, 7, 8, 9, 15, 16, 17, 19, 20]),
+                         self.matcher.match(StringIO(DOCUMENTS[0])))
+
+    def test_shared_states(self):
+        matcher = FilterMatcher()
+        matcher.add('a', '/order/item')
+        matcher.add('b', '/order/item[@sku]')
+        matcher.add('c', '/order//item')
+        [order] = matcher._start.transitions[(None, 'order')].values()
+        self.assertEqual(2, len(order.transitions[(None, 'item')]))
+        self.assertEqual(1, len(order.descendant().transitions))
+
+    def test_own_attribute_after_descendant(self):
+        for xml in ['<order sku="1"><line/></order>',
+                    '<order><line sku="1"/></order>']:
+            for expr in ['/order//@sku', '//order//@sku']:
+                matcher = FilterMatcher()
+                matcher.add('s', expr)
+                self.assertEqual(set(['s']), matcher.match(StringIO(xml)))
+                self.assertEqual(set(['s']), matcher.match_tree(
+                        build_xpath_tree(StringIO(xml))))
+                matcher.remove('s')
+                self.assertEqual(set(), matcher.match(StringIO(xml)))
+
+    def test_remove(self):
+        self.matcher.remove(1)
+        self.assertEqual(len(FILTERS) - 1, len(self.matcher))
+        self.assertFalse(1 in self.matcher.match(StringIO(DOCUMENTS[0])))
+        self.assertRaises(KeyError, self.matcher.remove, 1)
+
+    def test_unsupported(self):
+        matcher = FilterMatcher()
+        for expr in ['//item[1]', '//item[position() = 2]', 'count(//a)',
+                     '/a/..', '//item[@a = @b]', '//a[b]', '/a/text()',
+                     '/@a', '//item[@x:y]', '/a/@b/c']:
+            self.assertRaises(ValueError, matcher.add, expr, expr)
+        matcher.add('x', '/a')
+        self.assertRaises(ValueError, matcher.add, 'x', '/b')
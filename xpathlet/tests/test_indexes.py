@@ -0,0 +1,177 @@
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet.data_model import XPathNumber, XPathString
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+from xpathlet.indexes import NumericRangeIndex, TrigramIndex, PrefixIndex
+
+
+TEST_XML = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<shop>',
+        '  <item id="a" price="50"><qty>1</qty></item>',
+        '  <item id="b" price="100"><qty>5</qty><qty>20</qty></item>',
+        '  <item id="c" price="250.5"><qty>10</qty></item>',
+        '  <item id="d" price="500"/>',
+        '  <item id="e" price="lots"><qty>x</qty></item>',
+        '  <item id="f"/>',
+        '  <item id="g" price="-20">7</item>',
+        '  <other price="300"/>',
+        '</shop>',
+        ])
+
+
+class TestNumericRangeIndex(TestCase):
+    def setUp(self):
+        self.root = build_xpath_tree(StringIO(TEST_XML))
+        self.index = self.root.add_index(NumericRangeIndex('item', '@price'))
+
+    def ids(self, nodes):
+        return sorted(n.get_attributes()[0].value for n in nodes)
+
+    def test_nan_excluded(self):
+        self.assertEqual(5, len(self.index))
+
+    def test_select(self):
+        self.assertEqual(['a', 'g'], self.ids(self.index.select('<', 100)))
+        self.assertEqual(['a', 'b', 'g'],
+                         self.ids(self.index.select('<=', 100)))
+        self.assertEqual(['c', 'd'], self.ids(self.index.select('>', 100)))
+        self.assertEqual(['b', 'c', 'd'],
+                         self.ids(self.index.select('>=', 100)))
+        self.assertEqual(['b'], self.ids(self.index.select('=', 100)))
+        self.assertEqual([], self.ids(self.index.select('=', 101)))
+        self.assertEqual([], self.ids(self.index.select('<', float('nan'))))
+
+    def test_registered_on_root(self):
+        self.assertEqual(self.index, self.root.get_index(
+                'numeric', (None, 'item'), 'attribute', (None, 'price')))
+        self.assertEqual(None, self.root.get_index(
+                'numeric', (None, 'other'), 'attribute', (None, 'price')))
+
+
+class TestIndexedPredicates(TestCase):
+    EXPRESSIONS = [
+        '//item[@price > 100]',
+        '//item[@price >= 100 and @price <= 500]',
+        '//item[@price > 100 and @price <= 500]',
+        '//item[100 < @price]',
+        '//item[@price < -1 or @price > 400]',
+        '//item[@price = 100]',
+        '//item[@price = "100"]',
+        '//item[@price != 100]',
+        '//item[@price < "250.6"]',
+        '//item[@price > $low and @price < $high]',
+        '//item[@price > $name]',
+        '//item[@price > true()]',
+        '//item[qty > 6]',
+        '//item[qty < 6]',
+        '//item[qty = 20]',
+        '//item[. > 0]',
+        '//item[. = 7]',
+        '//*[@price > 100]',
+        '//item[@price > 100][1]',
+        '//item[2][@price > 10]',
+        ]
+
+    def setUp(self):
+        variables = {
+            'low': XPathNumber(60),
+            'high': XPathString('400'),
+            'name': XPathString('high'),
+            }
+        self.plain = ExpressionEngine(
+            build_xpath_tree(StringIO(TEST_XML)), variables)
+        indexed_root = build_xpath_tree(StringIO(TEST_XML))
+        indexed_root.add_index(NumericRangeIndex('item', '@price'))
+        indexed_root.add_index(NumericRangeIndex('item', 'qty'))
+        indexed_root.add_index(NumericRangeIndex('item', '.'))
+        self.indexed = ExpressionEngine(indexed_root, variables)
+
+    def ids(self, engine, expr):
+        return [n._doc_position for n in engine.evaluate(expr).value]
+
+    def test_same_results(self):
+        for expr in self.EXPRESSIONS:
+            self.assertEqual(self.ids(self.plain, expr),
+                             self.ids(self.indexed, expr), expr)
+
+    def test_index_used(self):
+        selected = []
+        [index] = [i for i in self.indexed.root_node._indexes.values()
+                   if i.key_path == '@price']
+        orig_select = index.select
+
+        def select(op, number):
+            selected.append((op, number))
+            return orig_select(op, number)
+
+        index.select = select
+        self.indexed.evaluate('//item[@price > 100 and @price <= 500]')
+        self.assertEqual([('>', 100.0), ('<=', 500.0)], selected)
+
+
+CATALOGUE_XML = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<catalogue>',
+        '  <entry code="AB-1"><title>The Hobbit</title></entry>',
+        '  <entry code="AB-2"><title>Hobbit Habits</title></entry>',
+        '  <entry code="AC-1"><title>Habitat</title><title>Ho</title></entry>',
+        '  <entry code="B"><title>Ab</title></entry>',
+        '  <entry/>',
+        '  <entry code="AB"><title/></entry>',
+        '</catalogue>',
+        ])
+
+
+class TestStringIndexes(TestCase):
+    def setUp(self):
+        self.root = build_xpath_tree(StringIO(CATALOGUE_XML))
+        self.trigrams = self.root.add_index(TrigramIndex('entry', 'title'))
+        self.prefixes = self.root.add_index(PrefixIndex('entry', '@code'))
+
+    def codes(self, nodes):
+        return sorted(n._doc_position for n in nodes)
+
+    def test_trigram_select(self):
+        # Only the first title of each entry counts.
+        self.assertEqual(2, len(self.trigrams.select('Hobbit')))
+        self.assertEqual(1, len(self.trigrams.select('bit ')))
+        self.assertEqual(2, len(self.trigrams.select('Ha')))
+        self.assertEqual(0, len(self.trigrams.select('Hobz')))
+        self.assertEqual(6, len(self.trigrams.select('')))
+
+    def test_prefix_select(self):
+        self.assertEqual(3, len(self.prefixes.select('AB')))
+        self.assertEqual(4, len(self.prefixes.select('A')))
+        self.assertEqual(0, len(self.prefixes.select('C')))
+        self.assertEqual(6, len(self.prefixes.select('')))
+
+    def test_stats(self):
+        stats = self.trigrams.stats()
+        self.assertEqual('substring', stats['index_type'])
+        self.assertEqual(6, stats['owners'])
+        self.assertEqual(5, stats['entries'])
+        self.assertTrue(stats['trigrams'] > 0)
+        self.assertTrue(stats['postings'] >= stats['trigrams'])
+        self.assertTrue(stats['build_time'] >= 0)
+        self.assertEqual(5, self.prefixes.stats()['entries'])
+
+    def test_same_results(self):
+        variables = {'q': XPathString('bit'), 'n': XPathNumber(1)}
+        plain = ExpressionEngine(
+            build_xpath_tree(StringIO(CATALOGUE_XML)), variables)
+        indexed = ExpressionEngine(self.root, variables)
+        for expr in [
+                '//entry[contains(title, "Hobbit")]',
+                '//entry[contains(title, $q)]',
+                '//entry[contains(title, "Ha")]',
+                '//entry[contains(title, "")]',
+                '//entry[contains(@code, $n)]',
+                '//entry[starts-with(@code, "AB")]',
+                '//entry[starts-with(@code, "AB") and contains(title, "b")]',
+                '//entry[starts-with(@code, "")]',
+                '//entry[starts-with(title, "H")]',
+                ]:
+            self.assertEqual(self.codes(plain.evaluate(expr).value),
+                             self.codes(indexed.evaluate(expr).value), expr)
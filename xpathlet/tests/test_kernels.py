@@ -0,0 +1,102 @@
+from unittest import TestCase, skipIf
+from StringIO import StringIO
+
+from xpathlet import kernels
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+
+
+VALUES = [u'1', u' 2.5 ', u'-3', u'x', u'', u'1e400', u'-inf', u'nan', u'.5',
+          u'7', u'10']
+
+
+class KernelTestCase(TestCase):
+    """Runs each test with and without NumPy, if we have it."""
+
+    def setUp(self):
+        self.numpy = kernels.numpy
+        self.threshold = kernels.VECTOR_THRESHOLD
+
+    def tearDown(self):
+        kernels.numpy = self.numpy
+        kernels.VECTOR_THRESHOLD = self.threshold
+
+    def both_ways(self, func, *args):
+        kernels.numpy = None
+        plain = func(*args)
+        kernels.numpy = self.numpy
+        kernels.VECTOR_THRESHOLD = 0
+        vectorised = func(*args)
+        kernels.VECTOR_THRESHOLD = self.threshold
+        return plain, vectorised
+
+    def assert_same(self, func, *args):
+        plain, vectorised = self.both_ways(func, *args)
+        self.assertEqual(plain, vectorised, (func.__name__, args))
+        return plain
+
+
+class TestKernels(KernelTestCase):
+    def test_sum_numbers(self):
+        self.assertEqual(6.0, self.assert_same(
+                kernels.sum_numbers, [u'1', u'2', u' 3']))
+        self.assertEqual(0, self.assert_same(kernels.sum_numbers, []))
+        # Fractions round differently depending on the order they're added.
+        self.assertEqual(sum([0.1] * 100), self.assert_same(
+                kernels.sum_numbers, [u'0.1'] * 100))
+        plain, vectorised = self.both_ways(kernels.sum_numbers, VALUES)
+        self.assertTrue(plain != plain and vectorised != vectorised)
+
+    def test_any_compare(self):
+        for op in kernels.COMP_FUNCTIONS:
+            for number in [-3, 0, 2.5, 10, 11, float('nan')]:
+                self.assert_same(kernels.any_compare, VALUES, number, op)
+        # NaN is unequal to everything.
+        self.assertEqual(True, self.assert_same(
+                kernels.any_compare, [u'x', u'inf'], 0, '!='))
+
+    def test_number_range(self):
+        self.assertEqual((-3, 10), self.assert_same(
+                kernels.number_range, VALUES))
+        self.assertEqual(None, self.assert_same(
+                kernels.number_range, [u'x', u'1e999']))
+
+    def test_any_compare_grouped(self):
+        groups = [VALUES[:3], [], VALUES[3:8], VALUES[8:], [u'4']]
+        self.assertEqual([True, False, False, True, False], self.assert_same(
+                kernels.any_compare_grouped, groups, 4, '<'))
+        self.assertEqual([False] * 3, self.assert_same(
+                kernels.any_compare_grouped, [[], [], []], 4, '<'))
+
+
+class TestEngineKernels(KernelTestCase):
+    def setUp(self):
+        super(TestEngineKernels, self).setUp()
+        xml = '<r>%s</r>' % ''.join(
+            '<v n="%s">%s</v>' % (i, v) for i, v in enumerate(VALUES * 20))
+        self.engine = ExpressionEngine(build_xpath_tree(StringIO(xml)))
+
+    def evaluate(self, expr):
+        return self.engine.evaluate(expr).value
+
+    def test_same_results(self):
+        for expr in ['sum(//v[. < 5])', 'count(//v[. > 2])',
+                     '//v > 9', '//v = 7', '//v < "0"', '//v < //@n',
+                     'count(//v[. != 1])']:
+            self.assert_same(self.evaluate, expr)
+
+    @skipIf(kernels.numpy is None, 'NumPy is not installed.')
+    def test_vectorised(self):
+        calls = []
+        orig_to_number_array = kernels.to_number_array
+
+        def to_number_array(values):
+            calls.append(len(values))
+            return orig_to_number_array(values)
+
+        kernels.to_number_array = to_number_array
+        try:
+            self.assertEqual(20, self.evaluate('sum(//v[. < 5])'))
+        finally:
+            kernels.to_number_array = orig_to_number_array
+        # Once for the predicate and once for the sum.
+        self.assertEqual([220, 80], calls)
@@ -1,10 +1,11 @@
 from unittest import TestCase
 
-from xpathlet.lexer import lexer
+from xpathlet.lexer import get_lexer
 
 
 class TestLexer(TestCase):
     def test_foo(self):
+        lexer = get_lexer()
         print "\n-----"
 
         lexer.input(u'foo 4 div text bar != \u200C-')
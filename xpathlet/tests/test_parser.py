@@ -1,18 +1,55 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 from unittest import TestCase
 
-from xpathlet.parser import parser
+from ply import yacc
+
+from xpathlet import parser as parser_module, parsetab
+from xpathlet.parser import parse
 
 
 class TestParser(TestCase):
     def test_foo(self):
         print "\n-----"
-        print parser.parse(u'/foo')
+        print parse(u'/foo')
         print "-----"
-        r = parser.parse("instance('cities')/root/item[state=/new_cascading_select/state and county=/new_cascading_select/county]", debug=0)
+        r = parse("instance('cities')/root/item[state=/new_cascading_select/state and county=/new_cascading_select/county]")
         print r
         print r.to_str()
         print "-----"
-        r = parser.parse("//foo//bar")
+        r = parse("//foo//bar")
         print r
         print r.to_str()
         print "-----"
+
+
+class TestParseTables(TestCase):
+    def test_tables_up_to_date(self):
+        # If this fails, run xpathlet.parser.build_parse_tables().
+        pinfo = yacc.ParserReflect(vars(parser_module))
+        pinfo.get_all()
+        self.assertEqual(pinfo.signature(), parsetab._lr_signature)
+
+    def test_lazy_construction(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        package_dir = os.path.dirname(
+            os.path.dirname(os.path.abspath(parser_module.__file__)))
+        before = sorted(os.listdir(os.path.join(package_dir, 'xpathlet')))
+        script = '\n'.join([
+                'import sys',
+                'sys.path.insert(0, %r)' % (package_dir,),
+                'from xpathlet import engine, lexer, parser',
+                'assert parser._parser is None and lexer._lexer is None',
+                'assert parser.parse("a/b").to_str() == "child::a/child::b"',
+                'assert parser._parser is not None',
+                ])
+        # -B stops Python itself writing .pyc files.
+        subprocess.check_call([sys.executable, '-B', '-c', script],
+                              cwd=workdir)
+        self.assertEqual([], os.listdir(workdir))
+        after = sorted(os.listdir(os.path.join(package_dir, 'xpathlet')))
+        self.assertEqual(before, after)
@@ -0,0 +1,108 @@
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+from xpathlet.planner import is_positional
+from xpathlet.statistics import DocumentStatistics
+
+
+TEST_XML = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<items>',
+        '  <item type="a"><desc>xylophone</desc></item>',
+        '  <item type="b"><desc>box</desc></item>',
+        '  <item type="a"><desc>apple</desc></item>',
+        '  <item><desc>axe</desc></item>',
+        '  <item type="a"><desc>fox</desc></item>',
+        '</items>',
+        ])
+
+
+TYPE_TEST = "attribute::type = 'a'"
+CONTAINS_TEST = "contains(child::desc, 'x')"
+
+
+class PlannerTestCase(TestCase):
+    def setUp(self):
+        self.root = build_xpath_tree(StringIO(TEST_XML))
+        self.engine = ExpressionEngine(self.root)
+
+    def step_plan(self, expr):
+        compiled = self.engine.compile(expr)
+        step = compiled.expr.steps[-1]
+        return compiled.predicate_plans[id(step)]
+
+    def plan_strs(self, expr):
+        return [(group.fused, [p.expr.to_str() for p in group.predicates])
+                for group in self.step_plan(expr)]
+
+
+class TestPositional(PlannerTestCase):
+    def assert_positional(self, positional, predicate_expr):
+        compiled = self.engine.compile('item[%s]' % (predicate_expr,))
+        [predicate] = compiled.expr.steps[0].predicates
+        self.assertEqual(positional, is_positional(
+                predicate, compiled.dependencies, self.engine._find_function),
+                         predicate_expr)
+
+    def test_positional(self):
+        self.assert_positional(True, '1')
+        self.assert_positional(True, 'last()')
+        self.assert_positional(True, 'position() > 1')
+        self.assert_positional(True, '$foo')
+        self.assert_positional(True, 'count(desc) + 1')
+        self.assert_positional(True, 'unknown-function()')
+
+    def test_not_positional(self):
+        self.assert_positional(False, '@type')
+        self.assert_positional(False, '@type = "a"')
+        self.assert_positional(False, 'contains(desc, "x")')
+        self.assert_positional(False, 'count(desc) > 1')
+        self.assert_positional(False, 'not(desc[2])')
+        self.assert_positional(False, 'string(desc)')
+
+
+class TestPredicateOrdering(PlannerTestCase):
+    def test_cheap_attribute_tests_first(self):
+        self.assertEqual([
+                (True, [TYPE_TEST, CONTAINS_TEST]),
+                ], self.plan_strs('item[contains(desc, "x")][@type = "a"]'))
+
+    def test_positional_predicates_stay_put(self):
+        self.assertEqual([
+                (True, [TYPE_TEST, CONTAINS_TEST]),
+                (False, ['2.0']),
+                (True, ['child::desc']),
+                ], self.plan_strs(
+                'item[contains(desc, "x")][@type = "a"][2][desc]'))
+
+    def test_same_results(self):
+        for expr in [
+                '//item[contains(desc, "x")][@type = "a"]',
+                '//item[contains(desc, "x")][@type = "a"][1]',
+                '//item[@type][contains(desc, "o")][last()]',
+                '//item[contains(desc, "x") or @type = "b"][not(@type)]',
+                '//item[2][@type = "a"][desc]',
+                '(//item)[desc != "box"][@type = "a"][position() > 1]',
+                ]:
+            planned = self.engine.evaluate(expr).value
+            compiled = self.engine.compile(expr)
+            compiled.predicate_plans.clear()
+            unplanned = self.engine.evaluate(compiled).value
+            self.assertEqual(unplanned, planned, expr)
+
+    def test_distinct_values_used(self):
+        xml = '<items>%s</items>' % ''.join(
+            '<item code="%s" type="%s"/>' % (i, i % 2) for i in range(100))
+        expr = 'item[@type = "1"][@code = "7"]'
+
+        engine = ExpressionEngine(build_xpath_tree(StringIO(xml)))
+        [[group]] = engine.compile(expr).predicate_plans.values()
+        self.assertEqual(['attribute::type', 'attribute::code'],
+                         [p.expr.left.to_str() for p in group.predicates])
+
+        engine = ExpressionEngine(build_xpath_tree(
+                StringIO(xml), DocumentStatistics(['code', 'type'])))
+        [[group]] = engine.compile(expr).predicate_plans.values()
+        self.assertEqual(['attribute::code', 'attribute::type'],
+                         [p.expr.left.to_str() for p in group.predicates])
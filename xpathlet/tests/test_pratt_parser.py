@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+from xpathlet import ast
+from xpathlet.parser import parse
+from xpathlet.pratt_parser import ParseError, tokenize
+
+
+EXPRESSIONS = [
+    u'/', u'/foo', u'//foo//bar', u'foo/bar', u'.', u'..', u'../@id',
+    u'@*', u'@jr:id', u'jr:*', u'child::para', u'ancestor-or-self::*[1]',
+    u'preceding-sibling::node()[last()]', u'text()', u'comment()',
+    u'processing-instruction("pi")', u'processing-instruction()',
+    u'node()/self::node()', u'./a', u'a//b/../c', u'/descendant::x[2]/@y',
+    u'1', u'1.5', u'.5', u'2.', u'"a b"', u'$var', u'$jr:var',
+    u'1 + 2 * 3', u'(1 + 2) * 3', u'1 - 2 - 3', u'8 div 2 div 2',
+    u'7 mod 3 * 2', u'-1', u'--1', u'- - 1', u'-a | b', u'a | b | c',
+    u'a = b and c != d or e < f', u'a <= b >= c', u'a > b = c < d',
+    u'not(a) and true()', u'count(//x) > 0', u'concat("a", $b, c/d)',
+    u'jr:func(1, 2)', u'f()[1]', u'f()/a', u'f()//a[@b]', u'(a | b)[2]',
+    u'$nodes[. = "x"][2]/y', u'* * *', u'*/*', u'a * b', u'div div div',
+    u'mod', u'a/div', u'/div', u'div/mod', u'foo[bar = "baz"]',
+    u"instance('cities')/root/item[state=/new_cascading_select/state and "
+    u"county=/new_cascading_select/county]",
+    u'//item[position() = last() or position() = last() - 1]',
+    u'a[@x > 1][@y][3]', u'sum(//item/@n) div count(//item)',
+    u'a-b', u'a - b', u'a -b', u'x.y', u'.//c[@x="y"]', u'//b[2]',
+    u'string(/*/jr:foo/@id)', u'  1\t+\n2  ', u'\xe9l\xe9ment/@\xfc',
+    u'a[b[c[d]]]', u'/*[1]/node()[2]', u'a|b/c[1]', u'/ and /',
+    ]
+
+ERRORS = [u'a[', u'1 +', u'a # b', u'(1', u'f(1,)', u'a/', u'@', u'[1]',
+          u'and', u'a and', u'foo::bar', u'text("x")', u'1 2', u'$', u'',
+          u'a]', u'a | -b']
+
+
+def assert_same_ast(test, expected, actual, path=()):
+    test.assertEqual(type(expected), type(actual), path)
+    if isinstance(expected, (list, tuple)):
+        test.assertEqual(len(expected), len(actual), path)
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            assert_same_ast(test, e, a, path + (i,))
+    elif isinstance(expected, ast.Node):
+        test.assertEqual(sorted(vars(expected)), sorted(vars(actual)), path)
+        for name, value in sorted(vars(expected).items()):
+            assert_same_ast(test, value, getattr(actual, name),
+                            path + (name,))
+    else:
+        test.assertEqual(expected, actual, path)
+
+
+class TestPrattParser(TestCase):
+    def test_same_as_ply(self):
+        for source in EXPRESSIONS:
+            expected = parse(source, backend='ply')
+            actual = parse(source, backend='pratt')
+            assert_same_ast(self, expected, actual, (source,))
+            self.assertEqual(expected.to_str(), actual.to_str())
+
+    def test_errors(self):
+        for source in ERRORS:
+            self.assertRaises(ParseError, parse, source, 'pratt')
+
+    def test_tokenize(self):
+        self.assertEqual([
+                ('name', u'a'), ('symbol', u'::'), ('name', u'jr:b'),
+                ('symbol', u'['), ('literal', u'x y'), ('symbol', u'!='),
+                ('number', u'.5'), ('symbol', u']'), ('end', None),
+                ], tokenize(u'a::jr:b["x y" != .5]'))
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, parse, u'a', 'yacc')
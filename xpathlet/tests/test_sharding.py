@@ -0,0 +1,56 @@
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet.data_model import XPathNumber
+from xpathlet.engine import ExpressionEngine, build_xpath_tree
+from xpathlet.sharding import check_shardable, evaluate_sharded
+
+
+def record(i):
+    return ('<record id="r%s" kind="%s"><field n="%s">%s</field>'
+            '<field n="x">value %s</field></record>' % (i, 'ab'[i % 2], i,
+                                                         i * 3, i))
+
+
+TEST_XML = '<export version="2">\n%s\n<trailer count="60"/>\n</export>' % (
+    '\n'.join(record(i) for i in range(60)),)
+
+
+class TestSharding(TestCase):
+    def setUp(self):
+        self.root = build_xpath_tree(StringIO(TEST_XML))
+        self.engine = ExpressionEngine(self.root)
+        self.engine.variables['min'] = XPathNumber(100)
+
+    def test_same_results(self):
+        for expr in ['//record', '/export/record[@kind = "a"]/@id',
+                     '//field[. > $min]', '//record[field[2] = "value 7"]',
+                     '/export/*[count(field) = 2]/field[last()]/text()',
+                     '/export[@version = 2]/trailer', '/export/@version',
+                     '//node()', '/descendant-or-self::node()[@id = "r3"]',
+                     '//*[not(contains(name(), "field"))]']:
+            expected = self.engine.evaluate(expr).value
+            result = evaluate_sharded(self.engine, expr, processes=2,
+                                      shards=7)
+            self.assertEqual(expected, result.value, expr)
+
+    def test_unshardable(self):
+        for expr in ['count(//record)', '//record[1]', '//record/..',
+                     '/export[count(record) > 2]', '//*[string() = "0"]',
+                     '//record[@id = /export/record[1]/@id]',
+                     '//record[field = ../trailer/@count]',
+                     '/*[starts-with(., "value")]', '//record[id("r3")]']:
+            compiled = self.engine.compile(expr)
+            self.assertRaises(ValueError, check_shardable, self.engine,
+                              compiled)
+
+    def test_tree_unchanged(self):
+        [export] = self.root.get_children()
+        children = export.get_children()
+        evaluate_sharded(self.engine, '//field', processes=2)
+        self.assertEqual(children, export.get_children())
+
+    def test_empty_root_element(self):
+        engine = ExpressionEngine(build_xpath_tree(StringIO('<r a="1"/>')))
+        result = evaluate_sharded(engine, '/r[@a]', processes=2)
+        self.assertEqual(engine.evaluate('/r').value, result.value)
@@ -0,0 +1,89 @@
+from unittest import TestCase
+from StringIO import StringIO
+
+from xpathlet.engine import build_xpath_tree
+from xpathlet.statistics import DocumentStatistics, HyperLogLog
+
+
+TEST_XML = '\n'.join([
+        '<?xml version="1.0"?>',
+        '<items>',
+        '  <item type="a" id="1"><desc>one</desc></item>',
+        '  <item type="b"><desc>two</desc><desc>three</desc></item>',
+        '  <item/>',
+        '</items>',
+        ])
+
+
+class TestDocumentStatistics(TestCase):
+    def setUp(self):
+        self.stats = build_xpath_tree(StringIO(TEST_XML)).statistics
+
+    def test_counts(self):
+        self.assertEqual(7, self.stats.element_count())
+        self.assertEqual(3, self.stats.element_count((None, 'item')))
+        self.assertEqual(3, self.stats.element_count((None, 'desc')))
+        self.assertEqual(0, self.stats.element_count((None, 'nope')))
+        self.assertEqual(3, self.stats.node_count('attribute'))
+        self.assertEqual(1, self.stats.node_count('root'))
+
+    def test_attribute_frequency(self):
+        self.assertAlmostEqual(2.0 / 3, self.stats.attribute_frequency(
+                (None, 'item'), (None, 'type')))
+        self.assertAlmostEqual(1.0 / 3, self.stats.attribute_frequency(
+                (None, 'item'), (None, 'id')))
+        self.assertEqual(0, self.stats.attribute_frequency(
+                (None, 'desc'), (None, 'id')))
+        self.assertEqual(0, self.stats.attribute_frequency(
+                (None, 'nope'), (None, 'id')))
+
+    def test_average_fanout(self):
+        self.assertAlmostEqual(6.0 / 7, self.stats.average_fanout())
+
+    def test_depths(self):
+        self.assertEqual({1: 1, 2: 3, 3: 3}, self.stats.depth_histogram())
+        self.assertEqual(3, self.stats.max_depth())
+        self.assertAlmostEqual(16.0 / 7, self.stats.average_depth())
+        self.assertEqual(3, self.stats.max_fanout)
+
+    def test_distinct_values_not_tracked(self):
+        self.assertEqual(None, self.stats.distinct_values(
+                (None, 'item'), (None, 'type')))
+
+    def test_distinct_values(self):
+        stats = build_xpath_tree(StringIO(TEST_XML), DocumentStatistics(
+                distinct_attributes=['type'])).get_statistics()
+        self.assertAlmostEqual(2, stats.distinct_values(
+                (None, 'item'), (None, 'type')), 1)
+        self.assertEqual(0, stats.distinct_values(
+                (None, 'desc'), (None, 'type')))
+        self.assertEqual(None, stats.distinct_values(
+                (None, 'item'), (None, 'id')))
+
+    def test_to_dict(self):
+        stats = build_xpath_tree(StringIO(TEST_XML), DocumentStatistics(
+                distinct_attributes=['type'])).get_statistics().to_dict()
+        self.assertEqual({'items': 1, 'item': 3, 'desc': 3},
+                         stats['elements'])
+        self.assertEqual({'item/@type': 2, 'item/@id': 1},
+                         stats['attributes'])
+        self.assertEqual(['item/@type'], stats['distinct_values'].keys())
+        self.assertEqual({1: 1, 2: 3, 3: 3}, stats['depth_histogram'])
+
+    def test_disabled(self):
+        root = build_xpath_tree(StringIO(TEST_XML), False)
+        self.assertEqual(None, root.get_statistics())
+
+
+class TestHyperLogLog(TestCase):
+    def test_small(self):
+        hll = HyperLogLog()
+        for value in ['a', 'b', u'c\u00e9', 'a', 'b']:
+            hll.add(value)
+        self.assertAlmostEqual(3, hll.estimate(), 1)
+
+    def test_large(self):
+        hll = HyperLogLog()
+        for i in xrange(20000):
+            hll.add(str(i % 10000))
+        self.assertTrue(9000 < hll.estimate() < 11000, hll.estimate())
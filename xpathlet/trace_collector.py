@@ -85,6 +85,10 @@ class TraceCollector(object):
             })
         self.depth -= 1
 
+    def bulk_step(self, expr_node, loops, rows):
+        # We only show steps evaluated in a single context.
+        pass
+
     def dump_html(self):
         return
         import sys